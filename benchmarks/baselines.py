@@ -0,0 +1,51 @@
+import os
+import json
+import logging
+from typing import Dict
+
+baselines_logger = logging.getLogger('baselines')
+
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# result slower than baseline by more than this fraction is reported as regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def load_baselines(path: str = BASELINES_FILE) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rt', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def store_baselines(results: Dict[str, float], path: str = BASELINES_FILE) -> None:
+    baselines = load_baselines(path)
+    baselines.update({name: round(result) for name, result in results.items()})
+    with open(path, 'wt', encoding='utf-8') as fp:
+        json.dump(baselines, fp, indent=2, sort_keys=True)
+        fp.write('\n')
+
+
+def compare_with_baselines(results: Dict[str, float], tolerance: float = DEFAULT_TOLERANCE,
+                           path: str = BASELINES_FILE) -> int:
+    """
+    Compare results (higher is better, e.g. records per second) with stored baselines.
+    Logs every result and returns number of regressions.
+    """
+
+    baselines = load_baselines(path)
+    regressions = 0
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            baselines_logger.info(f'{name}: {result:,.0f} (no baseline)')
+            continue
+
+        change = result / baseline - 1
+        if change < -tolerance:
+            regressions += 1
+            baselines_logger.warning(f'{name}: {result:,.0f}, baseline {baseline:,.0f} ({change:+.1%}) - REGRESSION')
+        else:
+            baselines_logger.info(f'{name}: {result:,.0f}, baseline {baseline:,.0f} ({change:+.1%})')
+
+    return regressions
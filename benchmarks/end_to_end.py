@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from typing import Dict, List
+
+from get_csv_from_marc_db_dump import select_and_extract_records_to_csv, dump_records, \
+    INPUT_MODE_STREAM, INPUT_MODE_MMAP
+from commons.output.sinks import OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL, OUTPUT_FORMAT_SQLITE, \
+    OUTPUT_FORMAT_PARQUET, DEFAULT_OUTPUT_PATHS
+from benchmarks.synthetic_dump import generate_dump
+from benchmarks.baselines import compare_with_baselines, store_baselines, DEFAULT_TOLERANCE
+from exceptions.custom_exceptions import MissingOptionalDependency
+
+end_to_end_benchmark_logger = logging.getLogger('end_to_end_benchmark')
+
+
+DEFAULT_RECORDS = 20000
+DEFAULT_REPEAT = 3
+DEFAULT_OUTPUT_FORMATS = [OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL, OUTPUT_FORMAT_SQLITE, OUTPUT_FORMAT_PARQUET]
+
+
+def benchmark_run(dump_path: str, output_config: dict, use_prefilter: bool, input_mode: str,
+                  repeat: int) -> float:
+    """
+    Returns best time of whole run: reading, selection, extraction and (if output_config is given) writing.
+    """
+
+    best = None
+    for _ in range(repeat):
+        if output_config and os.path.exists(output_config['path']):
+            os.remove(output_config['path'])
+
+        start = time.perf_counter()
+        records = select_and_extract_records_to_csv(dump_path, use_prefilter, input_mode)
+        if output_config:
+            dump_records(records, output_config)
+        else:
+            for _ in records:
+                pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def run(records_number: int, repeat: int, output_formats: List[str], seed: int = 0) -> Dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dump_path = os.path.join(temp_dir, 'synthetic.marc')
+        dump_size = generate_dump(dump_path, records_number, seed=seed)
+
+        runs = {'select_and_extract': (None, False, INPUT_MODE_STREAM),
+                'select_and_extract.prefilter': (None, True, INPUT_MODE_STREAM),
+                'select_and_extract.mmap': (None, False, INPUT_MODE_MMAP)}
+        for output_format in output_formats:
+            output_config = {'format': output_format,
+                             'path': os.path.join(temp_dir, DEFAULT_OUTPUT_PATHS[output_format]),
+                             'append': False}
+            runs[f'end_to_end.{output_format}'] = (output_config, False, INPUT_MODE_STREAM)
+
+        for name, (output_config, use_prefilter, input_mode) in runs.items():
+            try:
+                elapsed = benchmark_run(dump_path, output_config, use_prefilter, input_mode, repeat)
+            except MissingOptionalDependency as e:
+                end_to_end_benchmark_logger.warning(f'{name} skipped: {e}')
+                continue
+            results[f'{name}.records_per_second'] = records_number / elapsed
+            results[f'{name}.bytes_per_second'] = dump_size / elapsed
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end throughput of selection, extraction and output. '
+                                                 'Run from repository root (configuration is read from there).')
+    parser.add_argument('--records', type=int, default=DEFAULT_RECORDS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--formats', nargs='*', default=DEFAULT_OUTPUT_FORMATS, choices=DEFAULT_OUTPUT_FORMATS)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    for logger_name in ('baselines', 'end_to_end_benchmark'):
+        logging.getLogger(logger_name).setLevel(logging.INFO)
+    logging.getLogger('atrributes_extractors').setLevel(logging.CRITICAL)
+    logging.getLogger('marc_reader').setLevel(logging.CRITICAL)
+
+    results = run(args.records, args.repeat, args.formats)
+    if args.update_baselines:
+        store_baselines(results)
+        end_to_end_benchmark_logger.info('Baselines updated.')
+    else:
+        sys.exit(1 if compare_with_baselines(results, args.tolerance) else 0)
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import inspect
+import logging
+import argparse
+import tempfile
+from typing import Callable, Dict, List
+
+from pymarc import Record
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.marc_handling.iso2709 import iter_raw_records
+from commons.marc_handling.record_view import RecordView
+from benchmarks.synthetic_dump import generate_dump
+from benchmarks.baselines import compare_with_baselines, store_baselines, DEFAULT_TOLERANCE
+
+extractors_benchmark_logger = logging.getLogger('extractors_benchmark')
+
+
+DEFAULT_RECORDS = 5000
+DEFAULT_REPEAT = 3
+
+# every public function of attributes_extractors with arguments used in is_selected and extract_to_csv
+EXTRACTOR_CALLS: Dict[str, Callable] = {
+    'get_values_by_field': lambda rcd: attr_extr.get_values_by_field(rcd, '245'),
+    'get_values_by_field_and_subfield': lambda rcd: attr_extr.get_values_by_field_and_subfield(rcd, ('245', ['a', 'b'])),
+    'get_language_of_original': attr_extr.get_language_of_original,
+    'get_language_of_publication': attr_extr.get_language_of_publication,
+    'get_country_of_publication': attr_extr.get_country_of_publication,
+    'is_translation': attr_extr.is_translation,
+    'get_publication_date_from_008': lambda rcd: attr_extr.get_publication_date_from_008(
+        rcd.get_fields('008')[0].data),
+    'get_publication_dates': attr_extr.get_publication_dates,
+    'get_title_of_original': attr_extr.get_title_of_original,
+    'get_audience_characteristics': attr_extr.get_audience_characteristics,
+    'get_publisher_uniform_name': attr_extr.get_publisher_uniform_name,
+    'get_creator': attr_extr.get_creator,
+    'get_cocreator': attr_extr.get_cocreator,
+}
+
+
+def get_uncovered_extractors() -> List[str]:
+    return [name for name, function in inspect.getmembers(attr_extr, inspect.isfunction)
+            if function.__module__ == attr_extr.__name__ and not name.startswith('_') and name not in EXTRACTOR_CALLS]
+
+
+def load_records(path: str) -> List[Record]:
+    with open(path, 'rb') as fp:
+        return [Record(raw_record, to_unicode=True, force_utf8=True, utf8_handling='ignore')
+                for raw_record in iter_raw_records(fp)]
+
+
+def benchmark_extractor(extractor: Callable, records: List[Record], repeat: int) -> float:
+    """
+    Returns records per second (best of repeat runs). Every call gets fresh RecordView,
+    so memoized values don't hide the cost of extractor.
+    """
+
+    views_runs = [[RecordView(record) for record in records] for _ in range(repeat)]
+    best = None
+    for views in views_runs:
+        start = time.perf_counter()
+        for view in views:
+            try:
+                extractor(view)
+            except Exception:
+                # invalid records (e.g. without 008) fail in extractors the same way as in a real run
+                pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(records) / best if best else 0.0
+
+
+def run(records_number: int, repeat: int, seed: int = 0) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dump_path = os.path.join(temp_dir, 'synthetic.marc')
+        generate_dump(dump_path, records_number, seed=seed)
+        records = load_records(dump_path)
+
+    return {f'extractor.{name}.records_per_second': benchmark_extractor(extractor, records, repeat)
+            for name, extractor in EXTRACTOR_CALLS.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of attributes extractors.')
+    parser.add_argument('--records', type=int, default=DEFAULT_RECORDS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baselines', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('atrributes_extractors').setLevel(logging.CRITICAL)
+
+    for uncovered in get_uncovered_extractors():
+        extractors_benchmark_logger.warning(f'No benchmark for extractor {uncovered}.')
+
+    results = run(args.records, args.repeat)
+    if args.update_baselines:
+        store_baselines(results)
+        extractors_benchmark_logger.info('Baselines updated.')
+    else:
+        sys.exit(1 if compare_with_baselines(results, args.tolerance) else 0)
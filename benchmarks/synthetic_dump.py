@@ -0,0 +1,144 @@
+import random
+import argparse
+from typing import List, Optional
+
+from commons.marc_handling.iso2709 import encode_record, EncodableField
+
+# probabilities used by generator, every one of them can be overridden
+DEFAULT_MIX = {'translation': 0.4,
+               'polish_publication': 0.7,
+               'field_041': 0.6,
+               'field_246': 0.4,
+               'field_700': 0.7,
+               'malformed_008': 0.05,
+               'missing_008': 0.01,
+               'missing_009': 0.02,
+               'form_of_work': 0.9}
+
+LANGUAGES = ['eng', 'ger', 'fre', 'rus', 'ita', 'spa']
+FORMS_OF_WORK = ['Książki', 'Książki', 'E-booki', 'Artykuły', 'Czasopisma']
+GENRES = ['Powieść', 'Poezja', 'Nadbitki i odbitki', 'Opracowanie']
+RELATOR_TERMS = ['Tł.', 'Przekład', 'Red.', 'Il.', 'Wstęp', 'Oprac.']
+
+
+def create_008(rnd: random.Random, mix: dict, language: str) -> Optional[str]:
+    if rnd.random() < mix['missing_008']:
+        return None
+
+    date_type = rnd.choice('srpteqm')
+    date_1 = rnd.choice(['1905', '1918', '1950', '19uu', '1989', '2001', '2020', '2023'])
+    date_2 = rnd.choice(['9999', '2005', '1910', '    ', '2024'])
+    v_008 = f'210101{date_type}{date_1}{date_2}pl {"a" * 17}{language} d'
+
+    if rnd.random() < mix['malformed_008']:
+        v_008 = rnd.choice([v_008[:20], v_008[:6], v_008.replace(date_1, 'xx-x'), v_008 + ' extra'])
+    return v_008
+
+
+def create_record(number: int, rnd: random.Random, mix: dict) -> List[EncodableField]:
+    is_translation = rnd.random() < mix['translation']
+    language = 'pol' if rnd.random() < mix['polish_publication'] else rnd.choice(LANGUAGES)
+    original_language = rnd.choice(LANGUAGES)
+
+    fields: List[EncodableField] = [('001', f'b{number:09d}')]
+    if rnd.random() >= mix['missing_009']:
+        fields.append(('009', f'99{number:012d}05066'))
+    v_008 = create_008(rnd, mix, language)
+    if v_008 is not None:
+        fields.append(('008', v_008))
+
+    if rnd.random() < 0.5:
+        fields.append(('020', '  ', [('a', f'978-83-{number:07d}')]))
+    if rnd.random() < mix['field_041']:
+        subfields = [('a', language)]
+        if is_translation:
+            subfields.append(('h', rnd.choice([original_language, original_language + 'fre',
+                                               f'{original_language} fre'])))
+        if rnd.random() < 0.1:
+            subfields.append(('k', rnd.choice(LANGUAGES)))
+        fields.append(('041', '1 ' if is_translation else '0 ', subfields))
+    if rnd.random() < 0.3:
+        fields.append(('044', '  ', [('a', rnd.choice(['pl', 'pl  us ', 'gw']))]))
+    fields.append(('080', '  ', [('a', f'821.{rnd.randint(0, 999)}-3')]))
+    if rnd.random() < 0.3:
+        fields.append(('084', '  ', [('a', str(rnd.randint(1, 20)))]))
+
+    if rnd.random() < 0.8:
+        fields.append(('100', '1 ', [('a', f'Autor{rnd.randint(0, 5000)}, Jan'), ('d', '(1900-1980).'),
+                                     ('e', 'Autor')]))
+    statement = rnd.choice(['Jan Kowalski ; tł. Anna Nowak.', 'Jan Kowalski ; przekład Anna Nowak.']) \
+        if is_translation else rnd.choice(['Jan Kowalski.', 'Jan Kowalski ; streszcz. Anna Nowak.'])
+    fields.append(('245', '10', [('a', f'Tytuł {number} :'), ('b', 'podtytuł /'), ('c', statement)]))
+    if rnd.random() < mix['field_246']:
+        fields.append(('246', '1 ', [('i', 'Tyt. oryg.:' if is_translation else 'Tyt. okł.:'),
+                                     ('a', f'Original title {number}')]))
+    if rnd.random() < 0.3:
+        fields.append(('250', '  ', [('a', 'Wyd. 2 /')]))
+    if rnd.random() < 0.95:
+        fields.append(('260', '  ', [('a', rnd.choice(['Warszawa :', '[Kraków] ; Warszawa [etc.] :'])),
+                                     ('b', rnd.choice(['Znak,', 'PWN : Wyd. ; X'])),
+                                     ('c', rnd.choice(['2005.', 'cop. 1999', '[19--]', '1923']))]))
+    fields.append(('300', '  ', [('a', f'{rnd.randint(20, 900)} s. ;'), ('c', '20 cm')]))
+    if rnd.random() < mix['form_of_work']:
+        fields.append(('380', '  ', [('a', rnd.choice(FORMS_OF_WORK))]))
+    if rnd.random() < 0.3:
+        fields.append(('385', '  ', [('m', 'Grupa wiekowa'), ('a', 'Dzieci')]))
+    if rnd.random() < 0.2:
+        fields.append(('386', '  ', [('a', 'Pisarze polscy')]))
+    fields.append(('655', ' 4', [('a', rnd.choice(GENRES))]))
+
+    if rnd.random() < mix['field_700']:
+        for position in range(rnd.randint(1, 3)):
+            relator_terms = ['Tł.'] if is_translation and position == 0 else rnd.sample(RELATOR_TERMS, 1)
+            fields.append(('700', '1 ', [('a', f'Współtwórca{rnd.randint(0, 5000)}, Anna'), ('d', '(1970- ).')]
+                           + [('e', relator_term) for relator_term in relator_terms]))
+    if rnd.random() < 0.6:
+        fields.append(('710', '2 ', [('a', rnd.choice(['Wydawnictwo Znak', 'PWN', 'Czytelnik'])), ('4', 'pbl')]))
+    if rnd.random() < 0.1:
+        fields.append(('800', '1 ', [('a', 'Autor'), ('t', 'Seria'), ('v', '3')]))
+    if rnd.random() < 0.2:
+        fields.append(('830', ' 0', [('a', 'Seria'), ('v', str(rnd.randint(1, 50)))]))
+
+    return fields
+
+
+def generate_dump(path: str, records: int, mix: Optional[dict] = None, seed: int = 0) -> int:
+    """
+    Write synthetic dump with given number of records, returns its size in bytes.
+    Generated dump depends only on records, mix and seed.
+    """
+
+    mix = {**DEFAULT_MIX, **(mix or {})}
+    rnd = random.Random(seed)
+
+    size = 0
+    with open(path, 'wb') as fp:
+        for number in range(records):
+            raw_record = encode_record(create_record(number, rnd, mix))
+            fp.write(raw_record)
+            size += len(raw_record)
+
+    return size
+
+
+def parse_mix(values: List[str]) -> dict:
+    mix = {}
+    for value in values:
+        name, probability = value.split('=')
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'Unknown mix parameter: {name}.')
+        mix[name] = float(probability)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic MARC 21 dump (ISO 2709).')
+    parser.add_argument('path')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mix', nargs='*', default=[], metavar='NAME=PROBABILITY',
+                        help=f'override probabilities: {", ".join(DEFAULT_MIX)}')
+    args = parser.parse_args()
+
+    dump_size = generate_dump(args.path, args.records, parse_mix(args.mix), args.seed)
+    print(f'{args.records} records ({dump_size} bytes) written to {args.path}.')
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import logging
+from typing import Iterator, Optional, Union
+
+checkpoint_logger = logging.getLogger('checkpoint')
+
+
+DEFAULT_CHECKPOINT_EVERY_RECORDS = 100000
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+
+
+class InputPosition(object):
+    """
+    Position in dump consistent with output written so far: all records before offset
+    (and none after it) have their output passed to sink, when consistent is True.
+    """
+
+    __slots__ = ('offset', 'records', 'consistent')
+
+    def __init__(self, offset: int = 0, records: int = 0):
+        self.offset = offset
+        self.records = records
+        self.consistent = True
+
+
+def track_input_position(raw_records: Iterator[Union[bytes, memoryview]],
+                         position: InputPosition) -> Iterator[Union[bytes, memoryview]]:
+    # records are consumed one by one, so when the consumer yields output of a record, position is right after it
+    for raw_record in raw_records:
+        position.offset += len(raw_record)
+        position.records += 1
+        yield raw_record
+
+
+def get_dump_identity(path_to_raw_db: str) -> dict:
+    stat = os.stat(path_to_raw_db)
+    return {'path': os.path.abspath(path_to_raw_db), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def write_checkpoint_file(path: str, checkpoint: dict) -> None:
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wt', encoding='utf-8') as fp:
+        json.dump(checkpoint, fp, indent=2)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(temp_path, path)
+
+
+def read_checkpoint_file(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rt', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+class Checkpointer(object):
+    """
+    Periodically stores input byte offset, number of records read and output position (after flush),
+    so interrupted run can be resumed: input is read from the offset and output truncated to the position.
+    """
+
+    def __init__(self, path: str, dump_identity: dict, fingerprint: str, output_path: str,
+                 every_records: int = DEFAULT_CHECKPOINT_EVERY_RECORDS, position: Optional[InputPosition] = None):
+        self.path = path
+        self.dump_identity = dump_identity
+        self.fingerprint = fingerprint
+        self.output_path = output_path
+        self.every_records = every_records
+        self.position = position or InputPosition()
+        self.last_checkpoint_records = self.position.records
+
+    def checkpoint(self, sink, completed: bool = False) -> None:
+        checkpoint = {'dump': self.dump_identity,
+                      'fingerprint': self.fingerprint,
+                      'output_path': self.output_path,
+                      'input_offset': self.position.offset,
+                      'records': self.position.records,
+                      'output_position': sink.get_position(),
+                      'completed': completed,
+                      'time': time.time()}
+        write_checkpoint_file(self.path, checkpoint)
+        self.last_checkpoint_records = self.position.records
+
+    def maybe_checkpoint(self, sink) -> None:
+        position = self.position
+        if position.consistent and position.records - self.last_checkpoint_records >= self.every_records:
+            self.checkpoint(sink)
+
+    def complete(self, sink) -> None:
+        self.checkpoint(sink, completed=True)
+        checkpoint_logger.info(f'Run completed, {self.position.records} records read, checkpoint in {self.path}.')
+
+    def validate(self, checkpoint: dict) -> Optional[str]:
+        """
+        Returns reason, why stored checkpoint can't be used for this run, or None.
+        """
+
+        if checkpoint.get('dump') != self.dump_identity:
+            return 'dump has changed'
+        if checkpoint.get('fingerprint') != self.fingerprint:
+            return 'selection or extraction has changed'
+        if checkpoint.get('output_path') != self.output_path:
+            return 'output path has changed'
+        return None
@@ -0,0 +1,134 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+from commons.marc_handling.iso2709 import get_raw_control_field
+
+delta_index_logger = logging.getLogger('delta_index')
+
+
+CHANGE_UNCHANGED = 'unchanged'
+CHANGE_ADDED = 'added'
+CHANGE_CHANGED = 'changed'
+CHANGE_DELETED = 'deleted'
+
+COMMIT_EVERY = 50000
+
+
+def get_raw_mms_id(raw_record: Union[bytes, memoryview]) -> Optional[str]:
+    """
+    Get MMS ID (first 009) straight from raw record, without decoding other fields.
+    """
+
+    return get_raw_control_field(raw_record, b'009')
+
+
+def get_content_hash(raw_record: Union[bytes, memoryview]) -> bytes:
+    return hashlib.blake2b(raw_record, digest_size=16).digest()
+
+
+def get_extraction_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Hash of files defining selection and extraction (code, configuration),
+    stored rows are valid only for the same fingerprint.
+    """
+
+    fingerprint = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        with open(path, 'rb') as fp:
+            fingerprint.update(fp.read())
+
+    return fingerprint.hexdigest()
+
+
+class DeltaIndex(object):
+    """
+    Persistent sidecar index (SQLite) of all records from previous run:
+    MMS ID -> content hash of the raw record and its extracted row (NULL for not selected records).
+    Used to re-run selection and extraction only for new or changed records.
+    """
+
+    def __init__(self, path_to_index: str, extraction_fingerprint: str):
+        if os.path.dirname(path_to_index) and not os.path.exists(os.path.dirname(path_to_index)):
+            os.makedirs(os.path.dirname(path_to_index))
+
+        self.connection = sqlite3.connect(path_to_index)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS records '
+                                '(mms_id TEXT PRIMARY KEY, content_hash BLOB, row TEXT, run_id INTEGER)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+
+        stored_fingerprint = self.get_metadata('extraction_fingerprint')
+        if stored_fingerprint != extraction_fingerprint:
+            if stored_fingerprint is not None:
+                delta_index_logger.info('Selection or extraction changed since last run, all records will be processed.')
+            # rows are kept to report changes, but hashes won't match, so every record is processed again
+            self.connection.execute('UPDATE records SET content_hash = NULL')
+            self.set_metadata('extraction_fingerprint', extraction_fingerprint)
+
+        self.run_id = int(self.get_metadata('last_run_id') or 0) + 1
+        self.set_metadata('last_run_id', str(self.run_id))
+
+        self.pending_seen = []
+        self.pending_updates = []
+
+    def get_metadata(self, key: str) -> Optional[str]:
+        row = self.connection.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_metadata(self, key: str, value: str) -> None:
+        self.connection.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (key, value))
+
+    def lookup(self, mms_id: str) -> Optional[Tuple[Optional[bytes], Optional[dict]]]:
+        """
+        Returns (content hash, row) stored for the MMS ID in previous run or None for new record.
+        """
+
+        stored = self.connection.execute('SELECT content_hash, row FROM records WHERE mms_id = ?',
+                                         (mms_id,)).fetchone()
+        if stored is None:
+            return None
+
+        return stored[0], json.loads(stored[1]) if stored[1] else None
+
+    def mark_unchanged(self, mms_id: str) -> None:
+        self.pending_seen.append((self.run_id, mms_id))
+        self.flush_if_needed()
+
+    def store(self, mms_id: str, content_hash: bytes, row: Optional[dict]) -> None:
+        self.pending_updates.append((mms_id, content_hash, json.dumps(row, ensure_ascii=False) if row else None,
+                                     self.run_id))
+        self.flush_if_needed()
+
+    def flush_if_needed(self) -> None:
+        if len(self.pending_seen) + len(self.pending_updates) >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.connection:
+            self.connection.executemany('UPDATE records SET run_id = ? WHERE mms_id = ?', self.pending_seen)
+            self.connection.executemany('INSERT OR REPLACE INTO records (mms_id, content_hash, row, run_id) '
+                                        'VALUES (?, ?, ?, ?)', self.pending_updates)
+        self.pending_seen = []
+        self.pending_updates = []
+
+    def finish_run(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Yield (MMS ID, row) of selected records missing in this run and remove all missing records from the index.
+        """
+
+        self.flush()
+
+        deleted = self.connection.execute('SELECT mms_id, row FROM records WHERE run_id != ? AND row IS NOT NULL',
+                                          (self.run_id,))
+        for mms_id, row in deleted:
+            yield mms_id, json.loads(row)
+
+        with self.connection:
+            self.connection.execute('DELETE FROM records WHERE run_id != ?', (self.run_id,))
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
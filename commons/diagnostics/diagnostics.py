@@ -0,0 +1,163 @@
+import json
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from typing import Optional
+
+diagnostics_logger = logging.getLogger('diagnostics')
+
+
+MISSING_008 = 'missing_008'
+MISSING_246_TITLE = 'missing_246_abnp'
+MISSING_385_VALUE = 'missing_385_a'
+MISSING_710_NAME = 'missing_710_a'
+MISSING_100_NAME = 'missing_100_abcdn'
+MISSING_700_NAME = 'missing_700_abcdn'
+EXTRACTION_FAILED = 'extraction_failed'
+DECODING_FAILED = 'decoding_failed'
+
+DIAGNOSTIC_MESSAGES = {MISSING_008: 'Brak pola 008.',
+                       MISSING_246_TITLE: 'Brak podpola |abnp w polu 246 mimo obecności podpola |i.',
+                       MISSING_385_VALUE: 'Brak podpola |a w polu 385 mimo obecności podpola |m.',
+                       MISSING_710_NAME: 'Brak podpola |a w polu 710 mimo obecności podpola |4.',
+                       MISSING_100_NAME: 'Brak podpola |abcdn w polu 100 mimo obecności podpola |e.',
+                       MISSING_700_NAME: 'Brak podpola |abcdn w polu 700 mimo obecności podpola |e.',
+                       EXTRACTION_FAILED: 'Błąd ekstrakcji rekordu.',
+                       DECODING_FAILED: 'Błąd dekodowania rekordu.'}
+
+DEFAULT_DIAGNOSTICS_PATH = 'diagnostics.jsonl'
+DEFAULT_EVENTS_PER_SECOND = 100
+DEFAULT_EVENTS_BURST = 1000
+
+
+def get_control_field_value(rcd, tag: str) -> Optional[str]:
+    fields = rcd.get_fields(tag)
+    return fields[0].value() if fields else None
+
+
+class Diagnostics(object):
+    """
+    Issues found in records, reported as structured events (code, MMS ID, 001, tag, detail).
+    Every issue is counted; events are rate-limited per code (token bucket) and written as JSON lines
+    by background thread, so reporting never waits for disk.
+    In worker processes events are collected locally and sent to main process with results of shard.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_DIAGNOSTICS_PATH,
+                 events_per_second: float = DEFAULT_EVENTS_PER_SECOND, burst: int = DEFAULT_EVENTS_BURST):
+        self.path = path
+        self.events_per_second = events_per_second
+        self.burst = burst
+
+        self.counts = Counter()
+        self.written = Counter()
+        self.buckets = {}
+
+        self.events_queue = queue.SimpleQueue()
+        self.writer = None
+        self.collected_events = None
+
+    def allow(self, code: str) -> bool:
+        now = time.monotonic()
+        tokens, last = self.buckets.get(code, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.events_per_second)
+        if tokens < 1:
+            self.buckets[code] = (tokens, now)
+            return False
+        self.buckets[code] = (tokens - 1, now)
+        return True
+
+    def report(self, code: str, rcd=None, tag: Optional[str] = None, detail: Optional[str] = None) -> None:
+        self.counts[code] += 1
+        if not self.allow(code):
+            return
+
+        event = {'code': code,
+                 'message': DIAGNOSTIC_MESSAGES.get(code, code),
+                 'mms_id': get_control_field_value(rcd, '009') if rcd is not None else None,
+                 'record_id': get_control_field_value(rcd, '001') if rcd is not None else None,
+                 'tag': tag,
+                 'detail': detail}
+        self.emit(event)
+
+    def emit(self, event: dict) -> None:
+        self.written[event['code']] += 1
+        if self.collected_events is not None:
+            self.collected_events.append(event)
+            return
+        if not self.path:
+            return
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_events, name='diagnostics-writer', daemon=True)
+            self.writer.start()
+        self.events_queue.put(event)
+
+    def write_events(self) -> None:
+        with open(self.path, 'wt', encoding='utf-8') as fp:
+            while True:
+                event = self.events_queue.get()
+                if event is None:
+                    break
+                fp.write(f'{json.dumps(event, ensure_ascii=False)}\n')
+
+    def collect_locally(self) -> None:
+        # in worker process (writer thread isn't inherited by fork); cleared for every shard
+        self.counts.clear()
+        self.written.clear()
+        self.collected_events = []
+
+    def export(self) -> dict:
+        return {'counts': dict(self.counts), 'events': self.collected_events or []}
+
+    def merge(self, exported: dict) -> None:
+        self.counts.update(exported['counts'])
+        for event in exported['events']:
+            if self.allow(event['code']):
+                self.emit(event)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.events_queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+        if not self.counts:
+            return
+        diagnostics_logger.info('Diagnostics summary:')
+        diagnostics_logger.info(f'{"code":<24}{"count":>12}{"written":>12}  message')
+        for code, count in self.counts.most_common():
+            diagnostics_logger.info(f'{code:<24}{count:>12}{self.written[code]:>12}  '
+                                    f'{DIAGNOSTIC_MESSAGES.get(code, "")}')
+        if self.path:
+            diagnostics_logger.info(f'Diagnostic events written to {self.path}.')
+
+
+_diagnostics: Optional[Diagnostics] = None
+
+
+def start_diagnostics(diagnostics_config: Optional[dict]) -> Diagnostics:
+    """
+    Configure diagnostics from diagnostics section of source_db.yaml:
+    path (JSON lines, empty to only count issues), events_per_second and burst (rate limit for every code).
+    """
+
+    global _diagnostics
+    diagnostics_config = diagnostics_config or {}
+    _diagnostics = Diagnostics(diagnostics_config.get('path', DEFAULT_DIAGNOSTICS_PATH),
+                               diagnostics_config.get('events_per_second') or DEFAULT_EVENTS_PER_SECOND,
+                               diagnostics_config.get('burst') or DEFAULT_EVENTS_BURST)
+    return _diagnostics
+
+
+def get_diagnostics() -> Diagnostics:
+    global _diagnostics
+    # issues are only counted, unless diagnostics were started with configuration
+    if _diagnostics is None:
+        _diagnostics = Diagnostics(path=None)
+    return _diagnostics
+
+
+def report_issue(code: str, rcd=None, tag: Optional[str] = None, detail: Optional[str] = None) -> None:
+    get_diagnostics().report(code, rcd, tag, detail)
@@ -1,35 +1,301 @@
 import os
+import json
 import logging
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError
 
-from exceptions.custom_exceptions import SkipDownloadButNoDb
+from exceptions.custom_exceptions import Marc2CsvException, SkipDownloadButNoDb, DownloadFailed
 
 
 logger = logging.getLogger(__name__)
 
 DATA_BN_AUTHORITIES_DB_URL = "http://data.bn.org.pl/db/institutions/"
 
+PART_SUFFIX = '.part'
+METADATA_SUFFIX = '.meta.json'
 
-def create_url(source_db_name: str) -> str:
-    return f"{DATA_BN_AUTHORITIES_DB_URL}{source_db_name}"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+DEFAULT_DOWNLOAD_RETRIES = 3
+STREAM_POLL_INTERVAL = 0.1
+DEFAULT_DOWNLOAD_WORKERS = 4
 
 
-def get_raw_db(source_db_name: str, skip_download: bool) -> str:
+def create_url(source_db_name: str, base_url: str = DATA_BN_AUTHORITIES_DB_URL) -> str:
+    return f"{base_url}{source_db_name}"
+
+
+def load_download_metadata(path_to_file: str) -> dict:
+    try:
+        with open(f'{path_to_file}{METADATA_SUFFIX}', 'rt', encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_download_metadata(path_to_file: str, metadata: dict) -> None:
+    with open(f'{path_to_file}{METADATA_SUFFIX}', 'wt', encoding='utf-8') as fp:
+        json.dump(metadata, fp)
+
+
+def remove_download_metadata(path_to_file: str) -> None:
+    if os.path.exists(f'{path_to_file}{METADATA_SUFFIX}'):
+        os.remove(f'{path_to_file}{METADATA_SUFFIX}')
+
+
+def get_validators(response: requests.Response) -> dict:
+    return {'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')}
+
+
+class DownloadState(object):
+    """
+    Shared state of download running in background thread,
+    used by DownloadStreamReader to follow the file, while it is being written.
+    """
+
+    def __init__(self):
+        self.path_to_read = None
+        self.file_ready = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+
+    def set_file_ready(self, path_to_read: str) -> None:
+        if not self.file_ready.is_set():
+            self.path_to_read = path_to_read
+            self.file_ready.set()
+
+
+def download_db(db_url: str,
+                path_to_file: str,
+                conditional: bool = True,
+                resume: bool = True,
+                max_retries: int = DEFAULT_DOWNLOAD_RETRIES,
+                state: Optional[DownloadState] = None,
+                session: Optional[requests.Session] = None) -> bool:
+    """
+    Download db dump to path_to_file.
+    With conditional, ETag / Last-Modified stored next to the file are sent and the file is kept, if not modified.
+    With resume, partial download (path_to_file.part) is continued with HTTP Range request,
+    also after connection drops (up to max_retries times).
+    Returns True, if the file was downloaded, False, if it was not modified.
+    """
+
+    path_to_part = f'{path_to_file}{PART_SUFFIX}'
+    attempt = 0
+    restarted_while_streaming = False
+
+    while True:
+        headers = {'Accept-Encoding': 'identity'}
+
+        file_metadata = load_download_metadata(path_to_file)
+        if conditional and os.path.exists(path_to_file) and file_metadata.get('url') == db_url:
+            if file_metadata.get('etag'):
+                headers['If-None-Match'] = file_metadata['etag']
+            if file_metadata.get('last_modified'):
+                headers['If-Modified-Since'] = file_metadata['last_modified']
+
+        part_metadata = load_download_metadata(path_to_part)
+        part_size = os.path.getsize(path_to_part) if os.path.exists(path_to_part) else 0
+        part_validator = part_metadata.get('etag') or part_metadata.get('last_modified')
+        if resume and part_size and part_validator and part_metadata.get('url') == db_url:
+            headers['Range'] = f'bytes={part_size}-'
+            headers['If-Range'] = part_validator
+
+        try:
+            with (session or requests).get(db_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                if r.status_code == 304:
+                    logger.info(f'{path_to_file} not modified since last download.')
+                    if state:
+                        state.set_file_ready(path_to_file)
+                    return False
+
+                r.raise_for_status()
+
+                if r.status_code == 206:
+                    logger.info(f'Resuming download of {db_url} from byte {part_size}.')
+                    mode = 'ab'
+                else:
+                    if state and state.file_ready.is_set():
+                        # parsing has already started on the partial file, it can't be rewritten now
+                        restarted_while_streaming = True
+                        break
+                    mode = 'wb'
+                    part_size = 0
+                    save_download_metadata(path_to_part, {'url': db_url, **get_validators(r)})
+
+                expected_size = r.headers.get('Content-Length')
+                expected_size = part_size + int(expected_size) if expected_size else None
+
+                with open(path_to_part, mode) as fp:
+                    if state:
+                        state.set_file_ready(path_to_part)
+
+                    for chunk in r.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                        fp.write(chunk)
+                        fp.flush()
+
+                    downloaded_size = fp.tell()
+
+                if expected_size is not None and downloaded_size < expected_size:
+                    raise DownloadFailed(f'Download of {db_url} incomplete: {downloaded_size} of {expected_size} bytes.')
+
+                validators = get_validators(r) if r.status_code == 200 else part_metadata
+
+        except (requests.RequestException, HTTPError, DownloadFailed) as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise DownloadFailed(f'Download of {db_url} failed: {e}') from e
+            logger.warning(f'Download of {db_url} interrupted ({e}), retrying ({attempt}/{max_retries}).')
+            continue
+
+        break
+
+    if restarted_while_streaming:
+        raise DownloadFailed(f'Download of {db_url} could not be resumed, while records were already being parsed.')
+
+    os.replace(path_to_part, path_to_file)
+    remove_download_metadata(path_to_part)
+    save_download_metadata(path_to_file, {'url': db_url,
+                                          'etag': validators.get('etag'),
+                                          'last_modified': validators.get('last_modified')})
+    logger.info(f'{db_url} downloaded to {path_to_file}.')
+    return True
+
+
+def get_raw_db(source_db_name: str,
+               skip_download: bool,
+               base_url: str = DATA_BN_AUTHORITIES_DB_URL,
+               conditional: bool = True,
+               resume: bool = True,
+               max_retries: int = DEFAULT_DOWNLOAD_RETRIES,
+               state: Optional[DownloadState] = None,
+               session: Optional[requests.Session] = None) -> str:
     path_to_file = f"db/{source_db_name}"
 
     if skip_download:
         if not os.path.exists(path_to_file):
             raise SkipDownloadButNoDb
+        if state:
+            state.set_file_ready(path_to_file)
     else:
         if not os.path.exists("db"):
             os.makedirs("db")
 
-        db_url = create_url(source_db_name)
-
-        with requests.get(db_url, stream=True) as r:
-            with open(path_to_file, 'wb') as fp:
-                shutil.copyfileobj(r.raw, fp)
+        db_url = create_url(source_db_name, base_url)
+        download_db(db_url, path_to_file, conditional, resume, max_retries, state, session)
 
     return path_to_file
+
+
+def create_download_session(pool_size: int) -> requests.Session:
+    # one connection pool shared by concurrent downloads (connections to the same host are reused)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_raw_dbs_concurrently(downloads: Dict[str, dict],
+                             workers: int = DEFAULT_DOWNLOAD_WORKERS) -> Iterator[Tuple[str, Future]]:
+    """
+    Run get_raw_db(**options) for every named download in thread pool over pooled session.
+    Yields (name, future) in order of completion, so the first downloaded dump can be processed,
+    while the others are still downloading; future.result() is the path or raises the download error.
+    """
+
+    workers = max(1, min(workers, len(downloads)))
+    with create_download_session(workers) as session, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as executor:
+        futures = {executor.submit(get_raw_db, session=session, **options): name for name, options in downloads.items()}
+        for future in as_completed(futures):
+            yield futures[future], future
+
+
+class DownloadStreamReader(object):
+    """
+    Read-only file-like object following the db dump, while it is still being downloaded.
+    read() blocks until requested number of bytes arrives or the download finishes.
+    """
+
+    def __init__(self, state: DownloadState):
+        self.state = state
+
+        while not self.state.file_ready.wait(STREAM_POLL_INTERVAL):
+            self.raise_for_error()
+            if self.state.finished.is_set():
+                raise DownloadFailed('Download finished without any file to read.')
+
+        self.fp = open(self.state.path_to_read, 'rb')
+
+    def raise_for_error(self) -> None:
+        if isinstance(self.state.error, Marc2CsvException):
+            raise self.state.error
+        if self.state.error is not None:
+            raise DownloadFailed(f'{self.state.error}') from self.state.error
+
+    def read(self, size: int = -1) -> bytes:
+        data = []
+        remaining = size
+
+        while True:
+            chunk = self.fp.read(remaining)
+            data.append(chunk)
+            if size >= 0:
+                remaining -= len(chunk)
+                if remaining == 0:
+                    break
+
+            if self.state.finished.is_set():
+                self.raise_for_error()
+                # catch bytes written between the last read and the end of download
+                data.append(self.fp.read(remaining))
+                break
+
+            self.state.finished.wait(STREAM_POLL_INTERVAL)
+
+        return b''.join(data)
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+@contextmanager
+def open_raw_db_while_downloading(source_db_name: str,
+                                  base_url: str = DATA_BN_AUTHORITIES_DB_URL,
+                                  conditional: bool = True,
+                                  resume: bool = True,
+                                  max_retries: int = DEFAULT_DOWNLOAD_RETRIES):
+    """
+    Download db dump in background thread and give file-like object to parse records,
+    while bytes are still arriving.
+    """
+
+    state = DownloadState()
+
+    def download():
+        try:
+            get_raw_db(source_db_name, False, base_url, conditional, resume, max_retries, state)
+        except BaseException as e:
+            state.error = e
+        finally:
+            state.finished.set()
+
+    download_thread = threading.Thread(target=download, name=f'download-{source_db_name}', daemon=True)
+    download_thread.start()
+
+    reader = DownloadStreamReader(state)
+    try:
+        yield reader
+    finally:
+        reader.close()
+        download_thread.join()
+
+    reader.raise_for_error()
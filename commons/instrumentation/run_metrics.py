@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import inspect
+import cProfile
+import logging
+from collections import Counter
+from functools import wraps
+from types import ModuleType
+from typing import Callable, Optional
+
+run_metrics_logger = logging.getLogger('run_metrics')
+
+
+STAGE_DECODE = 'decode'
+STAGE_PREFILTER = 'prefilter'
+STAGE_SELECT = 'select'
+STAGE_EXTRACT = 'extract'
+STAGE_NORMALIZE = 'normalize'
+STAGE_WRITE = 'write'
+
+DEFAULT_METRICS_INTERVAL = 30
+DEFAULT_PROFILE_PATH = 'profile.pstats'
+PROMETHEUS_PREFIX = 'marc2csv'
+
+
+def write_atomically(path: str, content: str) -> None:
+    # readers (e.g. node_exporter textfile collector) never see half-written file
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wt', encoding='utf-8') as fp:
+        fp.write(content)
+    os.replace(temp_path, path)
+
+
+class RunMetrics(object):
+    """
+    Counters and cumulative timings of one run. Hot path is instrumented only when metrics are enabled:
+    stages and extractors are timed by wrappers installed on start, so disabled metrics cost nothing.
+    Extractors times are inclusive - extractor calling another extractor is counted in both.
+    """
+
+    def __init__(self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                 interval: float = DEFAULT_METRICS_INTERVAL):
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.next_write = self.start + interval
+
+        self.records = 0
+        self.bytes = 0
+        self.selected = Counter()
+        self.stage_seconds = Counter()
+        self.stage_calls = Counter()
+        self.extractor_seconds = Counter()
+        self.extractor_calls = Counter()
+        # (module, name, original function) of extractors replaced with timed ones, restored on close
+        self.instrumented_extractors = []
+
+    def reset(self) -> None:
+        # counters are cleared in place, installed wrappers keep references to them
+        self.records = 0
+        self.bytes = 0
+        for counter in (self.selected, self.stage_seconds, self.stage_calls,
+                        self.extractor_seconds, self.extractor_calls):
+            counter.clear()
+
+    def count_record(self, size: int) -> None:
+        self.records += 1
+        self.bytes += size
+
+    def timed(self, stage: str, func: Callable) -> Callable:
+        stage_seconds = self.stage_seconds
+        stage_calls = self.stage_calls
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_seconds[stage] += perf_counter() - start
+                stage_calls[stage] += 1
+
+        return wrapper
+
+    def timed_selection(self, func: Callable) -> Callable:
+        timed_func = self.timed(STAGE_SELECT, func)
+        selected = self.selected
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            is_selected_value = timed_func(*args, **kwargs)
+            selected[is_selected_value] += 1
+            return is_selected_value
+
+        return wrapper
+
+    def timed_extractor(self, name: str, func: Callable) -> Callable:
+        extractor_seconds = self.extractor_seconds
+        extractor_calls = self.extractor_calls
+        perf_counter = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                extractor_seconds[name] += perf_counter() - start
+                extractor_calls[name] += 1
+
+        return wrapper
+
+    def instrument_method(self, instance, method_name: str, stage: str) -> None:
+        # instance attribute shadows the method only for this instance
+        method = getattr(instance, method_name)
+        if stage == STAGE_SELECT:
+            setattr(instance, method_name, self.timed_selection(method))
+        else:
+            setattr(instance, method_name, self.timed(stage, method))
+
+    def instrument_extractors(self, module: ModuleType) -> None:
+        """
+        Replace public functions of extractors module with timed ones, until metrics are closed.
+        Has to be called before anything takes references to them (e.g. field mapping is loaded).
+        """
+
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            if function.__module__ == module.__name__ and not name.startswith('_'):
+                self.instrumented_extractors.append((module, name, function))
+                setattr(module, name, self.timed_extractor(name, function))
+
+    def restore_extractors(self) -> None:
+        # the next run in the same process wraps the original functions, not these wrappers
+        for module, name, function in reversed(self.instrumented_extractors):
+            setattr(module, name, function)
+        self.instrumented_extractors = []
+
+    def merge(self, exported: dict) -> None:
+        # counters exported from worker process
+        self.records += exported['records']
+        self.bytes += exported['bytes']
+        for name in ('selected', 'stage_seconds', 'stage_calls', 'extractor_seconds', 'extractor_calls'):
+            getattr(self, name).update(exported[name])
+
+    def export(self) -> dict:
+        return {'records': self.records,
+                'bytes': self.bytes,
+                'selected': dict(self.selected),
+                'stage_seconds': dict(self.stage_seconds),
+                'stage_calls': dict(self.stage_calls),
+                'extractor_seconds': dict(self.extractor_seconds),
+                'extractor_calls': dict(self.extractor_calls)}
+
+    def as_dict(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        return {'started': self.started,
+                'elapsed_seconds': elapsed,
+                'records': self.records,
+                'bytes': self.bytes,
+                'records_per_second': self.records / elapsed if elapsed else 0.0,
+                'bytes_per_second': self.bytes / elapsed if elapsed else 0.0,
+                'selected': {str(value): count for value, count in sorted(self.selected.items())},
+                'selected_ratio': {str(value): count / self.records if self.records else 0.0
+                                   for value, count in sorted(self.selected.items())},
+                'stages': {stage: {'seconds': seconds, 'calls': self.stage_calls[stage]}
+                           for stage, seconds in self.stage_seconds.items()},
+                'extractors': {name: {'seconds': seconds, 'calls': self.extractor_calls[name]}
+                               for name, seconds in sorted(self.extractor_seconds.items())}}
+
+    def as_prometheus_text(self) -> str:
+        metrics = self.as_dict()
+        lines = []
+
+        def add(name: str, metric_type: str, help_text: str, samples: list) -> None:
+            lines.append(f'# HELP {PROMETHEUS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} {metric_type}')
+            for labels, value in samples:
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}{labels} {value}')
+
+        add('records_total', 'counter', 'Records read from dump.', [('', metrics['records'])])
+        add('bytes_total', 'counter', 'Bytes of records read from dump.', [('', metrics['bytes'])])
+        add('elapsed_seconds', 'gauge', 'Time since start of run.', [('', metrics['elapsed_seconds'])])
+        add('records_per_second', 'gauge', 'Average records read per second.',
+            [('', metrics['records_per_second'])])
+        add('bytes_per_second', 'gauge', 'Average bytes read per second.', [('', metrics['bytes_per_second'])])
+        add('selected_total', 'counter', 'Records by is_selected value.',
+            [(f'{{is_selected_value="{value}"}}', count) for value, count in metrics['selected'].items()])
+        add('stage_seconds_total', 'counter', 'Time spent in stage.',
+            [(f'{{stage="{stage}"}}', stage_metrics['seconds']) for stage, stage_metrics in metrics['stages'].items()])
+        add('extractor_seconds_total', 'counter', 'Time spent in extractor (inclusive).',
+            [(f'{{extractor="{name}"}}', extractor_metrics['seconds'])
+             for name, extractor_metrics in metrics['extractors'].items()])
+        add('extractor_calls_total', 'counter', 'Calls of extractor.',
+            [(f'{{extractor="{name}"}}', extractor_metrics['calls'])
+             for name, extractor_metrics in metrics['extractors'].items()])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self) -> None:
+        if self.json_path:
+            write_atomically(self.json_path, json.dumps(self.as_dict(), indent=2))
+        if self.prometheus_path:
+            write_atomically(self.prometheus_path, self.as_prometheus_text())
+        self.next_write = time.perf_counter() + self.interval
+
+    def maybe_write(self) -> None:
+        if time.perf_counter() >= self.next_write:
+            self.write()
+
+    def close(self) -> None:
+        self.restore_extractors()
+        self.write()
+        metrics = self.as_dict()
+        run_metrics_logger.info(f"{metrics['records']} records in {metrics['elapsed_seconds']:.1f} s: "
+                                f"{metrics['records_per_second']:.0f} records/s, "
+                                f"{metrics['bytes_per_second'] / 1024 / 1024:.2f} MiB/s.")
+        for stage, stage_metrics in sorted(metrics['stages'].items(), key=lambda item: -item[1]['seconds']):
+            run_metrics_logger.info(f"Stage {stage}: {stage_metrics['seconds']:.2f} s.")
+
+
+class ProfilingWindow(object):
+    """
+    cProfile enabled only for records from start to start + records (counted in main process),
+    so production-sized runs can be profiled without profiling overhead for the whole run.
+    """
+
+    def __init__(self, start: int, records: int, path: str = DEFAULT_PROFILE_PATH):
+        self.start = start
+        self.end = start + records
+        self.path = path
+        self.profiler = cProfile.Profile()
+
+    def switch(self, counter: int) -> int:
+        """
+        Called, when record counter reaches returned value; returns counter of the next switch (-1 for none).
+        """
+
+        if counter == self.start:
+            self.profiler.enable()
+            return self.end
+
+        self.profiler.disable()
+        self.profiler.dump_stats(self.path)
+        run_metrics_logger.info(f'Profile of records {self.start}-{self.end} written to {self.path}.')
+        return -1
+
+
+_run_metrics: Optional[RunMetrics] = None
+_profiling_window: Optional[ProfilingWindow] = None
+
+
+def start_run_metrics(metrics_config: Optional[dict]) -> Optional[RunMetrics]:
+    """
+    Enable metrics from metrics section of source_db.yaml:
+    json_path, prometheus_path, interval (seconds), extractors, profile (start, records, path).
+    """
+
+    global _run_metrics, _profiling_window
+    # metrics of previous run in the same process are never counted into again
+    _run_metrics = None
+    _profiling_window = None
+    if not metrics_config:
+        return None
+
+    _run_metrics = RunMetrics(metrics_config.get('json_path'),
+                              metrics_config.get('prometheus_path'),
+                              metrics_config.get('interval') or DEFAULT_METRICS_INTERVAL)
+
+    profile_config = metrics_config.get('profile')
+    if profile_config:
+        _profiling_window = ProfilingWindow(profile_config.get('start') or 0,
+                                            profile_config.get('records') or 10000,
+                                            profile_config.get('path') or DEFAULT_PROFILE_PATH)
+
+    return _run_metrics
+
+
+def get_run_metrics() -> Optional[RunMetrics]:
+    return _run_metrics
+
+
+def get_profiling_window() -> Optional[ProfilingWindow]:
+    return _profiling_window
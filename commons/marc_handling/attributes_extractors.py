@@ -4,29 +4,59 @@ from typing import Union, Tuple, Optional, List
 
 from pymarc import Record, Field
 
+from commons.marc_handling.lazy_record import LazyRecord, LightField
+from commons.marc_handling.record_view import RecordView, memoized_per_record
+from commons.normalization.value_cache import cached_normalization, intern_value
+from commons.diagnostics.diagnostics import report_issue, MISSING_008, MISSING_246_TITLE, MISSING_385_VALUE, \
+    MISSING_710_NAME, MISSING_100_NAME, MISSING_700_NAME
+
 atrributes_extractors_logger = logging.getLogger('atrributes_extractors')
 
+TRANSLATION_IN_700_E = re.compile('TŁ|PRZEKŁ|PRZEŁ')
+TRANSLATION_IN_245_C = re.compile(r'TŁ\.|PRZEKŁ\.|PRZEŁ\.|TŁUM\.|TŁUMACZENIE|PRZEKŁAD|PRZEŁOŻYŁ')
+NOT_DIGIT = re.compile(r'\D')
+DATE_AT_THE_END = re.compile(r'\s*,\s*\d+$')
+
+# tags read by the extractors below (field cache keeps only the tags read by selection and extraction)
+EXTRACTORS_TAGS = ('008', '041', '044', '100', '245', '246', '260', '385', '700', '710')
+
 
-def get_values_by_field(pymarc_rcd: Record,
+@memoized_per_record
+def get_values_by_field(pymarc_rcd: Union[Record, RecordView],
                         field: str) -> List[str]:
 
     return [v.value() for v in pymarc_rcd.get_fields(field)]
 
 
-def get_values_by_field_and_subfield(pymarc_record_or_field: Union[Record, Field],
+def get_values_by_field_and_subfield(pymarc_record_or_field: Union[Record, LazyRecord, RecordView, Field,
+                                                                  LightField],
                                      field_and_subfields: Tuple[Optional[str], List[str]]) -> List[str]:
     """
     Get values from whole record: by field or by field and subfield;
     or get values directly from field or from field and subfield.
     Returns list of values or empty list.
+    Values taken from RecordView are memoized per record.
     """
 
-    values_to_return = []
     field, subfields = field_and_subfields[0], field_and_subfields[1]
 
-    if type(pymarc_record_or_field) == Record:
-        field, subfields = field_and_subfields[0], field_and_subfields[1]
+    if type(pymarc_record_or_field) is RecordView:
+        key = (field, *subfields)
+        memo = pymarc_record_or_field.memo
+        if key not in memo:
+            memo[key] = _get_values_by_field_and_subfield(pymarc_record_or_field, field, subfields)
+        return memo[key]
+
+    return _get_values_by_field_and_subfield(pymarc_record_or_field, field, subfields)
 
+
+def _get_values_by_field_and_subfield(pymarc_record_or_field: Union[Record, LazyRecord, RecordView, Field,
+                                                                   LightField],
+                                      field: Optional[str],
+                                      subfields: List[str]) -> List[str]:
+    values_to_return = []
+
+    if not isinstance(pymarc_record_or_field, (Field, LightField)):
         if subfields:
             if field in pymarc_record_or_field:
                 raw_objects_fields_list = pymarc_record_or_field.get_fields(field)
@@ -48,10 +78,51 @@ def get_values_by_field_and_subfield(pymarc_record_or_field: Union[Record, Field
     return values_to_return
 
 
-def get_language_of_original(pymarc_rcd: Record) -> list:
+# cleaning of values repeating across records is cached (commons.normalization.value_cache),
+# cached values are shared, so they must not be modified in place
+@cached_normalization('041_h_language_codes')
+def _split_language_codes(lang_041_h: str) -> list:
+    lang_041_h = lang_041_h.strip()
+    lang_041_h = lang_041_h.replace('  ', ' ')
+    if ' ' in lang_041_h:
+        return lang_041_h.split(' ')
+    if not len(lang_041_h) % 3:
+        return [lang_041_h[i:i+3] for i in range(0, len(lang_041_h), 3)]
+
+    # some very strange case, probably invalid data
+    return [lang_041_h]
+
+
+@cached_normalization('044_a_country_codes')
+def _split_country_codes(country_from_044_a: str) -> list:
+    country_from_044_a = country_from_044_a.rstrip()
+    country_from_044_a = country_from_044_a.replace('  ', ' ')
+    country_from_044_a = country_from_044_a.split(' ')
+    return [country.rstrip() for country in country_from_044_a]
+
+
+@cached_normalization('260_b_publisher_name')
+def _clean_publisher_name(publisher_name_from_260_b: str) -> Union[str, list]:
+    publisher_name_from_260_b = publisher_name_from_260_b.strip().rstrip(',.:;').strip()
+    if ' : ' in publisher_name_from_260_b:
+        publisher_name_from_260_b = publisher_name_from_260_b.split(' : ')
+    if ' ; ' in publisher_name_from_260_b:
+        publisher_name_from_260_b = publisher_name_from_260_b.split(' ; ')
+    return publisher_name_from_260_b
+
+
+@cached_normalization('person_name')
+def _clean_person_name(raw_value: str) -> str:
+    return raw_value.strip().rstrip('.').strip()
+
+
+@memoized_per_record
+def get_language_of_original(pymarc_rcd: Union[Record, RecordView]) -> list:
     language_orig = []
 
-    lang_008 = get_values_by_field(pymarc_rcd, '008')[0][35:38]
+    # without 008 only 041 $h is used (missing 008 is reported once, by get_publication_dates)
+    values_008 = get_values_by_field(pymarc_rcd, '008')
+    lang_008 = intern_value(values_008[0][35:38]) if values_008 else ''
     lang_041_h = get_values_by_field_and_subfield(pymarc_rcd, ('041', ['h']))
 
     if lang_008 and not lang_041_h:
@@ -60,29 +131,20 @@ def get_language_of_original(pymarc_rcd: Record) -> list:
         if len(lang_041_h) == 1 and len(lang_041_h[0]) == 3:
             language_orig = lang_041_h
         if len(lang_041_h) == 1 and len(lang_041_h[0]) > 3:
-            lang_041_h = lang_041_h[0].strip()
-            lang_041_h = lang_041_h.replace('  ', ' ')
-            if ' ' in lang_041_h:
-                language_orig = lang_041_h.split(' ')
-            else:
-                if not len(lang_041_h) % 3:
-                    language_orig = [lang_041_h[i:i+3] for i in range(0, len(lang_041_h), 3)]
-
-                else:
-                    # some very strange case, probably invalid data
-                    language_orig = [lang_041_h]
+            language_orig = _split_language_codes(lang_041_h[0])
     else:
         language_orig = lang_041_h
 
     return language_orig
 
 
-def get_language_of_publication(pymarc_rcd: Record) -> list:
+@memoized_per_record
+def get_language_of_publication(pymarc_rcd: Union[Record, RecordView]) -> list:
     language_of_publication = set()
     lang_from_008 = None
 
     if get_values_by_field(pymarc_rcd, '008'):
-        lang_from_008 = get_values_by_field(pymarc_rcd, '008')[0][35:38]
+        lang_from_008 = intern_value(get_values_by_field(pymarc_rcd, '008')[0][35:38])
     lang_from_041_a = get_values_by_field_and_subfield(pymarc_rcd, ('041', ['a']))
 
     if lang_from_008:
@@ -93,28 +155,25 @@ def get_language_of_publication(pymarc_rcd: Record) -> list:
     return list(language_of_publication)
 
 
-def get_country_of_publication(pymarc_rcd: Record) -> list:
+@memoized_per_record
+def get_country_of_publication(pymarc_rcd: Union[Record, RecordView]) -> list:
     country_of_publication = set()
     country_from_008 = None
 
     if get_values_by_field(pymarc_rcd, '008'):
-        country_from_008 = get_values_by_field(pymarc_rcd, '008')[0][15:18]
-        country_from_008 = country_from_008.rstrip()
+        country_from_008 = intern_value(get_values_by_field(pymarc_rcd, '008')[0][15:18].rstrip())
     country_from_044_a = get_values_by_field_and_subfield(pymarc_rcd, ('044', ['a']))
 
     if country_from_008:
         country_of_publication.add(country_from_008)
     if country_from_044_a:
-        country_from_044_a = country_from_044_a[0]
-        country_from_044_a = country_from_044_a.rstrip()
-        country_from_044_a = country_from_044_a.replace('  ', ' ')
-        country_from_044_a = country_from_044_a.split(' ')
-        country_of_publication.update([country.rstrip() for country in country_from_044_a])
+        country_of_publication.update(_split_country_codes(country_from_044_a[0]))
 
     return list(country_of_publication)
 
 
-def is_translation(pymarc_rcd: Record) -> bool:
+@memoized_per_record
+def is_translation(pymarc_rcd: Union[Record, RecordView]) -> bool:
     result = False
 
     val_700_e = get_values_by_field_and_subfield(pymarc_rcd, ('700', ['e']))
@@ -125,34 +184,49 @@ def is_translation(pymarc_rcd: Record) -> bool:
     val_245_c_joined = ''.join(val_245_c)
     val_245_c_joined = val_245_c_joined.upper()
 
-    transl_700_e = False
-    if 'TŁ' in val_700_e_joined or 'PRZEKŁ' in val_700_e_joined or 'PRZEŁ' in val_700_e_joined:
-        transl_700_e = True
-    if transl_700_e and 'STRESZCZ' not in val_245_c_joined:
-        result = True
-
-    transl_245_c = False
-    if 'TŁ.' in val_245_c_joined or 'PRZEKŁ.' in val_245_c_joined or 'PRZEŁ.' in val_245_c_joined \
-            or 'TŁUM.' in val_245_c_joined or 'TŁUMACZENIE' in val_245_c_joined or 'PRZEKŁAD' in val_245_c_joined \
-            or 'PRZEŁOŻYŁ' in val_245_c_joined:
-        transl_245_c = True
-    if transl_245_c and 'STRESZCZ' not in val_245_c_joined:
+    transl_700_e = TRANSLATION_IN_700_E.search(val_700_e_joined) is not None
+    transl_245_c = TRANSLATION_IN_245_C.search(val_245_c_joined) is not None
+    if (transl_700_e or transl_245_c) and 'STRESZCZ' not in val_245_c_joined:
         result = True
 
     return result
 
 
+def get_publication_date_from_008(v_008: str) -> Optional[int]:
+    publication_date_single = None
+
+    v_008_0710 = v_008[7:11].replace('u', '0').replace(' ', '0').replace('X', '0')
+
+    if v_008[6] in ['r', 's', 'p', 't']:
+        try:
+            publication_date_single = int(v_008_0710)
+        except ValueError:
+            pass
+    else:
+        v_008_1114 = v_008[11:15].replace('u', '0').replace(' ', '0').replace('X', '0')
+
+        try:
+            # the end date is taken only when the start date (07-10) is a number too
+            int(v_008_0710)
+            publication_date_to = int(v_008_1114)
+            if publication_date_to != 9999:
+                publication_date_single = publication_date_to
+        except ValueError:
+            pass
+
+    return publication_date_single
+
+
+@memoized_per_record
 def get_publication_dates(pymarc_rcd) -> Optional[int]:
     publication_date_single = None
-    publication_date_from = None
-    publication_date_to = None
     publication_date_from_260 = None
 
     val_260c = get_values_by_field_and_subfield(pymarc_rcd, ('260', ['c']))
     try:
         if val_260c:
             val_260c = val_260c[0]
-            extracted_date = ''.join(gr for gr in re.findall(r'\d', val_260c))
+            extracted_date = NOT_DIGIT.sub('', val_260c)
             if extracted_date:
                 val_260c = extracted_date
                 publication_date_from_260 = val_260c
@@ -160,47 +234,14 @@ def get_publication_dates(pymarc_rcd) -> Optional[int]:
         pass
 
     try:
-        v_008_06 = get_values_by_field(pymarc_rcd, '008')[0][6]
+        v_008 = get_values_by_field(pymarc_rcd, '008')[0]
+        v_008_06 = v_008[6]
     except IndexError:
-        if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-            atrributes_extractors_logger.error(f"Brak pola 008."
-                                               f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-        else:
-            atrributes_extractors_logger.error(f"Brak pola 008."
-                                               f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+        report_issue(MISSING_008, pymarc_rcd, '008')
         v_008_06 = None
 
     if v_008_06:
-        if v_008_06 in ['r', 's', 'p', 't']:
-            try:
-                v_008_0710 = get_values_by_field(pymarc_rcd,
-                                                 '008')[0][7:11].replace('u', '0').replace(' ', '0').replace('X', '0')
-            except IndexError:
-                v_008_0710 = None
-
-            try:
-                publication_date_single = int(v_008_0710)
-            except ValueError:
-                pass
-        else:
-            try:
-                v_008_0710 = get_values_by_field(pymarc_rcd,
-                                                 '008')[0][7:11].replace('u', '0').replace(' ', '0').replace('X', '0')
-                v_008_1114 = get_values_by_field(pymarc_rcd,
-                                                 '008')[0][11:15].replace('u', '0').replace(' ', '0').replace('X', '0')
-            except IndexError:
-                v_008_0710 = None
-                v_008_1114 = None
-
-            try:
-                publication_date_from = int(v_008_0710)
-                publication_date_to = int(v_008_1114)
-                if publication_date_to == 9999:
-                    publication_date_to = None
-                else:
-                    publication_date_single = publication_date_to
-            except ValueError:
-                pass
+        publication_date_single = get_publication_date_from_008(v_008)
 
     if not publication_date_single and publication_date_from_260:
         try:
@@ -212,6 +253,7 @@ def get_publication_dates(pymarc_rcd) -> Optional[int]:
     return publication_date_single
 
 
+@memoized_per_record
 def get_title_of_original(pymarc_rcd):
     orig_title_i_list = ['Tyt. oryg.:', 'Tyt. oryg.', 'Tyt. oryg', 'Tyt.oryg.:', 'Tyt.oryg.', 'Tyt.oryg',
                          'Tytuł oryginału:', 'Tytuł oryginału', 'Tytułoryginału', 'Przekład z:']
@@ -226,16 +268,11 @@ def get_title_of_original(pymarc_rcd):
                 title_of_original_raw_value = title_246_raw_field.get_subfields('a', 'b', 'n', 'p')[0]
                 break
             else:
-                if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-                    atrributes_extractors_logger.error(f"Brak podpola |abnp w polu 246 mimo obecności podpola |i. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-                else:
-                    atrributes_extractors_logger.error(f"Brak podpola |abnp w polu 246 mimo obecności podpola |i. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+                report_issue(MISSING_246_TITLE, pymarc_rcd, '246')
 
     if title_of_original_raw_value:
         # get rid of publication date from title from 246
-        match = re.search(r'\s*,\s*\d+$', title_of_original_raw_value)
+        match = DATE_AT_THE_END.search(title_of_original_raw_value)
         if match:
             title_of_original_final = title_of_original_raw_value[:match.span(0)[0]]
         else:
@@ -245,6 +282,7 @@ def get_title_of_original(pymarc_rcd):
     return title_of_original_final
 
 
+@memoized_per_record
 def get_audience_characteristics(pymarc_rcd) -> list:
     audience_characteristics_final = []
 
@@ -254,18 +292,14 @@ def get_audience_characteristics(pymarc_rcd) -> list:
                 and 'Grupa wiekowa' in audience_characteristics_raw_field.get_subfields('m')[0]:
             if audience_characteristics_raw_field.get_subfields('a'):
                 audience_characteristics_raw_value = audience_characteristics_raw_field.get_subfields('a')[0]
-                audience_characteristics_final.append(audience_characteristics_raw_value)
+                audience_characteristics_final.append(intern_value(audience_characteristics_raw_value))
             else:
-                if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-                    atrributes_extractors_logger.error(f"Brak podpola |a w polu 385 mimo obecności podpola |m. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-                else:
-                    atrributes_extractors_logger.error(f"Brak podpola |a w polu 385 mimo obecności podpola |m. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+                report_issue(MISSING_385_VALUE, pymarc_rcd, '385')
 
     return audience_characteristics_final
 
 
+@memoized_per_record
 def get_publisher_uniform_name(pymarc_rcd) -> list:
     publisher_uniform_name_final = []
 
@@ -275,24 +309,14 @@ def get_publisher_uniform_name(pymarc_rcd) -> list:
                 and 'pbl' in publisher_uniform_name_raw_field.get_subfields('4')[0]:
             if publisher_uniform_name_raw_field.get_subfields('a'):
                 publisher_uniform_name_raw_value = publisher_uniform_name_raw_field.get_subfields('a')[0]
-                publisher_uniform_name_final.append(publisher_uniform_name_raw_value)
+                publisher_uniform_name_final.append(intern_value(publisher_uniform_name_raw_value))
             else:
-                if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-                    atrributes_extractors_logger.error(f"Brak podpola |a w polu 710 mimo obecności podpola |4. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-                else:
-                    atrributes_extractors_logger.error(f"Brak podpola |a w polu 710 mimo obecności podpola |4. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+                report_issue(MISSING_710_NAME, pymarc_rcd, '710')
 
     if not publisher_uniform_name_final:
         publisher_name_from_260_b = get_values_by_field_and_subfield(pymarc_rcd, ('260', ['b']))
         if publisher_name_from_260_b:
-            publisher_name_from_260_b = publisher_name_from_260_b[0]
-            publisher_name_from_260_b = publisher_name_from_260_b.strip().rstrip(',.:;').strip()
-            if ' : ' in publisher_name_from_260_b:
-                publisher_name_from_260_b = publisher_name_from_260_b.split(' : ')
-            if ' ; ' in publisher_name_from_260_b:
-                publisher_name_from_260_b = publisher_name_from_260_b.split(' ; ')
+            publisher_name_from_260_b = _clean_publisher_name(publisher_name_from_260_b[0])
         if type(publisher_name_from_260_b) == list:
             publisher_uniform_name_final.extend(publisher_name_from_260_b)
         else:
@@ -301,6 +325,7 @@ def get_publisher_uniform_name(pymarc_rcd) -> list:
     return publisher_uniform_name_final
 
 
+@memoized_per_record
 def get_creator(pymarc_rcd) -> list:
     creators_final = []
 
@@ -311,16 +336,11 @@ def get_creator(pymarc_rcd) -> list:
             if creator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n'):
                 creator_raw_value = creator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n')
                 creator_raw_value = ' '.join(creator_raw_value)
-                creator_raw_value = creator_raw_value.strip().rstrip('.').strip()
+                creator_raw_value = _clean_person_name(creator_raw_value)
                 creator_final = f'{creator_raw_value} [{creator_responsibilities}]'
                 creators_final.append(creator_final)
             else:
-                if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-                    atrributes_extractors_logger.error(f"Brak podpola |abcdn w polu 100 mimo obecności podpola |e. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-                else:
-                    atrributes_extractors_logger.error(f"Brak podpola |abcdn w polu 100 mimo obecności podpola |e. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+                report_issue(MISSING_100_NAME, pymarc_rcd, '100')
         else:
             if creator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n'):
                 creator_raw_value = creator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n')
@@ -330,6 +350,7 @@ def get_creator(pymarc_rcd) -> list:
     return creators_final
 
 
+@memoized_per_record
 def get_cocreator(pymarc_rcd) -> list:
     cocreators_final = []
 
@@ -340,16 +361,11 @@ def get_cocreator(pymarc_rcd) -> list:
             if cocreator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n'):
                 cocreator_raw_value = cocreator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n')
                 cocreator_raw_value = ' '.join(cocreator_raw_value)
-                cocreator_raw_value = cocreator_raw_value.strip().rstrip('.').strip()
+                cocreator_raw_value = _clean_person_name(cocreator_raw_value)
                 cocreator_final = f'{cocreator_raw_value} [{cocreator_responsibilities}]'
                 cocreators_final.append(cocreator_final)
             else:
-                if pymarc_rcd.get_fields('001') and pymarc_rcd.get_fields('009'):
-                    atrributes_extractors_logger.error(f"Brak podpola |abcdn w polu 700 mimo obecności podpola |e. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}, {pymarc_rcd.get_fields('009')[0].value()}")
-                else:
-                    atrributes_extractors_logger.error(f"Brak podpola |abcdn w polu 700 mimo obecności podpola |e. "
-                                                       f"|| {pymarc_rcd.get_fields('001')[0].value()}")
+                report_issue(MISSING_700_NAME, pymarc_rcd, '700')
         else:
             if cocreator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n'):
                 cocreator_raw_value = cocreator_raw_field.get_subfields('a', 'b', 'c', 'd', 'n')
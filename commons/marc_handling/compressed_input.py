@@ -0,0 +1,276 @@
+import io
+import bz2
+import gzip
+import zlib
+import struct
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional
+
+from exceptions.custom_exceptions import MissingOptionalDependency
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compressed_input_logger = logging.getLogger('compressed_input')
+
+
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_BZ2 = 'bz2'
+COMPRESSION_ZSTD = 'zstd'
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'BZh'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZSTD_SKIPPABLE_MAGIC_MASK = 0xFFFFFFF0
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+HEADER_SIZE = 18
+
+READ_CHUNK_SIZE = 1024 * 1024
+BGZF_BLOCKS_PER_TASK = 64
+PENDING_TASKS_PER_WORKER = 4
+
+
+def detect_compression(header: bytes) -> Optional[str]:
+    if header.startswith(GZIP_MAGIC):
+        return COMPRESSION_GZIP
+    if header.startswith(BZ2_MAGIC):
+        return COMPRESSION_BZ2
+    if header.startswith(ZSTD_MAGIC):
+        return COMPRESSION_ZSTD
+    return None
+
+
+def detect_file_compression(path: str) -> Optional[str]:
+    with open(path, 'rb') as fp:
+        return detect_compression(fp.read(HEADER_SIZE))
+
+
+def is_bgzf(header: bytes) -> bool:
+    # BGZF (blocked gzip, e.g. from bgzip): FEXTRA flag and BC subfield with size of the block
+    return len(header) >= HEADER_SIZE and header[3] & 4 and header[12:14] == b'BC' and header[14:16] == b'\x02\x00'
+
+
+def require_zstandard() -> None:
+    if zstandard is None:
+        raise MissingOptionalDependency('Zstandard compressed dump requires zstandard (pip install zstandard).')
+
+
+class ChunksReader(io.RawIOBase):
+    """
+    Raw binary stream over iterable of decompressed chunks (to be wrapped in io.BufferedReader).
+    """
+
+    def __init__(self, chunks: Iterable[bytes], source: Optional[BinaryIO] = None):
+        self.chunks = iter(chunks)
+        self.source = source
+        self.current = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.current:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.current = memoryview(chunk)
+
+        size = min(len(buffer), len(self.current))
+        buffer[:size] = self.current[:size]
+        self.current = self.current[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+            if self.source is not None:
+                self.source.close()
+        super().close()
+
+
+def iter_in_parallel(tasks: Iterable, function: Callable, workers: int) -> Iterator:
+    """
+    Like executor.map, but keeps order with bounded number of pending tasks, so the whole input isn't read ahead.
+    """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(function, task))
+            if len(pending) >= workers * PENDING_TASKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_bgzf_blocks(fp: BinaryIO) -> Iterator[bytes]:
+    while True:
+        header = fp.read(HEADER_SIZE)
+        if not header:
+            return
+        if not is_bgzf(header):
+            raise zlib.error('Invalid BGZF block header.')
+        block_size = struct.unpack_from('<H', header, 16)[0] + 1
+        yield header + fp.read(block_size - HEADER_SIZE)
+
+
+def iter_batches(items: Iterable[bytes], batch_size: int) -> Iterator[List[bytes]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def decompress_gzip_members(members: List[bytes]) -> bytes:
+    # zlib releases GIL, so blocks are decompressed in parallel by threads
+    return b''.join(zlib.decompress(member, wbits=31) for member in members)
+
+
+def get_zstd_frame_size(fp: BinaryIO) -> Optional[int]:
+    """
+    Size of zstd frame starting at current position of fp (read from frame and block headers only),
+    None at the end of file. Position of fp is left at the end of frame.
+    """
+
+    start = fp.tell()
+    magic = fp.read(4)
+    if not magic:
+        return None
+    if len(magic) < 4:
+        raise ValueError('Truncated zstd frame.')
+
+    magic_number = struct.unpack('<I', magic)[0]
+    if magic_number & ZSTD_SKIPPABLE_MAGIC_MASK == ZSTD_SKIPPABLE_MAGIC:
+        fp.seek(struct.unpack('<I', fp.read(4))[0], 1)
+        return fp.tell() - start
+    if magic != ZSTD_MAGIC:
+        raise ValueError('Invalid zstd frame.')
+
+    descriptor = fp.read(1)[0]
+    content_size_flag = descriptor >> 6
+    single_segment = descriptor >> 5 & 1
+    has_checksum = descriptor >> 2 & 1
+    dictionary_id_size = (0, 1, 2, 4)[descriptor & 3]
+    content_size_size = (single_segment, 2, 4, 8)[content_size_flag]
+    fp.seek((0 if single_segment else 1) + dictionary_id_size + content_size_size, 1)
+
+    while True:
+        block_header = fp.read(3)
+        if len(block_header) < 3:
+            raise ValueError('Truncated zstd frame.')
+        block_header = int.from_bytes(block_header, 'little')
+        last_block = block_header & 1
+        block_type = block_header >> 1 & 3
+        # RLE block has only one byte of content
+        fp.seek(1 if block_type == 1 else block_header >> 3, 1)
+        if last_block:
+            break
+
+    if has_checksum:
+        fp.seek(4, 1)
+    return fp.tell() - start
+
+
+def iter_zstd_frames(fp: BinaryIO) -> Iterator[bytes]:
+    while True:
+        start = fp.tell()
+        frame_size = get_zstd_frame_size(fp)
+        if frame_size is None:
+            return
+        fp.seek(start)
+        yield fp.read(frame_size)
+
+
+def is_zstd_multi_frame(path: str) -> bool:
+    with open(path, 'rb') as fp:
+        fp.seek(0, 2)
+        file_size = fp.tell()
+        fp.seek(0)
+        try:
+            return get_zstd_frame_size(fp) < file_size
+        except (ValueError, IndexError, struct.error):
+            return False
+
+
+def decompress_zstd_frame(frame: bytes) -> bytes:
+    # frames without content size in header can't be decompressed with ZstdDecompressor.decompress
+    return zstandard.ZstdDecompressor().decompressobj().decompress(frame)
+
+
+def open_dump(path: str, decompression_workers: int = 1) -> BinaryIO:
+    """
+    Open dump for sequential reading, decompressing it on the fly, if it is compressed (detected by magic bytes).
+    BGZF and multi-frame zstd are decompressed in parallel by decompression_workers threads.
+    """
+
+    compression = detect_file_compression(path)
+    if compression is None:
+        return open(path, 'rb')
+
+    parallel = decompression_workers > 1
+    if compression == COMPRESSION_GZIP:
+        with open(path, 'rb') as fp:
+            bgzf = is_bgzf(fp.read(HEADER_SIZE))
+        if parallel and bgzf:
+            compressed_input_logger.info(f'Decompressing BGZF {path} with {decompression_workers} threads.')
+            fp = open(path, 'rb')
+            chunks = iter_in_parallel(iter_batches(iter_bgzf_blocks(fp), BGZF_BLOCKS_PER_TASK),
+                                      decompress_gzip_members, decompression_workers)
+            return io.BufferedReader(ChunksReader(chunks, fp), READ_CHUNK_SIZE)
+        return gzip.open(path, 'rb')
+
+    if compression == COMPRESSION_BZ2:
+        return bz2.open(path, 'rb')
+
+    require_zstandard()
+    if parallel and is_zstd_multi_frame(path):
+        compressed_input_logger.info(f'Decompressing zstd frames of {path} with {decompression_workers} threads.')
+        fp = open(path, 'rb')
+        chunks = iter_in_parallel(iter_zstd_frames(fp), decompress_zstd_frame, decompression_workers)
+        return io.BufferedReader(ChunksReader(chunks, fp), READ_CHUNK_SIZE)
+    reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+    return io.BufferedReader(reader, READ_CHUNK_SIZE)
+
+
+def open_dump_stream(fp: BinaryIO) -> BinaryIO:
+    """
+    Wrap sequential (non-seekable) stream, e.g. dump being downloaded, decompressing it if it is compressed.
+    """
+
+    header = fp.read(HEADER_SIZE)
+    stream = io.BufferedReader(ChunksReader(chain([header], iter(lambda: fp.read(READ_CHUNK_SIZE), b''))),
+                               READ_CHUNK_SIZE)
+
+    compression = detect_compression(header)
+    if compression == COMPRESSION_GZIP:
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == COMPRESSION_BZ2:
+        return bz2.BZ2File(stream, 'rb')
+    if compression == COMPRESSION_ZSTD:
+        require_zstandard()
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True),
+                                 READ_CHUNK_SIZE)
+    return stream
+
+
+def skip_to(fp: BinaryIO, offset: int) -> None:
+    # decompressed streams can't seek, the data before offset is read and dropped
+    if offset and fp.seekable():
+        fp.seek(offset)
+        return
+    remaining = offset
+    while remaining:
+        chunk = fp.read(min(remaining, READ_CHUNK_SIZE))
+        if not chunk:
+            return
+        remaining -= len(chunk)
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Iterable, Optional
+
+from commons.checkpoint.checkpoint import get_dump_identity
+from commons.instrumentation.run_metrics import write_atomically
+from commons.marc_handling.compressed_input import open_dump
+from commons.marc_handling.input_formats import iter_input_records, INPUT_FORMAT_ISO2709
+from commons.marc_handling.iso2709 import filter_raw_fields
+from commons.marc_handling.lazy_record import LazyRecord
+
+field_cache_logger = logging.getLogger('field_cache')
+
+
+FIELD_CACHE_SUFFIX = '.fields'
+FIELD_CACHE_METADATA_SUFFIX = '.json'
+FIELD_CACHE_VERSION = 1
+# control fields always kept: MMS ID (key of the cache) and record ID (reported in diagnostics)
+ALWAYS_CACHED_TAGS = ('001', '009')
+HASH_CHUNK_SIZE = 1024 * 1024
+PROGRESS_UPDATE_STEP = 100000
+
+
+def get_file_hash(path: str) -> str:
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def read_field_cache_metadata(cache_path: str) -> Optional[dict]:
+    metadata_path = f'{cache_path}{FIELD_CACHE_METADATA_SUFFIX}'
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, 'rt', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def get_stale_reason(cache_path: str, metadata: Optional[dict], path_to_raw_db: str, tags: set,
+                     input_format: str) -> Optional[str]:
+    """
+    Why field cache can't be used for the dump (None, if it can). The dump is hashed only when its size
+    or modification time changed; metadata of cache valid for the same content is updated.
+    """
+
+    if metadata is None or metadata.get('version') != FIELD_CACHE_VERSION:
+        return 'no field cache'
+    if not os.path.exists(cache_path) or os.path.getsize(cache_path) != metadata.get('cache_size'):
+        return 'field cache file is missing or incomplete'
+    if metadata.get('input_format') != input_format:
+        return f'field cache was built from {metadata.get("input_format")} dump'
+    missing_tags = sorted(tags - set(metadata.get('tags') or []))
+    if missing_tags:
+        return f'tags {", ".join(missing_tags)} are not in field cache'
+
+    dump_identity = get_dump_identity(path_to_raw_db)
+    if dump_identity == metadata.get('dump'):
+        return None
+    if get_file_hash(path_to_raw_db) != metadata.get('dump_hash'):
+        return 'dump changed'
+
+    write_atomically(f'{cache_path}{FIELD_CACHE_METADATA_SUFFIX}',
+                     json.dumps({**metadata, 'dump': dump_identity}, indent=2))
+    return None
+
+
+def build_field_cache(path_to_raw_db: str, cache_path: str, tags: set, input_format: str = INPUT_FORMAT_ISO2709,
+                      decompression_workers: int = 1) -> None:
+    """
+    Convert the dump (any input format and compression) to ISO 2709 records with fields of given tags only.
+    Records rejected by decoding are copied whole, so they are rejected again when cache is read.
+    """
+
+    tags_bytes = {tag.encode('ascii') for tag in tags}
+    temp_path = f'{cache_path}.tmp'
+    records = 0
+    with open_dump(path_to_raw_db, decompression_workers) as fp, open(temp_path, 'wb') as cache_fp:
+        for raw_record in iter_input_records(fp, input_format):
+            if records % PROGRESS_UPDATE_STEP == 0:
+                field_cache_logger.info(f'Cached {records} records.')
+            records += 1
+
+            try:
+                LazyRecord(raw_record)
+            except Exception:
+                cache_fp.write(raw_record)
+                continue
+            cache_fp.write(filter_raw_fields(raw_record, tags_bytes) or raw_record)
+
+    os.replace(temp_path, cache_path)
+    metadata = {'version': FIELD_CACHE_VERSION,
+                'dump': get_dump_identity(path_to_raw_db),
+                'dump_hash': get_file_hash(path_to_raw_db),
+                'input_format': input_format,
+                'tags': sorted(tags),
+                'records': records,
+                'cache_size': os.path.getsize(cache_path)}
+    write_atomically(f'{cache_path}{FIELD_CACHE_METADATA_SUFFIX}', json.dumps(metadata, indent=2))
+    field_cache_logger.info(f'Field cache {cache_path} built: {records} records, '
+                            f'{metadata["cache_size"]} bytes ({os.path.getsize(path_to_raw_db)} bytes of dump).')
+
+
+def get_field_cache(path_to_raw_db: str, cache_path: Optional[str], tags: Iterable[str],
+                    input_format: str = INPUT_FORMAT_ISO2709, decompression_workers: int = 1) -> str:
+    """
+    Path to field cache of the dump (default: <dump path>.fields) with at least given tags,
+    built (or rebuilt, when the dump or needed tags changed) if needed.
+    """
+
+    cache_path = cache_path or f'{path_to_raw_db}{FIELD_CACHE_SUFFIX}'
+    tags = set(tags) | set(ALWAYS_CACHED_TAGS)
+
+    reason = get_stale_reason(cache_path, read_field_cache_metadata(cache_path), path_to_raw_db, tags, input_format)
+    if reason is None:
+        field_cache_logger.info(f'Reading records from field cache {cache_path}.')
+        return cache_path
+
+    field_cache_logger.info(f'Building field cache {cache_path} ({reason}).')
+    build_field_cache(path_to_raw_db, cache_path, tags, input_format, decompression_workers)
+    return cache_path
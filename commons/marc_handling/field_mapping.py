@@ -0,0 +1,198 @@
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.configuration_loader import load_config
+from commons.normalization.columnar import ColumnNormalizer
+from commons.normalization.value_cache import intern_value
+from commons.output.parquet_writer import COLUMN_TYPES, STRING, LIST_OF_STRINGS, INT8
+from exceptions.custom_exceptions import InvalidFieldMapping
+
+field_mapping_logger = logging.getLogger('field_mapping')
+
+
+DEFAULT_FIELD_MAPPING_FILE = 'field_mapping.yaml'
+
+
+class TagColumn(object):
+    __slots__ = ('name', 'tag', 'subfields', 'joiner', 'first', 'required', 'cached', 'normalizer')
+
+    def __init__(self, column_spec: dict):
+        self.name = column_spec['name']
+        self.tag = str(column_spec['tag'])
+        self.subfields = tuple(str(subfield) for subfield in column_spec.get('subfields') or [])
+        self.joiner = column_spec.get('joiner', ' ')
+        self.first = bool(column_spec.get('first'))
+        self.required = bool(column_spec.get('required'))
+        self.cached = bool(column_spec.get('cached'))
+        self.normalizer = ColumnNormalizer(column_spec.get('steps') or [], self.name, self.cached)
+
+    def finalize_batch(self, rows: List[dict]) -> None:
+        """
+        Replace collected values of the column in every row with normalized ones;
+        values of all rows are normalized together, as one column.
+        """
+
+        name = self.name
+        if self.first:
+            first_values = [row[name][0] if row[name] else None for row in rows]
+            present_values = [value for value in first_values if value is not None]
+            if self.normalizer:
+                present_values = self.normalizer.normalize(present_values)
+            elif self.cached:
+                present_values = [intern_value(value) for value in present_values]
+            normalized = iter(present_values)
+            for row, value in zip(rows, first_values):
+                row[name] = '' if value is None else next(normalized)
+            return
+
+        if not self.normalizer:
+            if self.cached:
+                for row in rows:
+                    row[name] = intern_value(row[name])
+            return
+
+        normalized = self.normalizer.normalize([value for row in rows for value in row[name]])
+        position = 0
+        for row in rows:
+            row_values = normalized[position:position + len(row[name])]
+            position += len(row[name])
+            row[name] = [value for values in row_values for value in values] if self.normalizer.splits \
+                else row_values
+
+
+class FieldMapping(object):
+    """
+    Column definitions from field_mapping.yaml compiled into one dispatcher:
+    columns taken straight from fields are indexed by tag and filled together
+    in one pass over record's fields; extractor and derived columns are computed afterwards.
+    Values of tag columns are collected per record and normalized in batches of records, column by column.
+    """
+
+    def __init__(self, columns_specs: List[dict]):
+        self.column_names = []
+        # types of output columns (typed outputs, e.g. parquet); None - extractor column without type
+        self.column_types: Dict[str, Optional[str]] = {}
+        self.tag_columns = []
+        self.columns_by_tag: Dict[str, List[TagColumn]] = {}
+        self.extractor_columns = []
+        self.derived_columns = []
+
+        for column_spec in columns_specs:
+            name = column_spec.get('name')
+            if not name or name in self.column_names:
+                raise InvalidFieldMapping(f'Column name missing or duplicated: {column_spec}.')
+            self.column_names.append(name)
+
+            column_type = column_spec.get('type')
+            if column_type is not None and column_type not in COLUMN_TYPES:
+                raise InvalidFieldMapping(f'Type {column_type} of column {name} is not one of: '
+                                          f'{", ".join(COLUMN_TYPES)}.')
+
+            if 'tag' in column_spec:
+                tag_column = TagColumn(column_spec)
+                self.tag_columns.append(tag_column)
+                self.columns_by_tag.setdefault(tag_column.tag, []).append(tag_column)
+                # the first value is a string, unless it is split
+                default_type = STRING if tag_column.first and not tag_column.normalizer.splits else LIST_OF_STRINGS
+            elif 'extractor' in column_spec:
+                extractor = getattr(attr_extr, column_spec['extractor'], None)
+                if not callable(extractor):
+                    raise InvalidFieldMapping(f'Unknown extractor: {column_spec["extractor"]}.')
+                self.extractor_columns.append((name, extractor))
+                default_type = None
+            elif 'from' in column_spec:
+                if column_spec['from'] not in self.column_names:
+                    raise InvalidFieldMapping(f'Column {name} derived from unknown (or later) column.')
+                self.derived_columns.append((name, column_spec['from'],
+                                             column_spec.get('contains'), column_spec.get('not_contains')))
+                default_type = LIST_OF_STRINGS
+            else:
+                raise InvalidFieldMapping(f'Column {name} needs tag, extractor or from.')
+
+            self.column_types[name] = column_type or default_type
+
+        self.column_types['is_selected_value'] = INT8
+
+    def collect_tag_values(self, pymarc_rcd) -> Dict[str, List[str]]:
+        collected = {tag_column.name: [] for tag_column in self.tag_columns}
+        columns_by_tag = self.columns_by_tag
+
+        # only fields of mapped tags are read, so lazily decoded records don't decode the others
+        for tag, tag_columns in columns_by_tag.items():
+            for field in pymarc_rcd.get_fields(tag):
+                for tag_column in tag_columns:
+                    column_values = collected[tag_column.name]
+                    if tag_column.first and column_values:
+                        continue
+                    if tag_column.subfields:
+                        value = tag_column.joiner.join(field.get_subfields(*tag_column.subfields))
+                        if value:
+                            column_values.append(value)
+                    else:
+                        column_values.append(field.value())
+
+        return collected
+
+    def collect(self, pymarc_rcd) -> dict:
+        """
+        Values of one record: raw (not normalized) values of tag columns and values of extractor columns.
+        """
+
+        collected = self.collect_tag_values(pymarc_rcd)
+        for tag_column in self.tag_columns:
+            if tag_column.required and not collected[tag_column.name]:
+                raise ValueError(f'Brak pola {tag_column.tag} wymaganego w kolumnie {tag_column.name}.')
+        for name, extractor in self.extractor_columns:
+            collected[name] = extractor(pymarc_rcd)
+
+        return collected
+
+    def get_used_tags(self) -> Set[str]:
+        # tags read by tag columns and by extractors
+        tags = {tag_column.tag for tag_column in self.tag_columns}
+        if self.extractor_columns:
+            tags.update(attr_extr.EXTRACTORS_TAGS)
+        return tags
+
+    def normalize_batch(self, rows: List[dict]) -> List[dict]:
+        """
+        Normalize tag columns of collected rows and compute derived columns; returns rows with columns in order.
+        """
+
+        for tag_column in self.tag_columns:
+            tag_column.finalize_batch(rows)
+        for row in rows:
+            for name, source_name, contains, not_contains in self.derived_columns:
+                row[name] = [value for value in row[source_name]
+                             if (contains is None or contains in value)
+                             and (not_contains is None or not_contains not in value)]
+
+        column_names = self.column_names
+        return [{name: row[name] for name in column_names} for row in rows]
+
+    def extract(self, pymarc_rcd) -> dict:
+        return self.normalize_batch([self.collect(pymarc_rcd)])[0]
+
+
+_field_mapping: Optional[FieldMapping] = None
+
+
+def load_field_mapping(file: str = DEFAULT_FIELD_MAPPING_FILE) -> FieldMapping:
+    field_mapping_config = load_config(file)
+    if not field_mapping_config or not field_mapping_config.get('columns'):
+        raise InvalidFieldMapping(f'No columns defined in {file}.')
+
+    return FieldMapping(field_mapping_config['columns'])
+
+
+def set_field_mapping(field_mapping: FieldMapping) -> None:
+    global _field_mapping
+    _field_mapping = field_mapping
+
+
+def get_field_mapping() -> FieldMapping:
+    # loaded lazily, if it wasn't set before; forked extraction workers inherit the mapping of main process
+    if _field_mapping is None:
+        set_field_mapping(load_field_mapping())
+    return _field_mapping
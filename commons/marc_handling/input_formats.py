@@ -0,0 +1,129 @@
+import io
+import json
+import logging
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Iterator, List, Optional
+
+from commons.marc_handling.iso2709 import iter_raw_records, encode_record, EncodableField
+from exceptions.custom_exceptions import UnsupportedInputFormat, IncompleteDump
+
+input_formats_logger = logging.getLogger('input_formats')
+
+
+INPUT_FORMAT_ISO2709 = 'iso2709'
+INPUT_FORMAT_MARCXML = 'marcxml'
+INPUT_FORMAT_MARC_JSON = 'marc_json'
+INPUT_FORMATS = (INPUT_FORMAT_ISO2709, INPUT_FORMAT_MARCXML, INPUT_FORMAT_MARC_JSON)
+
+
+def get_local_name(tag: str) -> str:
+    # MARCXML may come with or without namespace (http://www.loc.gov/MARC21/slim)
+    return tag.rsplit('}', 1)[-1]
+
+
+def convert_xml_record(record_element: ET.Element) -> bytes:
+    leader = None
+    fields: List[EncodableField] = []
+    for element in record_element:
+        name = get_local_name(element.tag)
+        if name == 'leader':
+            leader = element.text
+        elif name == 'controlfield':
+            fields.append((element.get('tag', ''), element.text or ''))
+        elif name == 'datafield':
+            subfields = [(subfield.get('code', ''), subfield.text or '') for subfield in element
+                         if get_local_name(subfield.tag) == 'subfield']
+            fields.append((element.get('tag', ''), f"{element.get('ind1', ' ')}{element.get('ind2', ' ')}",
+                           subfields))
+
+    return encode_record(fields, leader)
+
+
+def iter_marcxml_records(fp: BinaryIO, strict: bool = False) -> Iterator[bytes]:
+    """
+    Yield records of MARCXML collection (or single record) as raw ISO 2709 records.
+    Parsed incrementally; every record element is cleared after conversion and dropped from its parent,
+    so memory doesn't grow with size of the file. Invalid records are logged and skipped
+    (raised as IncompleteDump, if strict).
+    """
+
+    parents = []
+    number = 0
+    for event, element in ET.iterparse(fp, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+
+        parents.pop()
+        if get_local_name(element.tag) != 'record':
+            continue
+
+        number += 1
+        try:
+            yield convert_xml_record(element)
+        except ValueError as e:
+            if strict:
+                raise IncompleteDump(f'MARCXML record {number} is invalid: {e}')
+            input_formats_logger.error(f'MARCXML record {number} skipped: {e}')
+
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def convert_json_record(json_record: dict) -> bytes:
+    """
+    MARC-in-JSON record: {"leader": ..., "fields": [{"001": "..."}, {"245": {"ind1": .., "ind2": ..,
+    "subfields": [{"a": "..."}, ...]}}, ...]}.
+    """
+
+    fields: List[EncodableField] = []
+    for field in json_record.get('fields') or []:
+        for tag, value in field.items():
+            if isinstance(value, dict):
+                subfields = [(code, str(subfield_value)) for subfield in value.get('subfields') or []
+                             for code, subfield_value in subfield.items()]
+                fields.append((tag, f"{value.get('ind1') or ' '}{value.get('ind2') or ' '}", subfields))
+            else:
+                fields.append((tag, str(value)))
+
+    return encode_record(fields, json_record.get('leader'))
+
+
+def iter_marc_json_records(fp: BinaryIO, strict: bool = False) -> Iterator[bytes]:
+    """
+    Yield records of line-delimited MARC-in-JSON (one record per line) as raw ISO 2709 records.
+    Invalid lines are logged and skipped (raised as IncompleteDump, if strict).
+    """
+
+    with io.TextIOWrapper(fp, encoding='utf-8', errors='replace') as text_fp:
+        for line_number, line in enumerate(text_fp, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield convert_json_record(json.loads(line))
+            except (ValueError, AttributeError, TypeError) as e:
+                if strict:
+                    raise IncompleteDump(f'MARC-JSON line {line_number} is invalid: {e}')
+                input_formats_logger.error(f'MARC-JSON line {line_number} skipped: {e}')
+
+
+def validate_input_format(input_format: str) -> None:
+    if input_format not in INPUT_FORMATS:
+        raise UnsupportedInputFormat(f'Input format {input_format} is not one of {", ".join(INPUT_FORMATS)}.')
+
+
+def iter_input_records(fp: BinaryIO, input_format: Optional[str] = None, strict: bool = False) -> Iterator[bytes]:
+    """
+    Raw ISO 2709 records from dump in input_format, so MARCXML and MARC-JSON go through the same
+    prefilter, selection and extraction as binary MARC. With strict, records which can't be read
+    raise IncompleteDump instead of being skipped or ending the reading.
+    """
+
+    input_format = input_format or INPUT_FORMAT_ISO2709
+    validate_input_format(input_format)
+    if input_format == INPUT_FORMAT_MARCXML:
+        return iter_marcxml_records(fp, strict)
+    if input_format == INPUT_FORMAT_MARC_JSON:
+        return iter_marc_json_records(fp, strict)
+    return iter_raw_records(fp, strict)
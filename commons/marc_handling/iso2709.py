@@ -0,0 +1,326 @@
+import logging
+import mmap
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from exceptions.custom_exceptions import IncompleteDump
+
+iso2709_logger = logging.getLogger('iso2709')
+
+
+RECORD_LENGTH_LEN = 5
+LEADER_LEN = 24
+DIRECTORY_ENTRY_LEN = 12
+END_OF_RECORD = 0x1d
+FIELD_TERMINATOR = b'\x1e'
+SUBFIELD_DELIMITER = b'\x1f'
+MAX_RECORD_LENGTH = 99999
+MAX_FIELD_LENGTH = 9999
+DEFAULT_LEADER = '00000nam a2200000 i 4500'
+
+# field is (tag, data) for control fields and (tag, indicators, [(code, value), ...]) for data fields
+EncodableField = Union[Tuple[str, str], Tuple[str, str, List[Tuple[str, str]]]]
+
+
+def parse_record_length(first5: bytes) -> Optional[int]:
+    """
+    Parse record length from the first five bytes of ISO 2709 leader.
+    Returns None, if the length is truncated or not numeric.
+    """
+
+    if len(first5) < RECORD_LENGTH_LEN:
+        return None
+
+    try:
+        record_length = int(first5)
+    except ValueError:
+        return None
+    if record_length <= RECORD_LENGTH_LEN:
+        return None
+
+    return record_length
+
+
+def iter_record_offsets(fp: BinaryIO) -> Iterator[Tuple[int, int]]:
+    """
+    Walk through binary MARC file using only record lengths from leaders.
+    Yields (offset, length) of every record, the record bodies are not read.
+    """
+
+    offset = fp.tell()
+    fp.seek(0, 2)
+    file_size = fp.tell()
+    fp.seek(offset)
+
+    while offset < file_size:
+        first5 = fp.read(RECORD_LENGTH_LEN)
+        record_length = parse_record_length(first5)
+
+        if record_length is None or offset + record_length > file_size:
+            iso2709_logger.error(f'Invalid or truncated record at byte {offset}, stopped reading.')
+            return
+
+        yield offset, record_length
+
+        offset += record_length
+        fp.seek(offset)
+
+
+def stop_reading(message: str, strict: bool) -> None:
+    # strict readers raise, so callers, which need the whole dump (delta export), can tell early stop from its end
+    if strict:
+        raise IncompleteDump(message)
+    iso2709_logger.error(message)
+
+
+def get_start_offset(fp: BinaryIO) -> int:
+    # offsets in log messages are relative to the position reading started at, if the stream can't tell it
+    try:
+        return fp.tell()
+    except (OSError, AttributeError):
+        return 0
+
+
+def iter_raw_records(fp: BinaryIO, strict: bool = False) -> Iterator[bytes]:
+    """
+    Yield raw records from binary MARC file object.
+    Unlike permissive pymarc MARCReader (which yields None for such record and reads on), reading stops
+    on the first record with invalid length, truncated or unterminated, as the next record can't be found
+    reliably; the error with byte offset of the record is logged (raised as IncompleteDump, if strict)
+    and records after it are not read.
+    """
+
+    offset = get_start_offset(fp)
+    while True:
+        first5 = fp.read(RECORD_LENGTH_LEN)
+        if not first5:
+            return
+
+        record_length = parse_record_length(first5)
+        if record_length is None:
+            stop_reading(f'Invalid record length {first5} at byte {offset}, stopped reading.', strict)
+            return
+
+        raw_record = first5 + fp.read(record_length - RECORD_LENGTH_LEN)
+        if len(raw_record) < record_length or raw_record[-1] != END_OF_RECORD:
+            stop_reading(f'Truncated or unterminated record at byte {offset}, stopped reading.', strict)
+            return
+
+        yield raw_record
+        offset += record_length
+
+
+def iter_record_slices(buffer: memoryview, strict: bool = False) -> Iterator[memoryview]:
+    """
+    Yield records as memoryview slices of buffer, without copying them (stops like iter_raw_records).
+    Every slice is released when the next one is requested, so it has to be
+    decoded or copied (bytes(slice)) before that, if it is needed later.
+    """
+
+    offset = 0
+    buffer_length = len(buffer)
+
+    while offset < buffer_length:
+        first5 = bytes(buffer[offset:offset + RECORD_LENGTH_LEN])
+        record_length = parse_record_length(first5)
+        if record_length is None:
+            stop_reading(f'Invalid record length {first5} at byte {offset}, stopped reading.', strict)
+            return
+
+        if offset + record_length > buffer_length or buffer[offset + record_length - 1] != END_OF_RECORD:
+            stop_reading(f'Truncated or unterminated record at byte {offset}, stopped reading.', strict)
+            return
+
+        record_slice = buffer[offset:offset + record_length]
+        try:
+            yield record_slice
+        finally:
+            record_slice.release()
+
+        offset += record_length
+
+
+def iter_mmapped_records(path_to_raw_db: str, offset: int = 0, length: Optional[int] = None,
+                         strict: bool = False) -> Iterator[memoryview]:
+    """
+    Memory-map binary MARC file (or its part starting at offset) and yield records as memoryview slices of the map.
+    """
+
+    with open(path_to_raw_db, 'rb') as fp:
+        if not fp.seek(0, 2):
+            return
+
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+
+            with memoryview(mm) as mapped:
+                end = len(mapped) if length is None else offset + length
+                with mapped[offset:end] as buffer:
+                    yield from iter_record_slices(buffer, strict)
+
+
+def parse_directory(raw_record: Union[bytes, memoryview]) -> Optional[Tuple[int, List[Tuple[bytes, int, int]]]]:
+    """
+    Parse leader base address and directory of raw record, without decoding any field.
+    Returns (base address, list of (tag, length, offset)) or None, if the leader or directory is invalid.
+    """
+
+    base_address = bytes(raw_record[12:17])
+    if not base_address.isdigit():
+        return None
+    base_address = int(base_address)
+    if base_address <= LEADER_LEN or base_address >= len(raw_record):
+        return None
+
+    directory = bytes(raw_record[LEADER_LEN:base_address - 1])
+    if len(directory) % DIRECTORY_ENTRY_LEN:
+        return None
+
+    entries = []
+    for entry_start in range(0, len(directory), DIRECTORY_ENTRY_LEN):
+        entry = directory[entry_start:entry_start + DIRECTORY_ENTRY_LEN]
+        entry_length, entry_offset = entry[3:7], entry[7:12]
+        if not entry_length.isdigit() or not entry_offset.isdigit():
+            return None
+        entries.append((bytes(entry[0:3]), int(entry_length), int(entry_offset)))
+
+    return base_address, entries
+
+
+def get_raw_field_data(raw_record: Union[bytes, memoryview], base_address: int, entry: Tuple[bytes, int, int]) -> bytes:
+    _, entry_length, entry_offset = entry
+    field_start = base_address + entry_offset
+
+    return bytes(raw_record[field_start:field_start + entry_length - 1])
+
+
+def get_raw_control_fields(raw_record: Union[bytes, memoryview], tags: Tuple[bytes, ...]) -> Dict[bytes, str]:
+    """
+    Get first values of given control fields (e.g. 001, 009) straight from raw record, without decoding other fields.
+    Missing or empty fields are left out.
+    """
+
+    parsed_directory = parse_directory(raw_record)
+    if parsed_directory is None:
+        return {}
+    base_address, entries = parsed_directory
+
+    values = {}
+    for entry in entries:
+        if entry[0] in tags and entry[0] not in values:
+            values[entry[0]] = get_raw_field_data(raw_record, base_address, entry).decode('utf-8', 'ignore')
+
+    return {tag: value for tag, value in values.items() if value}
+
+
+def get_raw_control_field(raw_record: Union[bytes, memoryview], tag: bytes) -> Optional[str]:
+    return get_raw_control_fields(raw_record, (tag,)).get(tag)
+
+
+def filter_raw_fields(raw_record: Union[bytes, memoryview], tags: Set[bytes]) -> Optional[bytes]:
+    """
+    Copy of raw record with only fields of given tags: leader and bytes of the fields are copied as they are,
+    record length, base address and directory are computed again.
+    Returns None, if the directory is invalid, a field exceeds the record or no field would be left.
+    """
+
+    parsed_directory = parse_directory(raw_record)
+    if parsed_directory is None:
+        return None
+    base_address, entries = parsed_directory
+
+    directory = []
+    data = []
+    position = 0
+    for tag, entry_length, entry_offset in entries:
+        if tag not in tags:
+            continue
+        field_start = base_address + entry_offset
+        field = bytes(raw_record[field_start:field_start + entry_length])
+        if len(field) != entry_length:
+            return None
+        directory.append(b'%s%04d%05d' % (tag, entry_length, position))
+        data.append(field)
+        position += entry_length
+
+    if not directory:
+        return None
+
+    directory_bytes = b''.join(directory) + FIELD_TERMINATOR
+    base_address = LEADER_LEN + len(directory_bytes)
+    record_length = base_address + position + 1
+    leader = b'%05d%s%05d%s' % (record_length, bytes(raw_record[5:12]), base_address, bytes(raw_record[17:LEADER_LEN]))
+
+    return leader + directory_bytes + b''.join(data) + bytes([END_OF_RECORD])
+
+
+def encode_record(fields: List[EncodableField], leader: Optional[str] = None) -> bytes:
+    """
+    Encode fields as ISO 2709 record (UTF-8); record length and base address of leader are computed here.
+    Raises ValueError for invalid tag, field or record too long for ISO 2709.
+    """
+
+    directory = []
+    data = []
+    position = 0
+    for field in fields:
+        tag = field[0]
+        if len(tag) != 3 or not tag.isascii():
+            raise ValueError(f'Invalid tag {tag!r}.')
+        if len(field) == 2:
+            encoded = field[1].encode('utf-8') + FIELD_TERMINATOR
+        else:
+            indicators = field[1][:2].ljust(2)
+            encoded = indicators.encode('utf-8', errors='replace')[:2] \
+                + b''.join(SUBFIELD_DELIMITER + code.encode('utf-8') + value.encode('utf-8')
+                           for code, value in field[2]) + FIELD_TERMINATOR
+        if len(encoded) > MAX_FIELD_LENGTH:
+            raise ValueError(f'Field {tag} of {len(encoded)} bytes is too long.')
+        directory.append(f'{tag}{len(encoded):04d}{position:05d}'.encode('ascii'))
+        data.append(encoded)
+        position += len(encoded)
+
+    directory_bytes = b''.join(directory) + FIELD_TERMINATOR
+    base_address = LEADER_LEN + len(directory_bytes)
+    record_length = base_address + position + 1
+    if record_length > MAX_RECORD_LENGTH:
+        raise ValueError(f'Record of {record_length} bytes is too long.')
+
+    leader = (leader or DEFAULT_LEADER)[:LEADER_LEN].ljust(LEADER_LEN)
+    leader = f'{record_length:05d}{leader[5:12]}{base_address:05d}{leader[17:]}'.encode('ascii', errors='replace')
+
+    return leader + directory_bytes + b''.join(data) + bytes([END_OF_RECORD])
+
+
+def split_into_shards(path_to_raw_db: str, records_per_shard: int, offset: int = 0) -> List[Tuple[int, int, int]]:
+    """
+    Split binary MARC file (from record starting at offset) into record-aligned shards.
+    Returns list of (offset, length in bytes, number of records) for every shard.
+    """
+
+    shards = []
+
+    with open(path_to_raw_db, 'rb') as fp:
+        fp.seek(offset)
+        shard_offset, shard_length, shard_records = 0, 0, 0
+
+        for offset, record_length in iter_record_offsets(fp):
+            if shard_records == 0:
+                shard_offset = offset
+            shard_length += record_length
+            shard_records += 1
+
+            if shard_records == records_per_shard:
+                shards.append((shard_offset, shard_length, shard_records))
+                shard_length, shard_records = 0, 0
+
+        if shard_records:
+            shards.append((shard_offset, shard_length, shard_records))
+
+    return shards
+
+
+def read_shard(path_to_raw_db: str, offset: int, length: int) -> bytes:
+    with open(path_to_raw_db, 'rb') as fp:
+        fp.seek(offset)
+        return fp.read(length)
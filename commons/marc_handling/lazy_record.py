@@ -0,0 +1,172 @@
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+from pymarc.record import normalize_subfield_code
+
+from commons.marc_handling.iso2709 import LEADER_LEN, DIRECTORY_ENTRY_LEN, SUBFIELD_DELIMITER
+
+NON_ASCII_SUBFIELD_CODE = re.compile(SUBFIELD_DELIMITER + rb'[\x80-\xff]')
+
+
+class LightField(object):
+    """
+    Decoded field with the part of pymarc Field interface used by extractors: tag, data (control fields),
+    indicators, subfields as (code, value) pairs, get_subfields and value.
+    """
+
+    __slots__ = ('tag', 'control_field', 'data', 'indicators', 'subfields')
+
+    def __init__(self, tag: str, data: Optional[str] = None, indicators: Optional[Tuple[str, str]] = None,
+                 subfields: Optional[List[Tuple[str, str]]] = None):
+        self.tag = tag
+        self.control_field = indicators is None
+        self.data = data
+        self.indicators = indicators
+        self.subfields = subfields or []
+
+    def __repr__(self) -> str:
+        return f'LightField({self.tag!r}, {self.value()!r})'
+
+    def is_control_field(self) -> bool:
+        return self.control_field
+
+    def get_subfields(self, *codes: str) -> List[str]:
+        if self.control_field or not codes:
+            return []
+        if len(codes) == 1:
+            code = codes[0]
+            return [value for subfield_code, value in self.subfields if subfield_code == code]
+
+        return [value for subfield_code, value in self.subfields if subfield_code in codes]
+
+    def value(self) -> str:
+        if self.control_field:
+            return self.data or ''
+
+        return ' '.join(value.strip() for _, value in self.subfields)
+
+
+def is_control_tag(tag: str) -> bool:
+    # the same assumption as pymarc (and ruby-marc): control fields are numeric tags below 010
+    return tag < '010' and tag.isdigit()
+
+
+def parse_indicators(indicators: str) -> Tuple[str, str]:
+    # missing indicators are blank, more than two are dropped (as in pymarc)
+    if not indicators:
+        return ' ', ' '
+    if len(indicators) == 1:
+        return indicators, ' '
+
+    return indicators[0], indicators[1]
+
+
+def decode_subfields(raw_data: bytes) -> List[Tuple[str, str]]:
+    subfields = []
+    for raw_subfield in raw_data.split(SUBFIELD_DELIMITER)[1:]:
+        if not raw_subfield:
+            continue
+        try:
+            code, skip_bytes = raw_subfield[0:1].decode('ascii'), 1
+        except UnicodeDecodeError:
+            code, skip_bytes = normalize_subfield_code(raw_subfield)
+        subfields.append((code, raw_subfield[skip_bytes:].decode('utf-8', 'ignore')))
+
+    return subfields
+
+
+class LazyRecord(object):
+    """
+    ISO 2709 record (UTF-8) with pymarc-like get_fields, decoded on demand.
+    Leader, directory and control fields are parsed when the record is created and invalid records
+    are rejected (ValueError) in the same cases as by pymarc Record with force_utf8 and utf8_handling='ignore'.
+    Subfields of data fields are decoded only when fields of their tag are asked for the first time,
+    so fields never read by selection and extraction cost only their directory entry.
+    """
+
+    __slots__ = ('raw_record', 'leader', 'tags', 'entries_by_tag', 'fields_by_tag')
+
+    def __init__(self, raw_record: Union[bytes, memoryview]):
+        if type(raw_record) is memoryview:
+            raw_record = raw_record.tobytes()
+        self.raw_record = raw_record
+
+        self.leader = raw_record[0:LEADER_LEN].decode('ascii')
+        if len(self.leader) != LEADER_LEN:
+            raise ValueError('Invalid leader.')
+
+        base_address = int(raw_record[12:17])
+        if base_address <= 0 or base_address >= len(raw_record):
+            raise ValueError(f'Invalid base address {base_address}.')
+        if len(raw_record) < int(self.leader[:5]):
+            raise ValueError('Truncated record.')
+
+        directory = raw_record[LEADER_LEN:base_address - 1].decode('ascii')
+        if len(directory) % DIRECTORY_ENTRY_LEN:
+            raise ValueError('Invalid directory.')
+        if not directory:
+            raise ValueError('No fields found.')
+
+        # tags in directory order, (subfields start, end, indicators) of data fields
+        # and decoded fields by tag (None until they are asked for)
+        self.tags: List[str] = []
+        self.entries_by_tag: Dict[str, List[Tuple[int, int, Tuple[str, str]]]] = {}
+        self.fields_by_tag: Dict[str, Optional[List[LightField]]] = {}
+
+        for entry_start in range(0, len(directory), DIRECTORY_ENTRY_LEN):
+            tag = directory[entry_start:entry_start + 3]
+            field_start = base_address + int(directory[entry_start + 7:entry_start + 12])
+            field_end = field_start + int(directory[entry_start + 3:entry_start + 7]) - 1
+            self.tags.append(tag)
+
+            if is_control_tag(tag):
+                # control fields are short and invalid UTF-8 in them rejects the record, so they are decoded now
+                field = LightField(tag, data=raw_record[field_start:field_end].decode('utf-8'))
+                self.fields_by_tag.setdefault(tag, []).append(field)
+                continue
+
+            # and so does non-ASCII indicator
+            indicators_end = raw_record.find(SUBFIELD_DELIMITER, field_start, field_end)
+            if indicators_end < 0 or field_end < field_start:
+                indicators_end = max(field_start, field_end)
+            indicators = parse_indicators(raw_record[field_start:indicators_end].decode('ascii'))
+            self.entries_by_tag.setdefault(tag, []).append((indicators_end, field_end, indicators))
+            self.fields_by_tag[tag] = None
+
+        # pymarc rejects some records with non-ASCII subfield code, such (rare, invalid) records are decoded now
+        if NON_ASCII_SUBFIELD_CODE.search(raw_record, base_address):
+            for tag in self.entries_by_tag:
+                self.decode_fields(tag)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self.fields_by_tag
+
+    def decode_fields(self, tag: str) -> List[LightField]:
+        fields = self.fields_by_tag.get(tag, [])
+        if fields is not None:
+            return fields
+
+        raw_record = self.raw_record
+        fields = self.fields_by_tag[tag] = [
+            LightField(tag, indicators=indicators, subfields=decode_subfields(raw_record[data_start:data_end]))
+            for data_start, data_end, indicators in self.entries_by_tag[tag]]
+
+        return fields
+
+    @property
+    def fields(self) -> List[LightField]:
+        # all fields in directory order
+        iterators = {tag: iter(self.decode_fields(tag)) for tag in self.fields_by_tag}
+        return [next(iterators[tag]) for tag in self.tags]
+
+    def get_fields(self, *tags: str) -> List[LightField]:
+        """
+        Fields with given tags in record order (all fields without tags). Lists are shared, don't modify them.
+        """
+
+        if len(tags) == 1:
+            return self.decode_fields(tags[0])
+        if not tags:
+            return self.fields
+
+        return [field for field in self.fields if field.tag in tags]
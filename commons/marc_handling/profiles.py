@@ -0,0 +1,66 @@
+from typing import Dict, List, Optional
+
+from commons.marc_handling.field_mapping import FieldMapping, load_field_mapping, DEFAULT_FIELD_MAPPING_FILE
+from commons.marc_handling.selection_rules import SelectionRules, load_selection_rules, DEFAULT_SELECTION_RULES_FILE
+from exceptions.custom_exceptions import InvalidProfilesConfiguration
+
+
+class Profile(object):
+    """
+    Named export: its own selection rules, field mapping and output (None - derived from output of source_db.yaml).
+    """
+
+    __slots__ = ('name', 'selection_rules', 'field_mapping', 'output_config')
+
+    def __init__(self, name: str, selection_rules: SelectionRules, field_mapping: FieldMapping,
+                 output_config: Optional[dict] = None):
+        self.name = name
+        self.selection_rules = selection_rules
+        self.field_mapping = field_mapping
+        self.output_config = output_config
+
+
+def load_profiles(profiles_specs: List[dict],
+                  default_selection_rules_file: str = DEFAULT_SELECTION_RULES_FILE,
+                  default_field_mapping_file: str = DEFAULT_FIELD_MAPPING_FILE) -> List[Profile]:
+    """
+    Profiles from profiles section of source_db.yaml: name, selection_rules, field_mapping and output
+    (files default to the ones of source_db.yaml). Profiles with the same file share the loaded rules or mapping.
+    """
+
+    if not isinstance(profiles_specs, list):
+        raise InvalidProfilesConfiguration('Profiles should be a list.')
+
+    selection_rules_by_file: Dict[str, SelectionRules] = {}
+    field_mappings_by_file: Dict[str, FieldMapping] = {}
+    profiles = []
+    for profile_spec in profiles_specs:
+        if not isinstance(profile_spec, dict) or not profile_spec.get('name'):
+            raise InvalidProfilesConfiguration(f'Profile {profile_spec} has no name.')
+        name = str(profile_spec['name'])
+        if any(profile.name == name for profile in profiles):
+            raise InvalidProfilesConfiguration(f'Profile name {name} is not unique.')
+
+        selection_rules_file = profile_spec.get('selection_rules') or default_selection_rules_file
+        if selection_rules_file not in selection_rules_by_file:
+            selection_rules_by_file[selection_rules_file] = load_selection_rules(selection_rules_file)
+        field_mapping_file = profile_spec.get('field_mapping') or default_field_mapping_file
+        if field_mapping_file not in field_mappings_by_file:
+            field_mappings_by_file[field_mapping_file] = load_field_mapping(field_mapping_file)
+
+        profiles.append(Profile(name, selection_rules_by_file[selection_rules_file],
+                                field_mappings_by_file[field_mapping_file], profile_spec.get('output')))
+
+    return profiles
+
+
+_profiles: List[Profile] = []
+
+
+def set_profiles(profiles: List[Profile]) -> None:
+    global _profiles
+    _profiles = profiles
+
+
+def get_profiles() -> List[Profile]:
+    return _profiles
@@ -0,0 +1,55 @@
+from typing import Union
+
+from commons.marc_handling.iso2709 import parse_directory, get_raw_field_data
+from commons.marc_handling.attributes_extractors import get_publication_date_from_008
+
+
+MIN_PUBLICATION_DATE = 1918
+LANGUAGE_OF_PUBLICATION = 'pol'
+
+
+def may_be_selected(raw_record: Union[bytes, memoryview],
+                    min_publication_date: int = MIN_PUBLICATION_DATE,
+                    language_of_publication: str = LANGUAGE_OF_PUBLICATION) -> bool:
+    """
+    Cheap check on raw record, before it is decoded by pymarc.
+    Reads only leader, directory and field 008; returns False only for records,
+    which certainly fail publication date or language of publication checks in is_selected.
+    When in doubt (invalid directory, non-ascii 008 etc.) returns True and leaves the decision to is_selected.
+    """
+
+    parsed_directory = parse_directory(raw_record)
+    if parsed_directory is None:
+        return True
+    base_address, entries = parsed_directory
+
+    entry_008 = None
+    has_041 = False
+    has_260 = False
+    for entry in entries:
+        tag = entry[0]
+        if tag == b'008' and entry_008 is None:
+            entry_008 = entry
+        elif tag == b'041':
+            has_041 = True
+        elif tag == b'260':
+            has_260 = True
+
+    v_008 = None
+    if entry_008 is not None:
+        raw_008 = get_raw_field_data(raw_record, base_address, entry_008)
+        if not raw_008.isascii():
+            return True
+        v_008 = raw_008.decode('ascii')
+
+    # without 041 language of publication comes only from 008/35-37; the same containment test
+    # as language_of_publication_contains check, so values other than a 3-letter code are not rejected
+    if not has_041 and language_of_publication not in (v_008[35:38] if v_008 else ''):
+        return False
+
+    # publication date from 008/07-14 is final, unless it is missing and 260 is present
+    publication_date = get_publication_date_from_008(v_008) if v_008 and len(v_008) > 6 else None
+    if publication_date:
+        return publication_date >= min_publication_date
+
+    return has_260
@@ -0,0 +1,267 @@
+import os
+import mmap
+import heapq
+import random
+import struct
+import hashlib
+import logging
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from commons.marc_handling.iso2709 import iter_mmapped_records, get_raw_control_fields
+from exceptions.custom_exceptions import InvalidRecordIndex
+
+record_index_logger = logging.getLogger('record_index')
+
+
+RECORD_INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'MARCIDX1'
+# magic, dump size, dump mtime (ns), number of entries
+INDEX_HEADER = struct.Struct('<8sQQQ')
+# key, offset, length (with PRIMARY_FLAG set in exactly one entry of every record)
+INDEX_ENTRY = struct.Struct('<QQI')
+PRIMARY_FLAG = 2 ** 31
+MAX_NUMERIC_KEY = 2 ** 63 - 1
+# keys of hashed (non-numeric) IDs have the highest bit set, so they never collide with numeric ones
+HASHED_KEY_FLAG = 2 ** 63
+# entries sorted in memory before they are spilled to disk as one sorted run
+DEFAULT_INDEX_RUN_SIZE = 1000000
+# runs merged at once, more runs are merged in several passes (bounded number of open files)
+MAX_INDEX_MERGE_FAN_IN = 64
+ENTRIES_READ_AT_ONCE = 4096
+
+IndexEntry = Tuple[int, int, int]
+
+
+def get_record_key(record_id: str) -> int:
+    """
+    Numeric IDs (MMS IDs) are stored as they are, other IDs (e.g. 001) as 63-bit hash;
+    records found by hash are verified against the ID in the record itself.
+    """
+
+    record_id = record_id.strip()
+    if record_id.isdigit() and int(record_id) <= MAX_NUMERIC_KEY:
+        return int(record_id)
+
+    digest = hashlib.blake2b(record_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') | HASHED_KEY_FLAG
+
+
+def get_record_ids(raw_record) -> List[str]:
+    control_fields = get_raw_control_fields(raw_record, (b'009', b'001'))
+    return [control_fields[tag] for tag in (b'009', b'001') if tag in control_fields]
+
+
+def write_entries_run(entries: Iterable[IndexEntry], temp_dir: str) -> str:
+    fd, run_path = tempfile.mkstemp(suffix='.run', dir=temp_dir)
+    with open(fd, 'wb') as fp:
+        pack = INDEX_ENTRY.pack
+        fp.writelines(pack(*entry) for entry in entries)
+    return run_path
+
+
+def read_entries_run(run_path: str) -> Iterator[IndexEntry]:
+    with open(run_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(INDEX_ENTRY.size * ENTRIES_READ_AT_ONCE), b''):
+            yield from INDEX_ENTRY.iter_unpack(chunk)
+
+
+def merge_entries_runs(run_paths: List[str], temp_dir: str) -> Iterator[IndexEntry]:
+    # like merge_runs of sorted output: groups of runs are merged to new runs first, if there are too many
+    while len(run_paths) > MAX_INDEX_MERGE_FAN_IN:
+        merged_paths = []
+        for group_start in range(0, len(run_paths), MAX_INDEX_MERGE_FAN_IN):
+            group = run_paths[group_start:group_start + MAX_INDEX_MERGE_FAN_IN]
+            merged_paths.append(write_entries_run(heapq.merge(*(read_entries_run(path) for path in group)),
+                                                  temp_dir))
+            for path in group:
+                os.remove(path)
+        run_paths = merged_paths
+
+    return heapq.merge(*(read_entries_run(path) for path in run_paths))
+
+
+def build_record_index(path_to_raw_db: str, index_path: str, run_size: int = DEFAULT_INDEX_RUN_SIZE) -> int:
+    """
+    Write index of the dump: for every record its 009 (MMS ID) and 001 -> (offset, length),
+    as array of fixed-size entries sorted by key. Returns number of indexed records.
+    Memory is bounded by run_size entries: sorted runs are spilled next to the index and merged.
+    """
+
+    temp_path = f'{index_path}.tmp'
+    with tempfile.TemporaryDirectory(prefix='index_', dir=os.path.dirname(os.path.abspath(index_path))) as temp_dir:
+        run_paths = []
+        entries = []
+        entries_number = 0
+        offset = 0
+        records = 0
+        for raw_record in iter_mmapped_records(path_to_raw_db):
+            length = len(raw_record)
+            for number, record_id in enumerate(get_record_ids(raw_record)):
+                entries.append((get_record_key(record_id), offset, length if number else length | PRIMARY_FLAG))
+            if len(entries) >= run_size:
+                entries.sort()
+                run_paths.append(write_entries_run(entries, temp_dir))
+                entries_number += len(entries)
+                entries = []
+            offset += length
+            records += 1
+
+        entries.sort()
+        entries_number += len(entries)
+        if run_paths:
+            if entries:
+                run_paths.append(write_entries_run(entries, temp_dir))
+            sorted_entries = merge_entries_runs(run_paths, temp_dir)
+        else:
+            sorted_entries = entries
+
+        stat = os.stat(path_to_raw_db)
+        with open(temp_path, 'wb') as fp:
+            fp.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, entries_number))
+            pack = INDEX_ENTRY.pack
+            fp.writelines(pack(*entry) for entry in sorted_entries)
+    os.replace(temp_path, index_path)
+
+    record_index_logger.info(f'Index of {records} records ({entries_number} IDs, {len(run_paths)} sorted runs on disk) '
+                             f'written to {index_path}.')
+    return records
+
+
+class RecordIndex(object):
+    """
+    Memory-mapped index built by build_record_index. Lookup is a binary search over sorted entries,
+    so only a few pages of the index are read for every ID.
+    """
+
+    def __init__(self, index_path: str, path_to_raw_db: str):
+        self.index_path = index_path
+        self.fp = open(index_path, 'rb')
+        try:
+            header = self.fp.read(INDEX_HEADER.size)
+            if len(header) < INDEX_HEADER.size:
+                raise InvalidRecordIndex(f'Index {index_path} is truncated.')
+            magic, dump_size, dump_mtime_ns, self.entries_number = INDEX_HEADER.unpack(header)
+            if magic != INDEX_MAGIC:
+                raise InvalidRecordIndex(f'{index_path} is not a record index.')
+
+            stat = os.stat(path_to_raw_db)
+            if (dump_size, dump_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                raise InvalidRecordIndex(f'Index {index_path} was built for another version of {path_to_raw_db}.')
+
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ) if self.entries_number else None
+        except BaseException:
+            self.fp.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.entries_number
+
+    def get_entry(self, position: int) -> Tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self.mm, INDEX_HEADER.size + position * INDEX_ENTRY.size)
+
+    def is_primary(self, position: int) -> bool:
+        return bool(self.get_entry(position)[2] & PRIMARY_FLAG)
+
+    def lookup(self, record_id: str) -> List[Tuple[int, int]]:
+        """
+        Returns (offset, length) of records, which may have given ID (hashed keys can collide).
+        """
+
+        key = get_record_key(record_id)
+        low, high = 0, self.entries_number
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        locations = []
+        while low < self.entries_number:
+            entry_key, offset, length = self.get_entry(low)
+            if entry_key != key:
+                break
+            locations.append((offset, length & ~PRIMARY_FLAG))
+            low += 1
+
+        return locations
+
+    def sample(self, sample_size: int, rnd: random.Random) -> List[Tuple[int, int]]:
+        """
+        Uniform random sample of records (without replacement), as (offset, length) sorted by offset.
+        Record has an entry for 009 and for 001, so only its primary entry is accepted - every record
+        is drawn with the same probability and about two entries are read per sampled record.
+        """
+
+        if sample_size * 4 >= self.entries_number:
+            # large sample, it's cheaper to read all entries
+            primary_positions = [position for position in range(self.entries_number) if self.is_primary(position)]
+            sample_positions = rnd.sample(primary_positions, min(sample_size, len(primary_positions)))
+        else:
+            sample_positions = set()
+            while len(sample_positions) < sample_size:
+                position = rnd.randrange(self.entries_number)
+                if self.is_primary(position):
+                    sample_positions.add(position)
+
+        locations = []
+        for position in sample_positions:
+            _, offset, length = self.get_entry(position)
+            locations.append((offset, length & ~PRIMARY_FLAG))
+        return sorted(locations)
+
+    def close(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+        self.fp.close()
+
+
+def open_record_index(path_to_raw_db: str, index_path: Optional[str] = None) -> RecordIndex:
+    """
+    Open index of the dump, (re)building it first if it is missing or stale.
+    """
+
+    index_path = index_path or f'{path_to_raw_db}{RECORD_INDEX_SUFFIX}'
+    if os.path.exists(index_path):
+        try:
+            return RecordIndex(index_path, path_to_raw_db)
+        except InvalidRecordIndex as e:
+            record_index_logger.info(f'{e} Rebuilding it.')
+
+    build_record_index(path_to_raw_db, index_path)
+    return RecordIndex(index_path, path_to_raw_db)
+
+
+def read_records_at(path_to_raw_db: str, locations: Iterable[Tuple[int, int]]) -> Iterator[Tuple[int, bytes]]:
+    # locations are read in order of offsets, so seeks go forward only
+    with open(path_to_raw_db, 'rb') as fp:
+        for offset, length in sorted(locations):
+            fp.seek(offset)
+            yield offset, fp.read(length)
+
+
+def fetch_records(path_to_raw_db: str, record_index: RecordIndex,
+                  record_ids: Iterable[str]) -> Tuple[List[bytes], List[str]]:
+    """
+    Read records with given IDs (009 or 001) by seeking in the dump.
+    Returns raw records (in order of dump, every record once) and IDs not found.
+    """
+
+    record_ids = [record_id.strip() for record_id in record_ids if record_id.strip()]
+
+    locations = {}
+    for record_id in record_ids:
+        for location in record_index.lookup(record_id):
+            locations.setdefault(location, set()).add(record_id)
+
+    raw_records = []
+    found_ids = set()
+    for offset, raw_record in read_records_at(path_to_raw_db, locations):
+        requested_ids = locations[(offset, len(raw_record))] & set(get_record_ids(raw_record))
+        if requested_ids:
+            raw_records.append(raw_record)
+            found_ids.update(requested_ids)
+
+    missing_ids = [record_id for record_id in record_ids if record_id not in found_ids]
+    return raw_records, missing_ids
@@ -0,0 +1,77 @@
+from functools import wraps
+from typing import Callable, List, Union
+
+from pymarc import Record, Field
+
+from commons.marc_handling.lazy_record import LazyRecord, LightField
+
+
+class RecordView(object):
+    """
+    Read-only view of record used on the hot path.
+    Fields of pymarc record are indexed by tag in one pass over the record (LazyRecord is indexed
+    by its directory already) and values computed by extractors are memoized per record,
+    so is_selected and extract_to_csv don't rescan the same fields.
+    """
+
+    __slots__ = ('record', 'fields_by_tag', 'memo')
+
+    def __init__(self, record: Union[Record, LazyRecord]):
+        self.record = record
+        self.fields_by_tag = None
+        self.memo = {}
+
+        if type(record) is LazyRecord:
+            return
+
+        self.fields_by_tag = {}
+        for field in record.fields:
+            if field.tag in self.fields_by_tag:
+                self.fields_by_tag[field.tag].append(field)
+            else:
+                self.fields_by_tag[field.tag] = [field]
+
+    def __contains__(self, tag: str) -> bool:
+        if self.fields_by_tag is None:
+            return tag in self.record
+        return tag in self.fields_by_tag
+
+    @property
+    def fields(self) -> List[Union[Field, LightField]]:
+        return self.record.fields
+
+    def get_fields(self, *tags: str) -> List[Union[Field, LightField]]:
+        if self.fields_by_tag is None:
+            return self.record.get_fields(*tags)
+        if len(tags) == 1:
+            return self.fields_by_tag.get(tags[0], [])
+        if not tags:
+            return self.record.fields
+
+        return [field for field in self.record.fields if field.tag in tags]
+
+
+def memoized_per_record(func: Callable) -> Callable:
+    """
+    Memoize extractor result on RecordView passed as the first argument.
+    Other arguments (they have to be hashable) are part of the key;
+    for plain pymarc records and fields the extractor is just called.
+    Memoized values are shared between callers, so they must not be modified in place.
+    """
+
+    func_name = func.__name__
+
+    @wraps(func)
+    def wrapper(pymarc_rcd, *args):
+        if type(pymarc_rcd) is not RecordView:
+            return func(pymarc_rcd, *args)
+
+        key = (func_name, *args) if args else func_name
+        memo = pymarc_rcd.memo
+        if key in memo:
+            return memo[key]
+
+        value = memo[key] = func(pymarc_rcd, *args)
+        return value
+
+    return wrapper
@@ -0,0 +1,252 @@
+import re
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.configuration_loader import load_config
+from exceptions.custom_exceptions import InvalidSelectionRules
+
+selection_rules_logger = logging.getLogger('selection_rules')
+
+
+DEFAULT_SELECTION_RULES_FILE = 'selection_rules.yaml'
+
+CHECK_MIN_PUBLICATION_DATE = 'min_publication_date'
+CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS = 'language_of_publication_contains'
+CHECK_HAS_VALUES = 'has_values'
+CHECK_NO_VALUES = 'no_values'
+CHECK_ANY_VALUE_IN = 'any_value_in'
+CHECK_MATCHES = 'matches'
+CHECK_ALL = 'all'
+CHECK_ANY = 'any'
+CHECK_NOT = 'not'
+
+# default cost of evaluation, checks with lower cost are evaluated first
+DEFAULT_COSTS = {CHECK_HAS_VALUES: 1,
+                 CHECK_NO_VALUES: 1,
+                 CHECK_ANY_VALUE_IN: 2,
+                 CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS: 3,
+                 CHECK_MIN_PUBLICATION_DATE: 4,
+                 CHECK_MATCHES: 5}
+
+REJECTED_BY_ERROR = 'error'
+
+
+def compile_keywords(keywords: List[str]) -> re.Pattern:
+    if not keywords:
+        raise InvalidSelectionRules('Check of type matches needs keywords.')
+    return re.compile('|'.join(re.escape(str(keyword)) for keyword in keywords))
+
+
+def get_values(rcd, check_spec: dict) -> List[str]:
+    subfields = [str(subfield) for subfield in check_spec.get('subfields') or []]
+    return attr_extr.get_values_by_field_and_subfield(rcd, (str(check_spec['tag']), subfields))
+
+
+class Check(object):
+    __slots__ = ('name', 'cost', 'evaluate')
+
+    def __init__(self, name: str, cost: int, evaluate: Callable):
+        self.name = name
+        self.cost = cost
+        self.evaluate = evaluate
+
+
+class SelectionRules(object):
+    """
+    Rules from selection_rules.yaml compiled into closures.
+    Checks of every outcome are evaluated from the cheapest one and evaluation stops on the first failed check;
+    results of named checks are shared between outcomes while evaluating one record.
+    Number of records rejected by every check is counted for the end-of-run report.
+    """
+
+    def __init__(self, checks_specs: Dict[str, dict], outcomes_specs: List[dict]):
+        self.checks_specs = checks_specs
+        self.checks: Dict[str, Check] = {}
+        for name in checks_specs:
+            self.compile_check(name, ())
+
+        self.outcomes: List[Tuple[int, List[Check]]] = []
+        for outcome_spec in outcomes_specs:
+            value = outcome_spec.get('value')
+            if not value or not outcome_spec.get('checks'):
+                raise InvalidSelectionRules(f'Outcome needs non-zero value and checks: {outcome_spec}.')
+            self.outcomes.append((value, self.get_ordered_checks(outcome_spec['checks'], ())))
+
+        self.prefilter_parameters = self.get_prefilter_parameters()
+        self.rejections = Counter()
+
+    def get_ordered_checks(self, names: List[str], path: tuple) -> List[Check]:
+        # sorted is stable, so checks with the same cost keep the order from configuration
+        return sorted((self.compile_check(name, path) for name in names), key=lambda check: check.cost)
+
+    def compile_check(self, name: str, path: tuple) -> Check:
+        if name in self.checks:
+            return self.checks[name]
+        if name in path:
+            raise InvalidSelectionRules(f'Check {name} refers to itself.')
+        check_spec = self.checks_specs.get(name)
+        if not check_spec:
+            raise InvalidSelectionRules(f'Unknown check: {name}.')
+
+        check_type = check_spec.get('type')
+        path = path + (name,)
+
+        if check_type == CHECK_MIN_PUBLICATION_DATE:
+            min_date = int(check_spec['value'])
+
+            def evaluate(rcd, results):
+                publication_date = attr_extr.get_publication_dates(rcd)
+                return publication_date is not None and publication_date >= min_date
+
+        elif check_type == CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS:
+            language = check_spec['value']
+
+            def evaluate(rcd, results):
+                return language in ''.join(attr_extr.get_language_of_publication(rcd))
+
+        elif check_type == CHECK_HAS_VALUES or check_type == CHECK_NO_VALUES:
+            tag = str(check_spec['tag'])
+            expected = check_type == CHECK_HAS_VALUES
+
+            if check_spec.get('subfields'):
+                def evaluate(rcd, results):
+                    return bool(get_values(rcd, check_spec)) == expected
+            else:
+                def evaluate(rcd, results):
+                    return (tag in rcd) == expected
+
+        elif check_type == CHECK_ANY_VALUE_IN:
+            accepted_values = frozenset(check_spec.get('values') or [])
+
+            def evaluate(rcd, results):
+                return any(value in accepted_values for value in get_values(rcd, check_spec))
+
+        elif check_type == CHECK_MATCHES:
+            pattern = compile_keywords(check_spec.get('keywords'))
+
+            def evaluate(rcd, results):
+                return pattern.search(''.join(get_values(rcd, check_spec)).upper()) is not None
+
+        elif check_type == CHECK_ALL or check_type == CHECK_ANY:
+            sub_checks = self.get_ordered_checks(check_spec.get('checks') or [], path)
+            if not sub_checks:
+                raise InvalidSelectionRules(f'Check {name} needs checks.')
+            combine = all if check_type == CHECK_ALL else any
+
+            def evaluate(rcd, results):
+                return combine(self.evaluate_check(sub_check, rcd, results) for sub_check in sub_checks)
+
+        elif check_type == CHECK_NOT:
+            sub_check = self.compile_check(check_spec.get('check'), path)
+
+            def evaluate(rcd, results):
+                return not self.evaluate_check(sub_check, rcd, results)
+
+        else:
+            raise InvalidSelectionRules(f'Unknown type of check {name}: {check_type}.')
+
+        if 'cost' in check_spec:
+            cost = check_spec['cost']
+        elif check_type == CHECK_NOT:
+            cost = sub_check.cost
+        elif check_type == CHECK_ALL or check_type == CHECK_ANY:
+            cost = sum(sub_check.cost for sub_check in sub_checks)
+        else:
+            cost = DEFAULT_COSTS[check_type]
+
+        check = self.checks[name] = Check(name, cost, evaluate)
+        return check
+
+    @staticmethod
+    def evaluate_check(check: Check, rcd, results: dict) -> bool:
+        result = results.get(check.name)
+        if result is None:
+            result = results[check.name] = check.evaluate(rcd, results)
+        return result
+
+    def evaluate(self, rcd) -> int:
+        """
+        Returns value of the first outcome with all checks passed or 0.
+        """
+
+        results = {}
+        rejected_by = []
+        try:
+            for value, checks in self.outcomes:
+                for check in checks:
+                    if not self.evaluate_check(check, rcd, results):
+                        rejected_by.append((value, check.name))
+                        break
+                else:
+                    return value
+        except Exception:
+            self.rejections[REJECTED_BY_ERROR] += 1
+            return 0
+
+        self.rejections.update(rejected_by)
+        return 0
+
+    def get_used_tags(self) -> Set[str]:
+        # tags read by checks, checks of publication date and language read them through extractors
+        tags = {str(check_spec['tag']) for check_spec in self.checks_specs.values() if 'tag' in check_spec}
+        if any(check_spec.get('type') in (CHECK_MIN_PUBLICATION_DATE, CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS)
+               for check_spec in self.checks_specs.values()):
+            tags.update(attr_extr.EXTRACTORS_TAGS)
+        return tags
+
+    def get_prefilter_parameters(self) -> Optional[Tuple[int, str]]:
+        """
+        Parameters for raw prefilter (minimal publication date, language of publication),
+        if every outcome requires both of them; None otherwise.
+        """
+
+        min_dates = []
+        languages = set()
+        for value, checks in self.outcomes:
+            checks_types = {self.checks_specs[check.name].get('type'): self.checks_specs[check.name]
+                            for check in checks}
+            if CHECK_MIN_PUBLICATION_DATE not in checks_types \
+                    or CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS not in checks_types:
+                return None
+            min_dates.append(int(checks_types[CHECK_MIN_PUBLICATION_DATE]['value']))
+            languages.add(checks_types[CHECK_LANGUAGE_OF_PUBLICATION_CONTAINS]['value'])
+
+        if len(languages) != 1:
+            return None
+        return min(min_dates), languages.pop()
+
+    def reset_rejections(self) -> None:
+        self.rejections = Counter()
+
+    def log_rejections(self) -> None:
+        for value, checks in self.outcomes:
+            rejected = ', '.join(f'{check.name}: {self.rejections[(value, check.name)]}' for check in checks)
+            selection_rules_logger.info(f'Records not selected as {value}, failed checks - {rejected}.')
+        if self.rejections[REJECTED_BY_ERROR]:
+            selection_rules_logger.info(f'{self.rejections[REJECTED_BY_ERROR]} records not selected '
+                                        f'because of errors in checks.')
+
+
+_selection_rules: Optional[SelectionRules] = None
+
+
+def load_selection_rules(file: str = DEFAULT_SELECTION_RULES_FILE) -> SelectionRules:
+    selection_rules_config = load_config(file)
+    if not selection_rules_config or not selection_rules_config.get('outcomes'):
+        raise InvalidSelectionRules(f'No outcomes defined in {file}.')
+
+    return SelectionRules(selection_rules_config.get('checks') or {}, selection_rules_config['outcomes'])
+
+
+def set_selection_rules(selection_rules: SelectionRules) -> None:
+    global _selection_rules
+    _selection_rules = selection_rules
+
+
+def get_selection_rules() -> SelectionRules:
+    # loaded lazily, if they weren't set before; forked extraction workers inherit the rules of main process
+    if _selection_rules is None:
+        set_selection_rules(load_selection_rules())
+    return _selection_rules
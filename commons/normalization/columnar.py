@@ -0,0 +1,144 @@
+from typing import Callable, List, Optional
+
+from commons.normalization.value_cache import get_normalization_cache, set_normalization_cache, \
+    DEFAULT_NORMALIZATION_CACHE_SIZE
+from exceptions.custom_exceptions import InvalidFieldMapping, MissingOptionalDependency
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+
+NORMALIZATION_ENGINE_AUTO = 'auto'
+NORMALIZATION_ENGINE_ARROW = 'arrow'
+NORMALIZATION_ENGINE_PYTHON = 'python'
+NORMALIZATION_ENGINES = (NORMALIZATION_ENGINE_AUTO, NORMALIZATION_ENGINE_ARROW, NORMALIZATION_ENGINE_PYTHON)
+
+DEFAULT_NORMALIZATION_BATCH_SIZE = 2000
+# smaller columns are normalized in Python, converting them to Arrow costs more than it saves
+MIN_ARROW_COLUMN_LENGTH = 256
+
+# characters removed by str.strip() without argument (str.isspace), so Arrow trim gives the same results
+WHITESPACE = '\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007' \
+             '\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000'
+
+
+def compile_python_step(operation: str, argument) -> Callable[[List[str]], list]:
+    # whole column is processed by one comprehension, instead of one call per value and step
+    if operation == 'strip':
+        return lambda values: [value.strip(argument) for value in values]
+    if operation == 'rstrip':
+        return lambda values: [value.rstrip(argument) for value in values]
+    if operation == 'replace':
+        old, new = argument
+        return lambda values: [value.replace(old, new) for value in values]
+    if operation == 'split':
+        return lambda values: [value.split(argument) for value in values]
+
+    raise InvalidFieldMapping(f'Unknown step: {operation}.')
+
+
+def compile_arrow_step(operation: str, argument) -> Optional[Callable]:
+    # None, if Arrow kernel wouldn't give exactly the same result as Python step
+    if operation == 'strip':
+        return lambda array: pc.utf8_trim(array, characters=argument or WHITESPACE)
+    if operation == 'rstrip':
+        return lambda array: pc.utf8_rtrim(array, characters=argument or WHITESPACE)
+    if operation == 'replace':
+        old, new = argument
+        if not old:
+            return None
+        return lambda array: pc.replace_substring(array, pattern=old, replacement=new)
+    if operation == 'split' and argument:
+        return lambda array: pc.split_pattern(array, pattern=argument)
+
+    return None
+
+
+class ColumnNormalizer(object):
+    """
+    Steps of one column (strip, rstrip, replace: [old, new], split) compiled to passes over the whole column:
+    Arrow compute kernels for large columns (when pyarrow is installed), list comprehensions otherwise.
+    Values of cached (repetitive) columns are taken from normalization cache under the rule name,
+    only the ones not found there are normalized.
+    """
+
+    __slots__ = ('rule', 'cached', 'steps', 'splits', 'python_steps', 'arrow_steps')
+
+    def __init__(self, steps: List[dict], rule: str = '', cached: bool = False):
+        self.rule = rule
+        self.cached = cached
+        self.steps = []
+        for number, step in enumerate(steps):
+            if len(step) != 1:
+                raise InvalidFieldMapping(f'Every step should have exactly one operation: {step}.')
+            operation, argument = next(iter(step.items()))
+            if operation == 'split' and number != len(steps) - 1:
+                raise InvalidFieldMapping('Split has to be the last step.')
+            if operation == 'replace' and (not isinstance(argument, list) or len(argument) != 2):
+                raise InvalidFieldMapping(f'Replace needs [old, new]: {step}.')
+            self.steps.append((operation, argument))
+        self.splits = bool(self.steps) and self.steps[-1][0] == 'split'
+
+        self.python_steps = [compile_python_step(operation, argument) for operation, argument in self.steps]
+        arrow_steps = [compile_arrow_step(operation, argument) for operation, argument in self.steps] \
+            if pc is not None else [None]
+        self.arrow_steps = arrow_steps if all(arrow_steps) else None
+
+    def __bool__(self) -> bool:
+        return bool(self.steps)
+
+    def normalize(self, values: List[str]) -> list:
+        """
+        Normalized values in the same order (lists of strings for columns ending with split).
+        """
+
+        cache = get_normalization_cache() if self.cached else None
+        if cache is None:
+            return self.normalize_uncached(values)
+        return cache.normalize_many(self.rule, values, self.normalize_uncached)
+
+    def normalize_uncached(self, values: List[str]) -> list:
+        if self.arrow_steps and len(values) >= MIN_ARROW_COLUMN_LENGTH and use_arrow():
+            array = pa.array(values, type=pa.string())
+            for step in self.arrow_steps:
+                array = step(array)
+            return array.to_pylist()
+
+        for step in self.python_steps:
+            values = step(values)
+        return values
+
+
+_normalization_engine = NORMALIZATION_ENGINE_AUTO
+_normalization_batch_size = DEFAULT_NORMALIZATION_BATCH_SIZE
+
+
+def use_arrow() -> bool:
+    return _normalization_engine != NORMALIZATION_ENGINE_PYTHON
+
+
+def set_normalization(normalization_config: Optional[dict]) -> None:
+    """
+    Configure normalization from normalization section of source_db.yaml: batch_size (records normalized
+    together), engine (auto, arrow or python) and cache_size (normalized values kept in LRU cache, 0 disables it).
+    """
+
+    global _normalization_engine, _normalization_batch_size
+    normalization_config = normalization_config or {}
+
+    engine = normalization_config.get('engine') or NORMALIZATION_ENGINE_AUTO
+    if engine not in NORMALIZATION_ENGINES:
+        raise InvalidFieldMapping(f'Normalization engine {engine} is not one of {", ".join(NORMALIZATION_ENGINES)}.')
+    if engine == NORMALIZATION_ENGINE_ARROW and pc is None:
+        raise MissingOptionalDependency('Arrow normalization requires pyarrow (pip install pyarrow).')
+    _normalization_engine = engine
+    _normalization_batch_size = normalization_config.get('batch_size') or DEFAULT_NORMALIZATION_BATCH_SIZE
+    set_normalization_cache(normalization_config.get('cache_size', DEFAULT_NORMALIZATION_CACHE_SIZE))
+
+
+def get_normalization_batch_size() -> int:
+    return _normalization_batch_size
@@ -0,0 +1,100 @@
+import sys
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Hashable, Optional
+
+DEFAULT_NORMALIZATION_CACHE_SIZE = 100000
+MISSING = object()
+
+
+def intern_value(value):
+    # equal strings share one object; lists are interned item by item
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is list:
+        return [sys.intern(item) if type(item) is str else item for item in value]
+    return value
+
+
+class NormalizationCache(object):
+    """
+    Bounded LRU cache of normalized values keyed by (rule, raw value), values are interned.
+    Cached values are shared between records, so they must not be modified in place.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_NORMALIZATION_CACHE_SIZE):
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rule: str, raw_value: Hashable, default=MISSING):
+        key = (rule, raw_value)
+        value = self.values.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.values.move_to_end(key)
+        return value
+
+    def put(self, rule: str, raw_value: Hashable, value):
+        value = intern_value(value)
+        self.values[(rule, raw_value)] = value
+        if len(self.values) > self.max_size:
+            self.values.popitem(last=False)
+        return value
+
+    def normalize_many(self, rule: str, raw_values: list, normalize: Callable[[list], list]) -> list:
+        """
+        Normalize column of values: only distinct values not found in cache are passed to normalize (in one call).
+        """
+
+        found = {}
+        missing_values = []
+        for raw_value in dict.fromkeys(raw_values):
+            value = self.get(rule, raw_value)
+            if value is MISSING:
+                missing_values.append(raw_value)
+            else:
+                found[raw_value] = value
+
+        if missing_values:
+            for raw_value, value in zip(missing_values, normalize(missing_values)):
+                found[raw_value] = self.put(rule, raw_value, value)
+
+        return [found[raw_value] for raw_value in raw_values]
+
+
+_normalization_cache: Optional[NormalizationCache] = NormalizationCache()
+
+
+def set_normalization_cache(max_size: Optional[int]) -> None:
+    # cache is disabled with max_size 0
+    global _normalization_cache
+    _normalization_cache = NormalizationCache(max_size) if max_size else None
+
+
+def get_normalization_cache() -> Optional[NormalizationCache]:
+    return _normalization_cache
+
+
+def cached_normalization(rule: str) -> Callable:
+    """
+    Cache results of one-argument normalization function under given rule name.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(raw_value):
+            cache = _normalization_cache
+            if cache is None:
+                return func(raw_value)
+            value = cache.get(rule, raw_value)
+            if value is MISSING:
+                value = cache.put(rule, raw_value, func(raw_value))
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,88 @@
+from typing import Dict, List, Optional
+
+from exceptions.custom_exceptions import MissingOptionalDependency, InvalidOutputConfiguration
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# column types (type of column in field mapping)
+STRING = 'string'
+DICTIONARY_STRING = 'dictionary_string'
+LIST_OF_STRINGS = 'list_of_strings'
+LIST_OF_CODES = 'list_of_codes'
+INT32 = 'int32'
+INT8 = 'int8'
+COLUMN_TYPES = (STRING, DICTIONARY_STRING, LIST_OF_STRINGS, LIST_OF_CODES, INT32, INT8)
+
+DEFAULT_PARQUET_COMPRESSION = 'zstd'
+
+
+def get_arrow_type(column_type: str):
+    if column_type == STRING:
+        return pa.string()
+    if column_type == DICTIONARY_STRING:
+        return pa.dictionary(pa.int32(), pa.string())
+    if column_type == LIST_OF_STRINGS:
+        return pa.list_(pa.string())
+    if column_type == LIST_OF_CODES:
+        return pa.list_(pa.dictionary(pa.int32(), pa.string()))
+    if column_type == INT32:
+        return pa.int32()
+    if column_type == INT8:
+        return pa.int8()
+
+
+def get_parquet_schema(column_types: Dict[str, Optional[str]]):
+    untyped_columns = [column_name for column_name, column_type in column_types.items() if column_type is None]
+    if untyped_columns:
+        raise InvalidOutputConfiguration(f'Parquet output needs type of columns {", ".join(untyped_columns)} '
+                                         f'(type in field mapping).')
+    return pa.schema([(column_name, get_arrow_type(column_type)) for column_name, column_type in column_types.items()])
+
+
+def as_column_value(value, column_type: str):
+    # extractors return '' or None for missing values, lists are sometimes replaced with ''
+    if column_type == LIST_OF_STRINGS or column_type == LIST_OF_CODES:
+        if not value:
+            return []
+        return value if type(value) is list else [value]
+    if column_type == INT32 or column_type == INT8:
+        return value if type(value) is int else None
+
+    return value or None
+
+
+class ParquetWriter(object):
+    """
+    Writes records (MARC2csvDataModel) to Parquet file with columns and their types from field mapping:
+    integer dates, list<string> for multi-valued attributes and dictionary-encoded low-cardinality codes.
+    Every batch is written as one row group.
+    """
+
+    def __init__(self, path_to_parquet: str, column_types: Dict[str, Optional[str]],
+                 compression: str = DEFAULT_PARQUET_COMPRESSION):
+        if pa is None:
+            raise MissingOptionalDependency('Parquet output requires pyarrow (pip install pyarrow).')
+
+        self.column_types = dict(column_types)
+        self.schema = get_parquet_schema(self.column_types)
+        self.writer = pq.ParquetWriter(path_to_parquet, self.schema, compression=compression)
+
+    def write_batch(self, records_buffer: List) -> None:
+        column_types = self.column_types
+        columns = {column_name: [] for column_name in column_types}
+        for record in records_buffer:
+            for column_name, column_type in column_types.items():
+                columns[column_name].append(as_column_value(record.data.get(column_name), column_type))
+
+        batch = pa.record_batch([pa.array(columns[field.name], type=field.type) for field in self.schema],
+                                schema=self.schema)
+        self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        self.writer.close()
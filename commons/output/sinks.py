@@ -0,0 +1,253 @@
+import os
+import csv
+import json
+import sqlite3
+import logging
+from typing import Dict, List, Optional
+
+from commons.output.parquet_writer import ParquetWriter, DEFAULT_PARQUET_COMPRESSION
+from exceptions.custom_exceptions import InvalidOutputConfiguration
+
+sinks_logger = logging.getLogger('sinks')
+
+
+OUTPUT_FORMAT_CSV = 'csv'
+OUTPUT_FORMAT_JSONL = 'jsonl'
+OUTPUT_FORMAT_SQLITE = 'sqlite'
+OUTPUT_FORMAT_PARQUET = 'parquet'
+
+DEFAULT_OUTPUT_PATHS = {OUTPUT_FORMAT_CSV: 'extracted_csv.csv',
+                        OUTPUT_FORMAT_JSONL: 'extracted.jsonl',
+                        OUTPUT_FORMAT_SQLITE: 'extracted.sqlite',
+                        OUTPUT_FORMAT_PARQUET: 'extracted.parquet'}
+DEFAULT_BATCH_SIZES = {OUTPUT_FORMAT_CSV: 500,
+                       OUTPUT_FORMAT_JSONL: 500,
+                       OUTPUT_FORMAT_SQLITE: 50000,
+                       OUTPUT_FORMAT_PARQUET: 50000}
+DEFAULT_BUFFERING = 1024 * 1024
+DEFAULT_SQLITE_TABLE = 'records'
+# formats, which output can be truncated to position stored in checkpoint
+CHECKPOINT_OUTPUT_FORMATS = (OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL, OUTPUT_FORMAT_SQLITE)
+
+
+class OutputSink(object):
+    """
+    Output kept open for the whole run. Records (MARC2csvDataModel) are buffered
+    and written in batches of batch_size records.
+    """
+
+    def __init__(self, path: str, batch_size: int):
+        self.path = path
+        self.batch_size = batch_size
+        self.records_buffer = []
+        self.records_written = 0
+
+    def write(self, record) -> None:
+        self.records_buffer.append(record)
+        if len(self.records_buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.records_buffer:
+            self.write_batch(self.records_buffer)
+            self.records_written += len(self.records_buffer)
+            self.records_buffer = []
+
+    def write_batch(self, records_buffer: List) -> None:
+        raise NotImplementedError
+
+    def close_output(self) -> None:
+        raise NotImplementedError
+
+    def get_position(self) -> int:
+        """
+        Flush buffered records to disk and return position of the end of output (for checkpoints).
+        """
+
+        raise NotImplementedError
+
+    def truncate(self, position: int) -> None:
+        """
+        Drop output written after position returned by get_position (e.g. in interrupted run).
+        """
+
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.flush()
+        self.close_output()
+        sinks_logger.info(f'{self.records_written} records written to {self.path}.')
+
+    def __enter__(self) -> 'OutputSink':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> Optional[bool]:
+        self.close()
+        return None
+
+
+class CsvSink(OutputSink):
+    def __init__(self, path: str, batch_size: int, append: bool = True, header: bool = True,
+                 buffering: int = DEFAULT_BUFFERING):
+        super().__init__(path, batch_size)
+        # header is written only to a new (or empty) file, never in the middle of appended output
+        self.header = header
+        self.write_header = header and not (append and os.path.exists(path) and os.path.getsize(path))
+        self.fp = open(path, 'a' if append else 'w', newline='', encoding='utf-8', buffering=buffering)
+        self.csv_writer = csv.writer(self.fp, delimiter=',', quoting=csv.QUOTE_ALL)
+
+    def write_batch(self, records_buffer: List) -> None:
+        rows = [record.as_sanitized_for_csv_dict() for record in records_buffer]
+        if self.write_header:
+            self.csv_writer.writerow(rows[0].keys())
+            self.write_header = False
+        self.csv_writer.writerows(row.values() for row in rows)
+
+    def get_position(self) -> int:
+        return get_file_position(self)
+
+    def truncate(self, position: int) -> None:
+        truncate_file(self, position)
+        self.write_header = self.header and not position
+
+    def close_output(self) -> None:
+        self.fp.close()
+
+
+class JsonLinesSink(OutputSink):
+    def __init__(self, path: str, batch_size: int, append: bool = True, buffering: int = DEFAULT_BUFFERING):
+        super().__init__(path, batch_size)
+        self.fp = open(path, 'a' if append else 'w', encoding='utf-8', buffering=buffering)
+
+    def write_batch(self, records_buffer: List) -> None:
+        self.fp.writelines(f'{json.dumps(record.data, ensure_ascii=False)}\n' for record in records_buffer)
+
+    def get_position(self) -> int:
+        return get_file_position(self)
+
+    def truncate(self, position: int) -> None:
+        truncate_file(self, position)
+
+    def close_output(self) -> None:
+        self.fp.close()
+
+
+class SqliteSink(OutputSink):
+    """
+    Records are inserted with executemany, one transaction per batch.
+    Multi-valued attributes are stored as JSON arrays (queryable with json_each), missing values as NULL.
+    """
+
+    def __init__(self, path: str, batch_size: int, append: bool = True, table: str = DEFAULT_SQLITE_TABLE):
+        super().__init__(path, batch_size)
+        self.table = table
+        self.append = append
+        self.insert_statement = None
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+
+    @staticmethod
+    def as_sqlite_value(value):
+        if type(value) is list:
+            return json.dumps(value, ensure_ascii=False) if value else None
+        if value == '':
+            return None
+        return value
+
+    def prepare_table(self, columns: List[str]) -> None:
+        with self.connection:
+            if not self.append:
+                self.connection.execute(f'DROP TABLE IF EXISTS "{self.table}"')
+            columns_definition = ', '.join(f'"{column}" INTEGER' if column in ('publication_date', 'is_selected_value')
+                                           else f'"{column}" TEXT' for column in columns)
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns_definition})')
+
+        column_names = ', '.join(f'"{column}"' for column in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        self.insert_statement = f'INSERT INTO "{self.table}" ({column_names}) VALUES ({placeholders})'
+
+    def write_batch(self, records_buffer: List) -> None:
+        if self.insert_statement is None:
+            self.prepare_table(list(records_buffer[0].data.keys()))
+
+        with self.connection:
+            self.connection.executemany(self.insert_statement,
+                                        ([self.as_sqlite_value(value) for value in record.data.values()]
+                                         for record in records_buffer))
+
+    def table_exists(self) -> bool:
+        return self.connection.execute('SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?',
+                                       ('table', self.table)).fetchone() is not None
+
+    def get_position(self) -> int:
+        # position is the last rowid, every batch is committed in write_batch
+        self.flush()
+        if (self.insert_statement is None and not self.append) or not self.table_exists():
+            return 0
+        return self.connection.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{self.table}"').fetchone()[0]
+
+    def truncate(self, position: int) -> None:
+        if self.table_exists():
+            with self.connection:
+                self.connection.execute(f'DELETE FROM "{self.table}" WHERE rowid > ?', (position,))
+            sinks_logger.info(f'Output {self.path} truncated to {position} rows.')
+
+    def close_output(self) -> None:
+        self.connection.close()
+
+
+class ParquetSink(OutputSink):
+    def __init__(self, path: str, batch_size: int, column_types: Dict[str, Optional[str]],
+                 compression: str = DEFAULT_PARQUET_COMPRESSION):
+        super().__init__(path, batch_size)
+        self.parquet_writer = ParquetWriter(path, column_types, compression)
+
+    def write_batch(self, records_buffer: List) -> None:
+        self.parquet_writer.write_batch(records_buffer)
+
+    def close_output(self) -> None:
+        self.parquet_writer.close()
+
+
+def get_file_position(sink) -> int:
+    sink.flush()
+    sink.fp.flush()
+    os.fsync(sink.fp.fileno())
+    return os.fstat(sink.fp.fileno()).st_size
+
+
+def truncate_file(sink, position: int) -> None:
+    # file is opened in append mode, so following writes go to the new end
+    sink.fp.flush()
+    os.ftruncate(sink.fp.fileno(), position)
+    sinks_logger.info(f'Output {sink.path} truncated to {position} bytes.')
+
+
+def create_sink(output_config: Optional[dict], column_types: Optional[Dict[str, Optional[str]]] = None) -> OutputSink:
+    """
+    Create sink from output section of source_db.yaml:
+    format (csv, jsonl, sqlite, parquet), path, batch_size, append, header (csv), buffering (csv, jsonl),
+    table (sqlite), compression (parquet). Parquet schema is built from column_types of field mapping.
+    """
+
+    output_config = output_config or {}
+    output_format = output_config.get('format') or OUTPUT_FORMAT_CSV
+    if output_format not in DEFAULT_OUTPUT_PATHS:
+        raise InvalidOutputConfiguration(f'Unknown output format: {output_format}.')
+
+    path = output_config.get('path') or DEFAULT_OUTPUT_PATHS[output_format]
+    batch_size = output_config.get('batch_size') or DEFAULT_BATCH_SIZES[output_format]
+    append = output_config.get('append', True)
+    buffering = output_config.get('buffering') or DEFAULT_BUFFERING
+
+    if output_format == OUTPUT_FORMAT_CSV:
+        return CsvSink(path, batch_size, append, output_config.get('header', True), buffering)
+    if output_format == OUTPUT_FORMAT_JSONL:
+        return JsonLinesSink(path, batch_size, append, buffering)
+    if output_format == OUTPUT_FORMAT_SQLITE:
+        return SqliteSink(path, batch_size, append, output_config.get('table') or DEFAULT_SQLITE_TABLE)
+    if column_types is None:
+        raise InvalidOutputConfiguration('Parquet output needs columns of field mapping.')
+    return ParquetSink(path, batch_size, column_types, output_config.get('compression') or DEFAULT_PARQUET_COMPRESSION)
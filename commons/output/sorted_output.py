@@ -0,0 +1,203 @@
+import os
+import csv
+import json
+import heapq
+import logging
+import tempfile
+from operator import itemgetter
+from typing import Iterator, List, Optional, Tuple
+
+from commons.output.sinks import OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL
+from exceptions.custom_exceptions import InvalidOutputConfiguration
+
+sorted_output_logger = logging.getLogger('sorted_output')
+
+
+SORTABLE_OUTPUT_FORMATS = (OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL)
+DEFAULT_SORT_KEY = ['mms_id']
+# rows sorted in memory before they are spilled to disk as one sorted run
+DEFAULT_SORT_RUN_SIZE = 200000
+# runs merged at once, more runs are merged in several passes (bounded number of open files)
+MAX_MERGE_FAN_IN = 64
+
+# sorted item is [key (list of column values as text), number of row in output, row]
+SortItem = list
+
+
+def get_sort_key_columns(sort_config: dict) -> List[str]:
+    key_columns = sort_config.get('key') or DEFAULT_SORT_KEY
+    return [key_columns] if isinstance(key_columns, str) else list(key_columns)
+
+
+def validate_sort_config(output_config: Optional[dict]) -> None:
+    output_config = output_config or {}
+    sort_config = output_config.get('sort')
+    if not sort_config:
+        return
+
+    output_format = output_config.get('format') or OUTPUT_FORMAT_CSV
+    if not isinstance(sort_config, dict):
+        raise InvalidOutputConfiguration('Sort of output should be a dict (key, dedupe, run_size, temp_dir).')
+    if output_format not in SORTABLE_OUTPUT_FORMATS:
+        raise InvalidOutputConfiguration(f'Only {", ".join(SORTABLE_OUTPUT_FORMATS)} output can be sorted.')
+    if output_format == OUTPUT_FORMAT_CSV and not output_config.get('header', True):
+        raise InvalidOutputConfiguration('Sorted csv output needs header (key columns are found by name).')
+
+
+def as_key_value(value) -> str:
+    # keys are compared as text, the same way in csv and jsonl output
+    return value if type(value) is str else json.dumps(value, ensure_ascii=False)
+
+
+def iter_csv_items(path: str, key_columns: List[str]) -> Tuple[Optional[list], Iterator[SortItem]]:
+    fp = open(path, 'rt', newline='', encoding='utf-8')
+    csv_reader = csv.reader(fp)
+    header = next(csv_reader, None)
+    if header is None:
+        fp.close()
+        return None, iter(())
+
+    unknown_columns = [column for column in key_columns if column not in header]
+    if unknown_columns:
+        fp.close()
+        raise InvalidOutputConfiguration(f'Sort key columns not in {path}: {", ".join(unknown_columns)}.')
+    key_indexes = [header.index(column) for column in key_columns]
+
+    def iter_items():
+        with fp:
+            for number, row in enumerate(csv_reader):
+                yield [[row[index] if index < len(row) else '' for index in key_indexes], number, row]
+
+    return header, iter_items()
+
+
+def iter_jsonl_items(path: str, key_columns: List[str]) -> Iterator[SortItem]:
+    with open(path, 'rt', encoding='utf-8') as fp:
+        for number, line in enumerate(fp):
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            data = json.loads(line)
+            yield [[as_key_value(data.get(column, '')) for column in key_columns], number, line]
+
+
+def write_run(items: List[SortItem], temp_dir: str) -> str:
+    items.sort(key=itemgetter(0, 1))
+    fd, run_path = tempfile.mkstemp(suffix='.run', dir=temp_dir)
+    with open(fd, 'wt', encoding='utf-8') as fp:
+        fp.writelines(f'{json.dumps(item, ensure_ascii=False)}\n' for item in items)
+    return run_path
+
+
+def read_run(run_path: str) -> Iterator[SortItem]:
+    with open(run_path, 'rt', encoding='utf-8') as fp:
+        for line in fp:
+            yield json.loads(line)
+
+
+def merge_runs(run_paths: List[str], temp_dir: str) -> Iterator[SortItem]:
+    """
+    K-way merge of sorted runs; with more runs than MAX_MERGE_FAN_IN, groups of runs are merged to new runs first.
+    """
+
+    while len(run_paths) > MAX_MERGE_FAN_IN:
+        merged_paths = []
+        for group_start in range(0, len(run_paths), MAX_MERGE_FAN_IN):
+            group = run_paths[group_start:group_start + MAX_MERGE_FAN_IN]
+            fd, merged_path = tempfile.mkstemp(suffix='.run', dir=temp_dir)
+            with open(fd, 'wt', encoding='utf-8') as fp:
+                fp.writelines(f'{json.dumps(item, ensure_ascii=False)}\n'
+                              for item in heapq.merge(*(read_run(path) for path in group), key=itemgetter(0, 1)))
+            for path in group:
+                os.remove(path)
+            merged_paths.append(merged_path)
+        run_paths = merged_paths
+
+    return heapq.merge(*(read_run(path) for path in run_paths), key=itemgetter(0, 1))
+
+
+def sort_items(items: Iterator[SortItem], run_size: int, temp_dir: str) -> Tuple[Iterator[SortItem], int, int]:
+    """
+    Sort items by (key, number of row) with at most run_size items in memory.
+    Returns sorted items, number of items and number of runs spilled to temp_dir (0 - sorted in memory).
+    """
+
+    run_paths = []
+    run = []
+    items_number = 0
+    for item in items:
+        run.append(item)
+        items_number += 1
+        if len(run) >= run_size:
+            run_paths.append(write_run(run, temp_dir))
+            run = []
+
+    if not run_paths:
+        run.sort(key=itemgetter(0, 1))
+        return iter(run), items_number, 0
+
+    if run:
+        run_paths.append(write_run(run, temp_dir))
+    return merge_runs(run_paths, temp_dir), items_number, len(run_paths)
+
+
+def drop_duplicates(sorted_items: Iterator[SortItem]) -> Iterator[SortItem]:
+    # of rows with the same key the last one in output is kept (e.g. from the latest appended run),
+    # rows with empty key are all kept
+    previous = None
+    for item in sorted_items:
+        if previous is not None and (previous[0] != item[0] or not any(previous[0])):
+            yield previous
+        previous = item
+    if previous is not None:
+        yield previous
+
+
+def sort_output(path: str, output_format: str, sort_config: dict) -> None:
+    """
+    Sort finished csv or jsonl output in place by key columns (sort section of output config: key, default mms_id;
+    dedupe, default true; run_size; temp_dir, defaults to directory of output).
+    Memory is bounded by run_size rows: sorted runs are spilled to temporary files and merged.
+    Keys are compared as text (e.g. '10' sorts before '9'). Rows with equal keys are kept in output order
+    and dedupe keeps the last of them, so ties and duplicates depend on the order rows were written in.
+    """
+
+    if not os.path.exists(path):
+        return
+
+    key_columns = get_sort_key_columns(sort_config)
+    dedupe = sort_config.get('dedupe', True)
+    run_size = sort_config.get('run_size') or DEFAULT_SORT_RUN_SIZE
+    output_dir = os.path.dirname(os.path.abspath(path))
+
+    header = None
+    if output_format == OUTPUT_FORMAT_CSV:
+        header, items = iter_csv_items(path, key_columns)
+    else:
+        items = iter_jsonl_items(path, key_columns)
+
+    rows_written = 0
+    temp_path = f'{path}.sorting'
+    with tempfile.TemporaryDirectory(prefix='sort_', dir=sort_config.get('temp_dir') or output_dir) as temp_dir:
+        sorted_items, rows_read, runs = sort_items(items, run_size, temp_dir)
+        if dedupe:
+            sorted_items = drop_duplicates(sorted_items)
+
+        if output_format == OUTPUT_FORMAT_CSV:
+            with open(temp_path, 'wt', newline='', encoding='utf-8') as fp:
+                csv_writer = csv.writer(fp, delimiter=',', quoting=csv.QUOTE_ALL)
+                if header is not None:
+                    csv_writer.writerow(header)
+                for item in sorted_items:
+                    csv_writer.writerow(item[2])
+                    rows_written += 1
+        else:
+            with open(temp_path, 'wt', encoding='utf-8') as fp:
+                for item in sorted_items:
+                    fp.write(f'{item[2]}\n')
+                    rows_written += 1
+
+    # readers never see half-sorted output
+    os.replace(temp_path, path)
+    sorted_output_logger.info(f'Output {path} sorted by {", ".join(key_columns)} ({runs} sorted runs on disk), '
+                              f'{rows_written} rows written, {rows_read - rows_written} duplicates dropped.')
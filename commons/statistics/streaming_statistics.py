@@ -0,0 +1,206 @@
+import json
+import math
+import hashlib
+import logging
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from commons.instrumentation.run_metrics import write_atomically
+from exceptions.custom_exceptions import InvalidStatisticsConfiguration
+
+streaming_statistics_logger = logging.getLogger('streaming_statistics')
+
+
+DEFAULT_STATISTICS_PATH = 'statistics.json'
+DEFAULT_TOP_K = 20
+DEFAULT_HLL_PRECISION = 14
+DEFAULT_COUNT_MIN_WIDTH = 2 ** 16
+DEFAULT_COUNT_MIN_DEPTH = 4
+MASK_64 = 2 ** 64 - 1
+
+
+def hash_value(value: str) -> int:
+    # stable across processes and runs, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog(object):
+    """
+    Distinct count estimate in 2 ** precision one-byte registers (standard error about 1.04 / sqrt(registers)).
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+        if not 4 <= precision <= 18:
+            raise InvalidStatisticsConfiguration(f'HyperLogLog precision {precision} is not in 4-18.')
+        self.precision = precision
+        self.registers_number = 2 ** precision
+        self.registers = bytearray(self.registers_number)
+        self.rank_bits = 64 - precision
+        self.rank_mask = 2 ** self.rank_bits - 1
+
+    def add_hash(self, value_hash: int) -> None:
+        register = value_hash >> self.rank_bits
+        rank = self.rank_bits - (value_hash & self.rank_mask).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def estimate(self) -> int:
+        m = self.registers_number
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        raw_estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        zeros = self.registers.count(0)
+        if raw_estimate <= 2.5 * m and zeros:
+            # small cardinalities: linear counting
+            return round(m * math.log(m / zeros))
+        return round(raw_estimate)
+
+
+class CountMinTopK(object):
+    """
+    Count-min sketch (depth rows of width counters, estimates never lower than real counts)
+    with top_k heavy hitters kept as candidates, evicting the one with the lowest estimate.
+    """
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K, width: int = DEFAULT_COUNT_MIN_WIDTH,
+                 depth: int = DEFAULT_COUNT_MIN_DEPTH):
+        self.top_k = top_k
+        self.width = width
+        self.depth = depth
+        self.rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+        self.candidates: Dict[str, int] = {}
+        self.min_candidate_count = 0
+
+    def add(self, value: str, value_hash: int) -> None:
+        # columns of rows from double hashing of one 64-bit hash
+        first_hash = value_hash & 0xFFFFFFFF
+        second_hash = value_hash >> 32 | 1
+        width = self.width
+        estimate = MASK_64
+        for number, row in enumerate(self.rows):
+            column = (first_hash + number * second_hash) % width
+            count = row[column] + 1
+            row[column] = count
+            if count < estimate:
+                estimate = count
+
+        candidates = self.candidates
+        if value in candidates:
+            candidates[value] = estimate
+        elif len(candidates) < self.top_k:
+            candidates[value] = estimate
+            self.min_candidate_count = min(candidates.values())
+        elif estimate > self.min_candidate_count:
+            del candidates[min(candidates, key=candidates.get)]
+            candidates[value] = estimate
+            self.min_candidate_count = min(candidates.values())
+
+    def top(self) -> List[Tuple[str, int]]:
+        return sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))
+
+
+def iter_column_values(value) -> Iterator[str]:
+    if type(value) is list:
+        for item in value:
+            if item:
+                yield str(item)
+    elif value or value == 0:
+        yield str(value)
+
+
+class StreamingStatistics(object):
+    """
+    Statistics of extracted records computed while they are written: exact counters for low-cardinality
+    columns, HyperLogLog distinct counts and count-min top-k for high-cardinality ones.
+    List columns count every value, records without value are not counted.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_STATISTICS_PATH, exact: Iterable[str] = (),
+                 distinct: Iterable[str] = (), top: Iterable[str] = (), top_k: int = DEFAULT_TOP_K,
+                 precision: int = DEFAULT_HLL_PRECISION, width: int = DEFAULT_COUNT_MIN_WIDTH,
+                 depth: int = DEFAULT_COUNT_MIN_DEPTH):
+        self.path = path
+        self.records = 0
+        self.exact = {column: Counter() for column in exact}
+        self.distinct = {column: HyperLogLog(precision) for column in distinct}
+        self.top = {column: CountMinTopK(top_k, width, depth) for column in top}
+        self.sketched_columns = sorted(set(self.distinct) | set(self.top))
+
+    @property
+    def columns(self) -> List[str]:
+        return sorted(set(self.exact) | set(self.sketched_columns))
+
+    def observe(self, data: dict) -> None:
+        self.records += 1
+        for column, counter in self.exact.items():
+            counter.update(iter_column_values(data.get(column)))
+
+        for column in self.sketched_columns:
+            hll = self.distinct.get(column)
+            count_min = self.top.get(column)
+            for value in iter_column_values(data.get(column)):
+                value_hash = hash_value(value)
+                if hll is not None:
+                    hll.add_hash(value_hash)
+                if count_min is not None:
+                    count_min.add(value, value_hash)
+
+    def observe_records(self, records: Iterable) -> Iterator:
+        for record in records:
+            if record:
+                self.observe(record.data)
+            yield record
+
+    def as_dict(self) -> dict:
+        return {'records': self.records,
+                'exact': {column: dict(counter.most_common()) for column, counter in self.exact.items()},
+                'distinct': {column: hll.estimate() for column, hll in self.distinct.items()},
+                'top': {column: count_min.top() for column, count_min in self.top.items()}}
+
+    def close(self) -> None:
+        report = self.as_dict()
+        if self.path:
+            write_atomically(self.path, json.dumps(report, ensure_ascii=False, indent=2))
+
+        streaming_statistics_logger.info(f"Statistics of {report['records']} extracted records:")
+        for column, counts in report['exact'].items():
+            most_common = ', '.join(f'{value} ({count})' for value, count in list(counts.items())[:5])
+            streaming_statistics_logger.info(f'{column}: {len(counts)} values, most common: {most_common}.')
+        for column, estimate in report['distinct'].items():
+            streaming_statistics_logger.info(f'{column}: about {estimate} distinct values.')
+        for column, top in report['top'].items():
+            top_values = ', '.join(f'{value} (~{count})' for value, count in top[:5])
+            streaming_statistics_logger.info(f'{column}, top: {top_values}.')
+        if self.path:
+            streaming_statistics_logger.info(f'Statistics written to {self.path}.')
+
+
+_statistics: Optional[StreamingStatistics] = None
+
+
+def start_statistics(statistics_config: Optional[dict]) -> Optional[StreamingStatistics]:
+    """
+    Enable statistics from statistics section of source_db.yaml: path (JSON report), exact, distinct and top
+    (lists of columns), top_k, precision (HyperLogLog), width and depth (count-min sketch).
+    """
+
+    global _statistics
+    # statistics of previous run in the same process are never observed into again
+    _statistics = None
+    if not statistics_config:
+        return None
+
+    _statistics = StreamingStatistics(statistics_config.get('path', DEFAULT_STATISTICS_PATH),
+                                      statistics_config.get('exact') or [],
+                                      statistics_config.get('distinct') or [],
+                                      statistics_config.get('top') or [],
+                                      statistics_config.get('top_k') or DEFAULT_TOP_K,
+                                      statistics_config.get('precision') or DEFAULT_HLL_PRECISION,
+                                      statistics_config.get('width') or DEFAULT_COUNT_MIN_WIDTH,
+                                      statistics_config.get('depth') or DEFAULT_COUNT_MIN_DEPTH)
+    return _statistics
+
+
+def get_statistics() -> Optional[StreamingStatistics]:
+    return _statistics
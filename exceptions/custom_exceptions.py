@@ -4,3 +4,51 @@ class Marc2CsvException(BaseException):
 
 class SkipDownloadButNoDb(Marc2CsvException):
     pass
+
+
+class DownloadFailed(Marc2CsvException):
+    pass
+
+
+class MissingOptionalDependency(Marc2CsvException):
+    pass
+
+
+class InvalidOutputConfiguration(Marc2CsvException):
+    pass
+
+
+class InvalidFieldMapping(Marc2CsvException):
+    pass
+
+
+class InvalidSelectionRules(Marc2CsvException):
+    pass
+
+
+class InvalidCheckpoint(Marc2CsvException):
+    pass
+
+
+class InvalidRecordIndex(Marc2CsvException):
+    pass
+
+
+class UnsupportedInputFormat(Marc2CsvException):
+    pass
+
+
+class InvalidSourcesConfiguration(Marc2CsvException):
+    pass
+
+
+class InvalidStatisticsConfiguration(Marc2CsvException):
+    pass
+
+
+class InvalidProfilesConfiguration(Marc2CsvException):
+    pass
+
+
+class IncompleteDump(Marc2CsvException):
+    pass
@@ -1,18 +1,71 @@
+import os
 import logging
 import sys
-import csv
+import math
+import random
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, get_all_start_methods
+from io import BytesIO
+from itertools import repeat, islice
 
-from pymarc import MARCReader
+from commons.configuration_loader import load_config, CONFIG_PATH
+from commons.downloaders.db_dump_downloader import get_raw_db, open_raw_db_while_downloading, \
+    get_raw_dbs_concurrently, DATA_BN_AUTHORITIES_DB_URL, DEFAULT_DOWNLOAD_RETRIES, DEFAULT_DOWNLOAD_WORKERS
+from commons.marc_handling.iso2709 import split_into_shards, read_shard, iter_raw_records, iter_mmapped_records
+from commons.marc_handling.compressed_input import open_dump, open_dump_stream, skip_to, detect_file_compression
+from commons.marc_handling.input_formats import iter_input_records, validate_input_format, \
+    INPUT_FORMAT_ISO2709
+from commons.marc_handling.raw_prefilter import may_be_selected
+from commons.marc_handling.record_index import open_record_index, build_record_index, fetch_records, \
+    read_records_at, RECORD_INDEX_SUFFIX
+from commons.marc_handling.lazy_record import LazyRecord
+from commons.marc_handling.record_view import RecordView
+from commons.marc_handling.profiles import load_profiles, set_profiles, get_profiles
+from commons.marc_handling.field_cache import get_field_cache
+from commons.output.sinks import create_sink, OUTPUT_FORMAT_CSV, DEFAULT_OUTPUT_PATHS, CHECKPOINT_OUTPUT_FORMATS
+from commons.output.sorted_output import sort_output, validate_sort_config
+from commons.checkpoint.checkpoint import Checkpointer, InputPosition, track_input_position, get_dump_identity, \
+    read_checkpoint_file, CHECKPOINT_SUFFIX, DEFAULT_CHECKPOINT_EVERY_RECORDS
+from commons.instrumentation.run_metrics import start_run_metrics, get_run_metrics, get_profiling_window, \
+    STAGE_DECODE, STAGE_PREFILTER, STAGE_SELECT, STAGE_EXTRACT, STAGE_NORMALIZE, STAGE_WRITE
+import commons.normalization.columnar as columnar
+import commons.normalization.value_cache as value_cache
+from commons.normalization.columnar import set_normalization, get_normalization_batch_size
+from commons.statistics.streaming_statistics import start_statistics, get_statistics
+from commons.diagnostics.diagnostics import start_diagnostics, get_diagnostics, report_issue, EXTRACTION_FAILED, \
+    DECODING_FAILED
+from commons.delta.delta_index import DeltaIndex, get_raw_mms_id, get_content_hash, get_extraction_fingerprint, \
+    CHANGE_UNCHANGED, CHANGE_ADDED, CHANGE_CHANGED, CHANGE_DELETED
 
-from commons.configuration_loader import load_config
-from commons.downloaders.db_dump_downloader import get_raw_db
+from exceptions.custom_exceptions import InvalidCheckpoint, InvalidRecordIndex, InvalidSourcesConfiguration, \
+    InvalidStatisticsConfiguration, InvalidProfilesConfiguration, DownloadFailed, SkipDownloadButNoDb, IncompleteDump
 
 import commons.marc_handling.attributes_extractors as attr_extr
+import commons.marc_handling.field_mapping as field_mapping
+from commons.marc_handling.field_mapping import get_field_mapping, set_field_mapping, load_field_mapping, \
+    DEFAULT_FIELD_MAPPING_FILE
+import commons.marc_handling.selection_rules as selection_rules
+import commons.marc_handling.lazy_record as lazy_record
+import commons.marc_handling.record_view as record_view
+import commons.marc_handling.iso2709 as iso2709
+from commons.marc_handling.selection_rules import get_selection_rules, set_selection_rules, load_selection_rules, \
+    DEFAULT_SELECTION_RULES_FILE
 
 marc_reader_logger = logging.getLogger('marc_reader')
 
 
 PROGRESS_UPDATE_STEP = 10000
+DEFAULT_RECORDS_PER_SHARD = 20000
+
+INPUT_MODE_STREAM = 'stream'
+INPUT_MODE_MMAP = 'mmap'
+
+# rows stored in delta index are reused only, if these files (and configuration files of the run) didn't change
+EXTRACTION_DEFINING_FILES = [__file__, attr_extr.__file__, field_mapping.__file__, selection_rules.__file__,
+                             columnar.__file__, value_cache.__file__, lazy_record.__file__, record_view.__file__,
+                             iso2709.__file__]
 
 
 class MARC2csvDataModel(object):
@@ -49,6 +102,12 @@ class MARC2csvDataModel(object):
                      'series_title': series_title,
                      'is_selected_value': is_selected_value}
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MARC2csvDataModel':
+        model = cls.__new__(cls)
+        model.data = dict(data)
+        return model
+
     def as_sanitized_for_csv_dict(self) -> dict[str: str]:
         sanitized_for_csv_dict = {}
         for key, value in self.data.items():
@@ -63,135 +122,980 @@ class MARC2csvDataModel(object):
 
 
 def is_selected(pymarc_rcd) -> int:
-    publication_date = attr_extr.get_publication_dates(pymarc_rcd)
-    language_of_original = attr_extr.get_language_of_original(pymarc_rcd)
-    language_of_publication = ''.join(attr_extr.get_language_of_publication(pymarc_rcd))
-    field_041h = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('041', ['h']))
-    form_of_work = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('380', ['a']))
-    is_translation = attr_extr.is_translation(pymarc_rcd)
-    genre_of_work = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('655', ['a']))
-    #genre_general_subdivision = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('655', ['x']))
+    # rules are defined in configuration/selection_rules.yaml
+    return get_selection_rules().evaluate(pymarc_rcd)
+
+
+def extract_to_csv(pymarc_rcd, is_selected_value):
+    # columns are defined in configuration/field_mapping.yaml
+    extracted = get_field_mapping().extract(pymarc_rcd)
+    extracted['is_selected_value'] = is_selected_value
 
+    return MARC2csvDataModel.from_dict(extracted)
+
+
+def decode_record(raw_record):
+    # the same records are rejected as by permissive MARCReader used before, fields are decoded when they are read;
+    # rejected records are counted in diagnostics
     try:
-        if publication_date >= 1918 \
-                and language_of_original != 'pol' and field_041h \
-                and 'pol' in language_of_publication \
-                and ('Książki' in form_of_work or "E-booki" in form_of_work or ('Artykuły' in form_of_work and 'Nadbitki i odbitki' in genre_of_work)):
-            return 1
-        if publication_date >= 1918 \
-                and language_of_original != 'pol' and (is_translation or field_041h) \
-                and 'pol' in language_of_publication \
-                and (('Książki' in form_of_work or "E-booki" in form_of_work or ('Artykuły' in form_of_work and 'Nadbitki i odbitki' in genre_of_work)) or not form_of_work):
-            return 2
+        return LazyRecord(raw_record)
+    except Exception as e:
+        report_issue(DECODING_FAILED, detail=str(e))
+        return None
+
+
+def select_and_extract_record(rcd):
+    is_selected_value = is_selected(rcd)
+    if is_selected_value == 1 or is_selected_value == 2:
+        try:
+            return extract_to_csv(rcd, is_selected_value)
+        except Exception as e:
+            report_issue(EXTRACTION_FAILED, rcd, detail=str(e))
+            return ''
+    return None
+
+
+def select_and_collect_record(rcd):
+    # like select_and_extract_record, but values are normalized later, together with the batch of records
+    is_selected_value = is_selected(rcd)
+    if is_selected_value == 1 or is_selected_value == 2:
+        try:
+            return is_selected_value, get_field_mapping().collect(rcd)
+        except Exception as e:
+            report_issue(EXTRACTION_FAILED, rcd, detail=str(e))
+            return ''
+    return None
+
+
+def normalize_collected_records(collected_records, position=None, field_mapping=None):
+    """
+    Normalize batch of collected records (failed ones are '') and yield them in order.
+    All the records of the batch were read already, so position is consistent only at the last one.
+    """
+
+    collected_rows = [collected[1] for collected in collected_records if collected]
+    normalized_rows = iter((field_mapping or get_field_mapping()).normalize_batch(collected_rows))
+
+    last = len(collected_records) - 1
+    for number, collected in enumerate(collected_records):
+        if position:
+            position.consistent = number == last
+        if collected:
+            normalized_row = next(normalized_rows)
+            normalized_row['is_selected_value'] = collected[0]
+            yield MARC2csvDataModel.from_dict(normalized_row)
         else:
-            return 0
-    except Exception:
-        return 0
+            yield collected
 
 
-def extract_to_csv(pymarc_rcd, is_selected_value):
-    mms_id = attr_extr.get_values_by_field(pymarc_rcd, '009')[0]
-    publication_date = attr_extr.get_publication_dates(pymarc_rcd)
-    publication_country = attr_extr.get_country_of_publication(pymarc_rcd)
-    isbn = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('020', ['a']))
-    language_of_original = attr_extr.get_language_of_original(pymarc_rcd)
-    language_of_intermediate_translation = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('041', ['k']))
-    udc = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('080', ['a']))
-    other_classification_number = attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('084', ['a']))
-    creator = attr_extr.get_creator(pymarc_rcd)
-    title = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                       ('245', ['a', 'b', 'n', 'p']))[0].rstrip('/;:=,.').strip()
-    title_of_original = attr_extr.get_title_of_original(pymarc_rcd)
-    edition = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                         ('250', ['a']))[0].rstrip('/').strip() if attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('250', ['a'])) else ''
-    publication_place = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                                   ('260', ['a']))[0].strip().rstrip(':').strip().replace('[etc.]', '').replace('[', '').replace(']', '').replace(' : ', ' ; ').split(' ; ') if attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('260', ['a'])) else ''
-    extent = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                        ('300', ['a']))[0].rstrip(':;').strip() if attr_extr.get_values_by_field_and_subfield(pymarc_rcd, ('300', ['a'])) else ''
-    form_of_work = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                              ('380', ['a']))
-    audience_characteristics = attr_extr.get_audience_characteristics(pymarc_rcd)
-    contributor_characteristics = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                                             ('386', ['a']))
-    genre = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                       ('655', ['a']))
-    cocreator = attr_extr.get_cocreator(pymarc_rcd)
-    cocreator_only_translator = [translator for translator in cocreator if '[Tł' in translator]
-    cocreator_without_translator = [ccr for ccr in cocreator if '[Tł' not in ccr]
-    publisher_uniform_name = attr_extr.get_publisher_uniform_name(pymarc_rcd)
-    series_personal = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                                 ('800', ['a', 't', 'v']))
-    series_title = attr_extr.get_values_by_field_and_subfield(pymarc_rcd,
-                                                              ('830', ['a', 'x', 'v']))
-
-    return MARC2csvDataModel(mms_id=mms_id,
-                             publication_date=publication_date,
-                             publication_country=publication_country,
-                             isbn=isbn,
-                             language_of_original=language_of_original,
-                             language_of_intermediate_translation=language_of_intermediate_translation,
-                             udc=udc,
-                             other_classification_number=other_classification_number,
-                             creator=creator,
-                             title=title,
-                             title_of_original=title_of_original,
-                             edition=edition,
-                             publication_place=publication_place,
-                             extent=extent,
-                             form_of_work=form_of_work,
-                             audience_characteristics=audience_characteristics,
-                             contributor_characteristics=contributor_characteristics,
-                             genre=genre,
-                             cocreator=cocreator,
-                             cocreator_only_translator=cocreator_only_translator,
-                             cocreator_without_translator=cocreator_without_translator,
-                             publisher_uniform_name=publisher_uniform_name,
-                             series_personal=series_personal,
-                             series_title=series_title,
-                             is_selected_value=is_selected_value)
-
-
-def select_and_extract_records_to_csv(path_to_raw_db):
-    with open(path_to_raw_db, 'rb') as fp:
-        rdr = MARCReader(fp, to_unicode=True, force_utf8=True, utf8_handling='ignore', permissive=True)
+def extract_record(raw_record):
+    # record is extracted whether it is selected or not, is_selected_value tells the result of selection
+    rcd = decode_record(raw_record)
+    if rcd is None:
+        return None
 
-        counter = 0
-        for rcd in rdr:
+    rcd = RecordView(rcd)
+    try:
+        return extract_to_csv(rcd, is_selected(rcd))
+    except Exception as e:
+        report_issue(EXTRACTION_FAILED, rcd, detail=str(e))
+        return None
+
+
+def select_and_extract_records(raw_records, use_prefilter=False, log_progress=True, position=None):
+    counter = 0
+    batch_size = get_normalization_batch_size()
+    collected_records = []
+    prefiltered_counter = 0
+    prefilter_parameters = get_selection_rules().prefilter_parameters
+
+    metrics = get_run_metrics()
+    decode = metrics.timed(STAGE_DECODE, decode_record) if metrics else decode_record
+    prefilter = metrics.timed(STAGE_PREFILTER, may_be_selected) if metrics else may_be_selected
+    # profiling window counts records of main process only
+    profiling_window = get_profiling_window() if log_progress else None
+    profiling_switch_at = profiling_window.start if profiling_window else -1
+
+    for raw_record in raw_records:
+        if log_progress and counter % PROGRESS_UPDATE_STEP == 0:
+            marc_reader_logger.info(f'Processed {counter} records.')
+            if metrics:
+                metrics.maybe_write()
+        if counter == profiling_switch_at:
+            profiling_switch_at = profiling_window.switch(counter)
+        counter += 1
+        if metrics:
+            metrics.count_record(len(raw_record))
+
+        if use_prefilter and not prefilter(raw_record, *prefilter_parameters):
+            prefiltered_counter += 1
+            continue
+
+        rcd = decode(raw_record)
+        if rcd is None:
+            continue
+
+        collected = select_and_collect_record(RecordView(rcd))
+        if collected is not None:
+            collected_records.append(collected)
+            if len(collected_records) >= batch_size:
+                yield from normalize_collected_records(collected_records, position)
+                collected_records = []
+
+    if collected_records:
+        yield from normalize_collected_records(collected_records, position)
+
+    if profiling_window and profiling_switch_at == profiling_window.end:
+        profiling_window.switch(counter)
+
+    if use_prefilter and log_progress:
+        marc_reader_logger.info(f'Prefilter rejected {prefiltered_counter} of {counter} records without decoding.')
+    if log_progress:
+        get_selection_rules().log_rejections()
+
+
+def get_distinct_selection_rules(profiles):
+    # profiles with the same selection rules file share one SelectionRules object
+    return list({id(profile.selection_rules): profile.selection_rules for profile in profiles}.values())
+
+
+def log_profiles_rejections(profiles):
+    for selection_rules in get_distinct_selection_rules(profiles):
+        names = ', '.join(profile.name for profile in profiles if profile.selection_rules is selection_rules)
+        marc_reader_logger.info(f'Selection rules of profiles {names}:')
+        selection_rules.log_rejections()
+
+
+def select_and_extract_records_for_profiles(raw_records, profiles, use_prefilter=False, log_progress=True):
+    """
+    Evaluate all profiles on every record, decoded once. Yields (profile name, record), records of every profile
+    in order of the dump. Extractor values memoized on RecordView are shared by the profiles, selection rules
+    and field mappings shared by several profiles are evaluated once per record.
+    """
+
+    counter = 0
+    batch_size = get_normalization_batch_size()
+    collected_by_profile = {profile.name: [] for profile in profiles}
+    prefiltered_counter = 0
+    prefilter_parameters = {profile.selection_rules.prefilter_parameters for profile in profiles}
+
+    metrics = get_run_metrics()
+    decode = metrics.timed(STAGE_DECODE, decode_record) if metrics else decode_record
+    prefilter = metrics.timed(STAGE_PREFILTER, may_be_selected) if metrics else may_be_selected
+
+    for raw_record in raw_records:
+        if log_progress and counter % PROGRESS_UPDATE_STEP == 0:
+            marc_reader_logger.info(f'Processed {counter} records.')
+            if metrics:
+                metrics.maybe_write()
+        counter += 1
+        if metrics:
+            metrics.count_record(len(raw_record))
+
+        candidates = profiles
+        if use_prefilter:
+            passed = {parameters for parameters in prefilter_parameters if prefilter(raw_record, *parameters)}
+            candidates = [profile for profile in profiles if profile.selection_rules.prefilter_parameters in passed]
+            if not candidates:
+                prefiltered_counter += 1
+                continue
+
+        rcd = decode(raw_record)
+        if rcd is None:
+            continue
+        rcd = RecordView(rcd)
+
+        selected = {}
+        collected = {}
+        for profile in candidates:
+            selection_rules, field_mapping = profile.selection_rules, profile.field_mapping
+            if id(selection_rules) not in selected:
+                selected[id(selection_rules)] = selection_rules.evaluate(rcd)
+            is_selected_value = selected[id(selection_rules)]
+            if is_selected_value != 1 and is_selected_value != 2:
+                continue
+
+            row = collected.get(id(field_mapping))
+            if row is None:
+                try:
+                    row = field_mapping.collect(rcd)
+                except Exception as e:
+                    report_issue(EXTRACTION_FAILED, rcd, detail=f'{profile.name}: {e}')
+                    row = ''
+                collected[id(field_mapping)] = row
+            if not row:
+                continue
+            # rows are normalized in place (possibly before the next profile gets the row),
+            # so every profile gets its own copy and the collected row stays untouched
+            row = dict(row)
+
+            profile_batch = collected_by_profile[profile.name]
+            profile_batch.append((is_selected_value, row))
+            if len(profile_batch) >= batch_size:
+                for record in normalize_collected_records(profile_batch, field_mapping=field_mapping):
+                    yield profile.name, record
+                collected_by_profile[profile.name] = []
+
+    for profile in profiles:
+        for record in normalize_collected_records(collected_by_profile[profile.name],
+                                                  field_mapping=profile.field_mapping):
+            yield profile.name, record
+
+    if use_prefilter and log_progress:
+        marc_reader_logger.info(f'Prefilter rejected {prefiltered_counter} of {counter} records without decoding.')
+    if log_progress:
+        log_profiles_rejections(profiles)
+
+
+def select_and_extract_records_delta(raw_records, delta_index, use_prefilter=False):
+    """
+    Yields (change type, MMS ID, record) for every record, which is selected now or was selected in previous run.
+    Selection and extraction are re-run only for records new or changed since previous run,
+    for unchanged records the row stored in delta index is used. Records missing in the dump are reported
+    as deleted only if it was read to the end (raw_records from strict reader raise IncompleteDump on early stop).
+    """
+
+    counter = 0
+    reprocessed_counter = 0
+    prefilter_parameters = get_selection_rules().prefilter_parameters
+
+    metrics = get_run_metrics()
+    decode = metrics.timed(STAGE_DECODE, decode_record) if metrics else decode_record
+    prefilter = metrics.timed(STAGE_PREFILTER, may_be_selected) if metrics else may_be_selected
+
+    complete = True
+    try:
+        for raw_record in raw_records:
             if counter % PROGRESS_UPDATE_STEP == 0:
                 marc_reader_logger.info(f'Processed {counter} records.')
+                if metrics:
+                    metrics.maybe_write()
             counter += 1
+            if metrics:
+                metrics.count_record(len(raw_record))
 
-            is_selected_value = is_selected(rcd)
-            if is_selected_value == 1 or is_selected_value == 2:
-                try:
-                    exctracted_to_csv = extract_to_csv(rcd, is_selected_value)
-                    yield exctracted_to_csv
-                except Exception as e:
-                    if rcd.get_fields('001') and rcd.get_fields('009'):
-                        marc_reader_logger.error(f"{e} || {rcd.get_fields('001')[0].value()}, {rcd.get_fields('009')[0].value()}")
-                    yield ''
+            mms_id = get_raw_mms_id(raw_record)
+            if mms_id is None:
+                # record without MMS ID can't be tracked (and can't be extracted either)
+                continue
+
+            content_hash = get_content_hash(raw_record)
+            stored = delta_index.lookup(mms_id)
+            stored_row = stored[1] if stored else None
+
+            if stored and stored[0] == content_hash:
+                delta_index.mark_unchanged(mms_id)
+                if stored_row:
+                    yield CHANGE_UNCHANGED, mms_id, MARC2csvDataModel.from_dict(stored_row)
+                continue
+
+            reprocessed_counter += 1
+            extracted_to_csv = None
+            if not use_prefilter or prefilter(raw_record, *prefilter_parameters):
+                rcd = decode(raw_record)
+                if rcd is not None:
+                    extracted_to_csv = select_and_extract_record(RecordView(rcd))
+
+            row = extracted_to_csv.data if extracted_to_csv else None
+            delta_index.store(mms_id, content_hash, row)
+
+            if row and stored_row:
+                yield CHANGE_UNCHANGED if row == stored_row else CHANGE_CHANGED, mms_id, extracted_to_csv
+            elif row:
+                yield CHANGE_ADDED, mms_id, extracted_to_csv
+            elif stored_row:
+                yield CHANGE_DELETED, mms_id, MARC2csvDataModel.from_dict(stored_row)
+    except IncompleteDump as e:
+        # records not read would be reported as deleted, so they are kept in delta index until a complete run
+        complete = False
+        delta_index.flush()
+        marc_reader_logger.error(f'{e} Deletions are not reported, records not read are kept in delta index.')
+
+    if complete:
+        for mms_id, stored_row in delta_index.finish_run():
+            yield CHANGE_DELETED, mms_id, MARC2csvDataModel.from_dict(stored_row)
+
+    marc_reader_logger.info(f'Selection and extraction re-run for {reprocessed_counter} of {counter} records.')
+    get_selection_rules().log_rejections()
+
+
+def iter_dump_records(path_to_raw_db, input_mode=INPUT_MODE_STREAM, position=None, decompression_workers=1,
+                      input_format=INPUT_FORMAT_ISO2709):
+    # with position, reading starts at its offset and position follows records read (for checkpoints)
+    offset = position.offset if position else 0
+
+    if input_mode == INPUT_MODE_MMAP:
+        raw_records = iter_mmapped_records(path_to_raw_db, offset)
+        yield from track_input_position(raw_records, position) if position else raw_records
+        return
+
+    with open_dump(path_to_raw_db, decompression_workers) as fp:
+        if input_format == INPUT_FORMAT_ISO2709:
+            skip_to(fp, offset)
+            raw_records = iter_raw_records(fp)
+        else:
+            # converted records have no offsets in the dump, records read before checkpoint are skipped
+            raw_records = islice(iter_input_records(fp, input_format), position.records if position else 0, None)
+        yield from track_input_position(raw_records, position) if position else raw_records
+
+
+def select_and_extract_records_to_csv(path_to_raw_db, use_prefilter=False, input_mode=INPUT_MODE_STREAM,
+                                      position=None, decompression_workers=1, input_format=INPUT_FORMAT_ISO2709):
+    yield from select_and_extract_records(iter_dump_records(path_to_raw_db, input_mode, position,
+                                                            decompression_workers, input_format),
+                                          use_prefilter, position=position)
+
+
+# extraction workers are forked: they inherit configuration of the run from main process (field mapping,
+# selection rules, profiles, diagnostics, metrics), which is not passed to them otherwise
+WORKERS_START_METHOD = 'fork'
+
+
+def create_workers_executor(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context(WORKERS_START_METHOD))
+
+
+def select_and_extract_shard(path_to_raw_db, offset, length, use_prefilter=False, input_mode=INPUT_MODE_STREAM):
+    if input_mode == INPUT_MODE_MMAP:
+        raw_records = iter_mmapped_records(path_to_raw_db, offset, length)
+    else:
+        raw_records = iter_raw_records(BytesIO(read_shard(path_to_raw_db, offset, length)))
+
+    # worker processes are reused for many shards, so rejections and metrics are counted per shard
+    # and summed up in main process
+    metrics = get_run_metrics()
+    if metrics:
+        metrics.reset()
+    get_selection_rules().reset_rejections()
+    get_diagnostics().collect_locally()
+    records = [record for record in select_and_extract_records(raw_records,
+                                                               use_prefilter,
+                                                               log_progress=False) if record]
+    return records, get_selection_rules().rejections, metrics.export() if metrics else None, \
+        get_diagnostics().export()
+
+
+def select_and_extract_records_to_csv_parallel(path_to_raw_db, workers, records_per_shard,
+                                               use_prefilter=False, input_mode=INPUT_MODE_STREAM, position=None):
+    shards = split_into_shards(path_to_raw_db, records_per_shard, position.offset if position else 0)
+    marc_reader_logger.info(f'Split {path_to_raw_db} into {len(shards)} shards, processing with {workers} workers.')
+
+    with create_workers_executor(workers) as executor:
+        # map keeps the order of shards, so the output is the same as in sequential mode
+        results = executor.map(select_and_extract_shard,
+                               repeat(path_to_raw_db),
+                               [shard[0] for shard in shards],
+                               [shard[1] for shard in shards],
+                               repeat(use_prefilter),
+                               repeat(input_mode))
+
+        counter = 0
+        metrics = get_run_metrics()
+        for shard, (records, rejections, exported_metrics, exported_diagnostics) in zip(shards, results):
+            counter += shard[2]
+            marc_reader_logger.info(f'Processed {counter} records.')
+            get_selection_rules().rejections.update(rejections)
+            get_diagnostics().merge(exported_diagnostics)
+            if metrics and exported_metrics:
+                metrics.merge(exported_metrics)
+                metrics.maybe_write()
+
+            if position is None:
+                yield from records
+                continue
+
+            # output is consistent with position only after the last record of shard
+            position.consistent = False
+            for record in records[:-1]:
+                yield record
+            position.offset = shard[0] + shard[1]
+            position.records += shard[2]
+            position.consistent = True
+            if records:
+                yield records[-1]
+
+    get_selection_rules().log_rejections()
+
+
+def select_and_extract_profiles_shard(path_to_raw_db, offset, length, use_prefilter=False,
+                                      input_mode=INPUT_MODE_STREAM):
+    if input_mode == INPUT_MODE_MMAP:
+        raw_records = iter_mmapped_records(path_to_raw_db, offset, length)
+    else:
+        raw_records = iter_raw_records(BytesIO(read_shard(path_to_raw_db, offset, length)))
+
+    # like select_and_extract_shard, rejections of every selection rules are summed up in main process
+    profiles = get_profiles()
+    metrics = get_run_metrics()
+    if metrics:
+        metrics.reset()
+    for selection_rules in get_distinct_selection_rules(profiles):
+        selection_rules.reset_rejections()
+    get_diagnostics().collect_locally()
+    records = list(select_and_extract_records_for_profiles(raw_records, profiles, use_prefilter, log_progress=False))
+    return records, [selection_rules.rejections for selection_rules in get_distinct_selection_rules(profiles)], \
+        metrics.export() if metrics else None, get_diagnostics().export()
+
+
+def select_and_extract_profiles_parallel(path_to_raw_db, workers, records_per_shard, use_prefilter=False,
+                                         input_mode=INPUT_MODE_STREAM):
+    shards = split_into_shards(path_to_raw_db, records_per_shard)
+    marc_reader_logger.info(f'Split {path_to_raw_db} into {len(shards)} shards, processing with {workers} workers.')
+
+    profiles = get_profiles()
+    with create_workers_executor(workers) as executor:
+        results = executor.map(select_and_extract_profiles_shard,
+                               repeat(path_to_raw_db),
+                               [shard[0] for shard in shards],
+                               [shard[1] for shard in shards],
+                               repeat(use_prefilter),
+                               repeat(input_mode))
+
+        counter = 0
+        metrics = get_run_metrics()
+        for shard, (records, rejections, exported_metrics, exported_diagnostics) in zip(shards, results):
+            counter += shard[2]
+            marc_reader_logger.info(f'Processed {counter} records.')
+            for selection_rules, shard_rejections in zip(get_distinct_selection_rules(profiles), rejections):
+                selection_rules.rejections.update(shard_rejections)
+            get_diagnostics().merge(exported_diagnostics)
+            if metrics and exported_metrics:
+                metrics.merge(exported_metrics)
+                metrics.maybe_write()
+
+            yield from records
+
+    log_profiles_rejections(profiles)
 
 
-def dump_to_csv(records_buffer):
-    with open('extracted_csv.csv', 'a', newline='', encoding='utf-8') as fp:
-        csv_writer = csv.writer(fp, delimiter=',', quoting=csv.QUOTE_ALL)
-        for record in records_buffer:
-            csv_writer.writerow(record.as_sanitized_for_csv_dict().values())
+def create_instrumented_sink(output_config, field_mapping=None):
+    # typed outputs (parquet) get columns of field mapping of written records
+    validate_sort_config(output_config)
+    sink = create_sink(output_config, (field_mapping or get_field_mapping()).column_types)
+    metrics = get_run_metrics()
+    if metrics:
+        metrics.instrument_method(sink, 'write_batch', STAGE_WRITE)
+    return sink
 
 
-def main(db_config):
-    # get path to db (and download it, if needed)
-    path_to_raw_db = get_raw_db(db_config.get('source_db_name'), db_config.get('skip_download'))
+def finalize_output(sink, output_config):
+    # optional sort and dedupe of the whole output, after it was written and closed
+    sort_config = (output_config or {}).get('sort')
+    if sort_config:
+        sort_output(sink.path, (output_config or {}).get('format') or OUTPUT_FORMAT_CSV, sort_config)
 
-    records_buffer = []
-    for record in select_and_extract_records_to_csv(path_to_raw_db):
-        if record:
-            records_buffer.append(record)
-            if len(records_buffer) == 500:
-                dump_to_csv(records_buffer)
-                records_buffer = []
-    if records_buffer:
-        dump_to_csv(records_buffer)
+
+def dump_records(records, output_config, checkpointer=None, output_position=None):
+    with create_instrumented_sink(output_config) as sink:
+        if checkpointer:
+            if output_position is not None:
+                sink.truncate(output_position)
+            checkpointer.checkpoint(sink)
+
+        for record in records:
+            if record:
+                sink.write(record)
+            if checkpointer:
+                checkpointer.maybe_checkpoint(sink)
+
+        if checkpointer:
+            checkpointer.complete(sink)
+
+    finalize_output(sink, output_config)
+
+
+def dump_profiles(profile_records, output_config):
+    """
+    Write records of every profile to its own output (by default <output path>_<profile name>).
+    """
+
+    output_config = output_config or {}
+    profiles = get_profiles()
+    outputs_configs = {profile.name: profile.output_config
+                       or {**output_config, 'path': get_output_path(output_config, f'_{profile.name}')}
+                       for profile in profiles}
+    field_mappings = {profile.name: profile.field_mapping for profile in profiles}
+    sinks = {name: create_instrumented_sink(profile_output_config, field_mappings[name])
+             for name, profile_output_config in outputs_configs.items()}
+    counters = Counter()
+
+    try:
+        for name, record in profile_records:
+            if record:
+                sinks[name].write(record)
+                counters[name] += 1
+    finally:
+        for sink in sinks.values():
+            sink.close()
+
+    for name, sink in sinks.items():
+        marc_reader_logger.info(f'Profile {name}: {counters[name]} records written to {sink.path}.')
+        finalize_output(sink, outputs_configs[name])
+
+
+def get_output_path(output_config, suffix=''):
+    output_config = output_config or {}
+    output_format = output_config.get('format') or OUTPUT_FORMAT_CSV
+    path, extension = os.path.splitext(output_config.get('path') or DEFAULT_OUTPUT_PATHS[output_format])
+    return f'{path}{suffix}{extension}'
+
+
+def dump_delta(changes, output_config):
+    """
+    Write full refreshed output and delta outputs with additions, changes and deletions next to it.
+    """
+
+    output_config = output_config or {}
+    paths = {CHANGE_UNCHANGED: get_output_path(output_config),
+             CHANGE_ADDED: get_output_path(output_config, '_additions'),
+             CHANGE_CHANGED: get_output_path(output_config, '_changes'),
+             CHANGE_DELETED: get_output_path(output_config, '_deletions')}
+
+    sinks = {change_type: create_instrumented_sink({**output_config, 'path': change_path, 'append': False})
+             for change_type, change_path in paths.items()}
+    counters = {change_type: 0 for change_type in paths}
+
+    try:
+        for change_type, mms_id, record in changes:
+            counters[change_type] += 1
+            sinks[change_type].write(record)
+            if change_type == CHANGE_ADDED or change_type == CHANGE_CHANGED:
+                sinks[CHANGE_UNCHANGED].write(record)
+    finally:
+        for sink in sinks.values():
+            sink.close()
+
+    for sink in sinks.values():
+        finalize_output(sink, output_config)
+
+    marc_reader_logger.info(f'Delta export: {counters[CHANGE_ADDED]} added, {counters[CHANGE_CHANGED]} changed, '
+                            f'{counters[CHANGE_DELETED]} deleted, {counters[CHANGE_UNCHANGED]} unchanged.')
+
+
+def extract_records_by_ids(path_to_raw_db, record_index, ids_file, output_config):
+    """
+    Extract records with IDs (009 or 001, one per line) from ids_file, found in dump by seeking,
+    to output with _targeted suffix.
+    """
+
+    with open(ids_file, 'rt', encoding='utf-8') as fp:
+        record_ids = fp.read().split()
+
+    raw_records, missing_ids = fetch_records(path_to_raw_db, record_index, record_ids)
+    marc_reader_logger.info(f'Found {len(raw_records)} records for {len(record_ids)} requested IDs.')
+    if missing_ids:
+        marc_reader_logger.warning(f'{len(missing_ids)} IDs not found in {path_to_raw_db}: '
+                                   f'{", ".join(missing_ids[:20])}{" ..." if len(missing_ids) > 20 else ""}')
+
+    dump_records(observe_statistics(extract_record(raw_record) for raw_record in raw_records),
+                 {**(output_config or {}), 'path': get_output_path(output_config, '_targeted'), 'append': False})
+
+
+def estimate_selection_rates(path_to_raw_db, record_index, sample_size, seed=None):
+    """
+    Run selection on uniform random sample of records and log estimated share of every is_selected value
+    (with 95% confidence interval).
+    """
+
+    locations = record_index.sample(sample_size, random.Random(seed))
+    selection_rules = get_selection_rules()
+    selection_rules.reset_rejections()
+
+    counts = Counter()
+    for _, raw_record in read_records_at(path_to_raw_db, locations):
+        rcd = decode_record(raw_record)
+        counts[is_selected(RecordView(rcd)) if rcd is not None else 0] += 1
+
+    sampled = len(locations)
+    for value, count in sorted(counts.items()):
+        share = count / sampled
+        margin = 1.96 * math.sqrt(share * (1 - share) / sampled)
+        marc_reader_logger.info(f'is_selected_value {value}: {share:.2%} ± {margin:.2%} '
+                                f'({count} of {sampled} sampled records).')
+    selection_rules.log_rejections()
+
+
+def get_extraction_defining_files(db_config):
+    # module-level files and configuration files of this run (the module list is never modified)
+    return [*EXTRACTION_DEFINING_FILES,
+            os.path.join(os.getcwd(), CONFIG_PATH, db_config.get('field_mapping') or DEFAULT_FIELD_MAPPING_FILE),
+            os.path.join(os.getcwd(), CONFIG_PATH, db_config.get('selection_rules') or DEFAULT_SELECTION_RULES_FILE)]
+
+
+def create_checkpointer(db_config, path_to_raw_db):
+    checkpoint_config = db_config.get('checkpoint')
+    if not checkpoint_config:
+        return None
+
+    output_config = db_config.get('output') or {}
+    output_format = output_config.get('format') or OUTPUT_FORMAT_CSV
+    if output_format not in CHECKPOINT_OUTPUT_FORMATS:
+        marc_reader_logger.warning(f'Checkpoints are not supported for {output_format} output.')
+        return None
+
+    output_path = output_config.get('path') or DEFAULT_OUTPUT_PATHS[output_format]
+    return Checkpointer(checkpoint_config.get('path') or f'{output_path}{CHECKPOINT_SUFFIX}',
+                        get_dump_identity(path_to_raw_db),
+                        get_extraction_fingerprint(get_extraction_defining_files(db_config)),
+                        os.path.abspath(output_path),
+                        checkpoint_config.get('every_records') or DEFAULT_CHECKPOINT_EVERY_RECORDS)
+
+
+def main(db_config, resume=False, build_index=False, mms_ids_file=None, sample_size=None, seed=None):
+    diagnostics = start_diagnostics(db_config.get('diagnostics'))
+    statistics = start_statistics(db_config.get('statistics'))
+    metrics = start_run_metrics(db_config.get('metrics'))
+    if metrics and db_config.get('metrics').get('extractors', True):
+        # before field mapping is loaded, it keeps references to extractors
+        metrics.instrument_extractors(attr_extr)
+
+    set_normalization(db_config.get('normalization'))
+    field_mapping_file = db_config.get('field_mapping') or DEFAULT_FIELD_MAPPING_FILE
+    set_field_mapping(load_field_mapping(field_mapping_file))
+    selection_rules_file = db_config.get('selection_rules') or DEFAULT_SELECTION_RULES_FILE
+    set_selection_rules(load_selection_rules(selection_rules_file))
+    if db_config.get('profiles'):
+        set_profiles(load_profiles(db_config.get('profiles'), selection_rules_file, field_mapping_file))
+
+    if statistics:
+        known_columns = get_field_mapping().column_names + ['is_selected_value']
+        unknown_columns = [column for column in statistics.columns if column not in known_columns]
+        if unknown_columns:
+            raise InvalidStatisticsConfiguration(f'Unknown statistics columns: {", ".join(unknown_columns)}.')
+
+    if metrics:
+        metrics.instrument_method(get_field_mapping(), 'collect', STAGE_EXTRACT)
+        metrics.instrument_method(get_field_mapping(), 'normalize_batch', STAGE_NORMALIZE)
+        metrics.instrument_method(get_selection_rules(), 'evaluate', STAGE_SELECT)
+        profiles = get_profiles()
+        profile_field_mappings = {id(profile.field_mapping): profile.field_mapping for profile in profiles}
+        for profile_field_mapping in profile_field_mappings.values():
+            metrics.instrument_method(profile_field_mapping, 'collect', STAGE_EXTRACT)
+            metrics.instrument_method(profile_field_mapping, 'normalize_batch', STAGE_NORMALIZE)
+        for profile_selection_rules in get_distinct_selection_rules(profiles):
+            metrics.instrument_method(profile_selection_rules, 'evaluate', STAGE_SELECT)
+
+    try:
+        run(db_config, resume, build_index, mms_ids_file, sample_size, seed)
+    finally:
+        diagnostics.close()
+        if statistics:
+            statistics.close()
+        if metrics:
+            metrics.close()
+
+
+def get_download_options(db_config):
+    return {'base_url': db_config.get('base_url') or DATA_BN_AUTHORITIES_DB_URL,
+            'conditional': db_config.get('conditional_download', True),
+            'resume': db_config.get('resume_download', True),
+            'max_retries': db_config.get('download_retries', DEFAULT_DOWNLOAD_RETRIES)}
+
+
+def get_sequential_only_reason(path_to_raw_db, input_format):
+    # compressed and converted dumps can be read only sequentially: no mmap, shards or record index
+    compression = detect_file_compression(path_to_raw_db)
+    if compression:
+        return f'{path_to_raw_db} is {compression} compressed'
+    if input_format != INPUT_FORMAT_ISO2709:
+        return f'{path_to_raw_db} is {input_format}'
+    return None
+
+
+def get_used_tags(profiles):
+    # tags read by selection and extraction (of every profile), the only ones kept in field cache
+    used_tags = set()
+    for profile_field_mapping in [profile.field_mapping for profile in profiles] or [get_field_mapping()]:
+        used_tags.update(profile_field_mapping.get_used_tags())
+    for profile_selection_rules in get_distinct_selection_rules(profiles) or [get_selection_rules()]:
+        used_tags.update(profile_selection_rules.get_used_tags())
+    return used_tags
+
+
+def get_read_mode(db_config, sequential_only_reason):
+    input_mode = db_config.get('input_mode') or INPUT_MODE_STREAM
+    workers = db_config.get('extraction_workers') or 1
+    if sequential_only_reason and (input_mode == INPUT_MODE_MMAP or workers > 1):
+        marc_reader_logger.warning(f'{sequential_only_reason}, it is read sequentially '
+                                   f'(stream input mode, one extraction worker).')
+        return INPUT_MODE_STREAM, 1
+    if workers > 1 and WORKERS_START_METHOD not in get_all_start_methods():
+        marc_reader_logger.warning(f'Extraction workers need {WORKERS_START_METHOD} start method of processes, '
+                                   f'not available on this platform, records are extracted by one worker.')
+        return input_mode, 1
+    return input_mode, workers
+
+
+def observe_statistics(records):
+    # extracted records of all modes pass through main process, statistics are computed there
+    statistics = get_statistics()
+    return statistics.observe_records(records) if statistics else records
+
+
+def observe_delta_statistics(changes):
+    # statistics of full refreshed output: every record but the deleted ones
+    statistics = get_statistics()
+    for change_type, mms_id, record in changes:
+        if statistics and change_type != CHANGE_DELETED and record:
+            statistics.observe(record.data)
+        yield change_type, mms_id, record
+
+
+def select_and_extract_dump(db_config, path_to_raw_db, use_prefilter, input_format, input_mode, workers,
+                            position=None):
+    if workers > 1:
+        return observe_statistics(select_and_extract_records_to_csv_parallel(path_to_raw_db,
+                                                          workers,
+                                                          db_config.get('records_per_shard') or DEFAULT_RECORDS_PER_SHARD,
+                                                          use_prefilter,
+                                                          input_mode,
+                                                          position))
+    return observe_statistics(select_and_extract_records_to_csv(path_to_raw_db, use_prefilter, input_mode, position,
+                                                                db_config.get('decompression_workers') or 1,
+                                                                input_format))
+
+
+def select_and_extract_profiles_dump(db_config, path_to_raw_db, use_prefilter, input_format, input_mode, workers):
+    if workers > 1:
+        return select_and_extract_profiles_parallel(path_to_raw_db,
+                                                    workers,
+                                                    db_config.get('records_per_shard') or DEFAULT_RECORDS_PER_SHARD,
+                                                    use_prefilter,
+                                                    input_mode)
+    return select_and_extract_records_for_profiles(iter_dump_records(path_to_raw_db, input_mode, None,
+                                                                     db_config.get('decompression_workers') or 1,
+                                                                     input_format),
+                                                   get_profiles(), use_prefilter)
+
+
+def get_source_name(source_config):
+    return source_config.get('name') or source_config['source_db_name'].split('.')[0]
+
+
+def get_sources(db_config):
+    """
+    Sources listed in sources section of source_db.yaml: every source is source_db_name or dict overriding
+    options of source_db.yaml (e.g. base_url, input_format, skip_download, output).
+    Returns {source name: (source config, source entry)}.
+    """
+
+    sources = {}
+    for source in db_config.get('sources'):
+        if isinstance(source, str):
+            source = {'source_db_name': source}
+        if not isinstance(source, dict) or not source.get('source_db_name'):
+            raise InvalidSourcesConfiguration(f'Source {source} has no source_db_name.')
+
+        source_config = {key: value for key, value in db_config.items() if key != 'sources'}
+        source_config.update(source)
+        name = get_source_name(source_config)
+        if name in sources:
+            raise InvalidSourcesConfiguration(f'Source name {name} is not unique.')
+        if source_config.get('delta_index'):
+            raise InvalidSourcesConfiguration('Delta export is not supported for multiple sources.')
+        validate_input_format(source_config.get('input_format') or INPUT_FORMAT_ISO2709)
+        sources[name] = (source_config, source)
+
+    return sources
+
+
+def extract_source(name, source_config, source_output_config, path_to_raw_db, combined_sink, use_prefilter):
+    input_format = source_config.get('input_format') or INPUT_FORMAT_ISO2709
+    input_mode, workers = get_read_mode(source_config, get_sequential_only_reason(path_to_raw_db, input_format))
+
+    marc_reader_logger.info(f'Extracting source {name} from {path_to_raw_db}.')
+    records_counter = 0
+    with create_instrumented_sink(source_output_config) as source_sink:
+        for record in select_and_extract_dump(source_config, path_to_raw_db, use_prefilter, input_format,
+                                              input_mode, workers):
+            if record:
+                source_sink.write(record)
+                combined_sink.write(record)
+                records_counter += 1
+    marc_reader_logger.info(f'Source {name}: {records_counter} records written to {source_sink.path}.')
+    finalize_output(source_sink, source_output_config)
+
+
+def run_sources(db_config, use_prefilter):
+    """
+    Download all sources concurrently and extract every dump as soon as its download finishes
+    (one dump at a time), to its own output (<output path>_<source name>) and to combined output.
+    Dumps extracted by several (forked) worker processes are extracted after all downloads finished,
+    so download threads are never running, when the workers are forked.
+    """
+
+    sources = get_sources(db_config)
+    downloads = {name: {'source_db_name': source_config['source_db_name'],
+                        'skip_download': source_config.get('skip_download'),
+                        **get_download_options(source_config)}
+                 for name, (source_config, _) in sources.items()}
+
+    output_config = db_config.get('output') or {}
+    failed = []
+    with create_instrumented_sink(output_config) as combined_sink:
+        deferred = []
+        for name, download in get_raw_dbs_concurrently(downloads,
+                                                       db_config.get('download_workers') or DEFAULT_DOWNLOAD_WORKERS):
+            try:
+                path_to_raw_db = download.result()
+            except (DownloadFailed, SkipDownloadButNoDb) as e:
+                marc_reader_logger.error(f'Source {name} skipped, {type(e).__name__}: {e}')
+                failed.append(name)
+                continue
+
+            source_config, source = sources[name]
+            source_output_config = source.get('output') or {**output_config,
+                                                             'path': get_output_path(output_config, f'_{name}')}
+            extraction = (name, source_config, source_output_config, path_to_raw_db, combined_sink, use_prefilter)
+            if (source_config.get('extraction_workers') or 1) > 1:
+                deferred.append(extraction)
+                continue
+            extract_source(*extraction)
+
+        # download threads were joined, when get_raw_dbs_concurrently finished
+        for extraction in deferred:
+            extract_source(*extraction)
+
+    finalize_output(combined_sink, output_config)
+    if failed:
+        raise DownloadFailed(f'Sources not extracted: {", ".join(failed)}.')
+
+
+def run(db_config, resume=False, build_index=False, mms_ids_file=None, sample_size=None, seed=None):
+    download_options = get_download_options(db_config)
+
+    profiles = get_profiles()
+    use_prefilter = bool(db_config.get('raw_prefilter'))
+    used_selection_rules = [profile.selection_rules for profile in profiles] or [get_selection_rules()]
+    if use_prefilter and any(selection_rules.prefilter_parameters is None for selection_rules in used_selection_rules):
+        marc_reader_logger.warning('Raw prefilter disabled: not every outcome of selection rules '
+                                   'checks publication date and the same language of publication.')
+        use_prefilter = False
+    input_format = db_config.get('input_format') or INPUT_FORMAT_ISO2709
+    validate_input_format(input_format)
+
+    if resume and (db_config.get('delta_index') or not db_config.get('checkpoint')):
+        raise InvalidCheckpoint('Resume needs checkpoint section in configuration and is not supported '
+                                'for delta export.')
+
+    random_access = build_index or mms_ids_file or sample_size
+    if profiles and (db_config.get('sources') or db_config.get('delta_index') or resume or random_access):
+        raise InvalidProfilesConfiguration('Profiles are not supported with multiple sources, delta export, '
+                                           'resume and record index.')
+    if profiles and get_statistics():
+        marc_reader_logger.warning('Statistics are not computed for profiles.')
+    if random_access and not mms_ids_file and get_statistics():
+        marc_reader_logger.warning('Statistics are computed only for extracted records, not for record index '
+                                   'and sampling.')
+
+    field_cache_config = db_config.get('field_cache')
+    if field_cache_config and (db_config.get('sources') or db_config.get('delta_index')):
+        # content hashes of delta index are computed from whole records
+        marc_reader_logger.warning('Field cache is not used with multiple sources and delta export.')
+        field_cache_config = None
+
+    if db_config.get('sources'):
+        if resume or random_access:
+            raise InvalidSourcesConfiguration('Resume and record index need single source_db_name.')
+        run_sources(db_config, use_prefilter)
+        return
+
+    if db_config.get('parse_while_downloading') and not db_config.get('skip_download') \
+            and not resume and not random_access and not field_cache_config:
+        # records are parsed from the part of dump, which has already arrived
+        with open_raw_db_while_downloading(db_config.get('source_db_name'), **download_options) as fp:
+            with open_dump_stream(fp) as dump_fp:
+                if profiles:
+                    dump_profiles(select_and_extract_records_for_profiles(iter_input_records(dump_fp, input_format),
+                                                                          profiles, use_prefilter),
+                                  db_config.get('output'))
+                    return
+                dump_records(observe_statistics(select_and_extract_records(iter_input_records(dump_fp, input_format),
+                                                                           use_prefilter)),
+                             db_config.get('output'))
+        return
+
+    # get path to db (and download it, if needed); resumed run uses the dump it was interrupted on
+    path_to_raw_db = get_raw_db(db_config.get('source_db_name'), db_config.get('skip_download') or resume,
+                                **download_options)
+    if field_cache_config:
+        # records with only used fields, kept next to the dump and rebuilt when the dump or used tags change
+        path_to_raw_db = get_field_cache(path_to_raw_db, field_cache_config.get('path'), get_used_tags(profiles),
+                                         input_format, db_config.get('decompression_workers') or 1)
+        input_format = INPUT_FORMAT_ISO2709
+
+    sequential_only_reason = get_sequential_only_reason(path_to_raw_db, input_format)
+    if sequential_only_reason and random_access:
+        raise InvalidRecordIndex(f'Record index needs uncompressed ISO 2709 dump, {sequential_only_reason}.')
+    input_mode, workers = get_read_mode(db_config, sequential_only_reason)
+
+    if random_access:
+        index_path = db_config.get('record_index') or f'{path_to_raw_db}{RECORD_INDEX_SUFFIX}'
+        if build_index:
+            build_record_index(path_to_raw_db, index_path)
+            if not mms_ids_file and not sample_size:
+                return
+
+        record_index = open_record_index(path_to_raw_db, index_path)
+        try:
+            if mms_ids_file:
+                extract_records_by_ids(path_to_raw_db, record_index, mms_ids_file, db_config.get('output'))
+            if sample_size:
+                estimate_selection_rates(path_to_raw_db, record_index, sample_size, seed)
+        finally:
+            record_index.close()
+        return
+
+    if profiles:
+        dump_profiles(select_and_extract_profiles_dump(db_config, path_to_raw_db, use_prefilter, input_format,
+                                                       input_mode, workers),
+                      db_config.get('output'))
+        return
+
+    if db_config.get('delta_index'):
+        delta_index = DeltaIndex(db_config.get('delta_index'),
+                                 get_extraction_fingerprint(get_extraction_defining_files(db_config)))
+        try:
+            if input_mode == INPUT_MODE_MMAP:
+                dump_delta(observe_delta_statistics(select_and_extract_records_delta(
+                    iter_mmapped_records(path_to_raw_db, strict=True), delta_index, use_prefilter)),
+                           db_config.get('output'))
+            else:
+                with open_dump(path_to_raw_db, db_config.get('decompression_workers') or 1) as fp:
+                    dump_delta(observe_delta_statistics(select_and_extract_records_delta(
+                        iter_input_records(fp, input_format, strict=True), delta_index, use_prefilter)),
+                               db_config.get('output'))
+        finally:
+            delta_index.close()
+        return
+
+    output_config = db_config.get('output')
+    checkpointer = create_checkpointer(db_config, path_to_raw_db)
+    output_position = None
+    if resume:
+        if checkpointer is None:
+            raise InvalidCheckpoint('Checkpoints are not supported for this output.')
+        checkpoint = read_checkpoint_file(checkpointer.path)
+        if checkpoint is None:
+            raise InvalidCheckpoint(f'No checkpoint in {checkpointer.path}.')
+        reason = checkpointer.validate(checkpoint)
+        if reason:
+            raise InvalidCheckpoint(f'Checkpoint {checkpointer.path} can\'t be used: {reason}.')
+        if checkpoint['completed']:
+            marc_reader_logger.info(f'Run recorded in {checkpointer.path} is already completed, nothing to resume.')
+            return
+
+        checkpointer.position = InputPosition(checkpoint['input_offset'], checkpoint['records'])
+        checkpointer.last_checkpoint_records = checkpoint['records']
+        output_position = checkpoint['output_position']
+        output_config = {**(output_config or {}), 'append': True}
+        marc_reader_logger.info(f"Resuming after {checkpoint['records']} records, "
+                                f"from byte {checkpoint['input_offset']} of {path_to_raw_db}.")
+    position = checkpointer.position if checkpointer else None
+
+    records = select_and_extract_dump(db_config, path_to_raw_db, use_prefilter, input_format, input_mode, workers,
+                                      position)
+    dump_records(records, output_config, checkpointer, output_position)
 
 
 if __name__ == '__main__':
@@ -214,8 +1118,20 @@ if __name__ == '__main__':
     marc_reader_logger.addHandler(fhandler_2)
     attr_extr.atrributes_extractors_logger.addHandler(fhandler_2)
 
-    # parse configs
+    # parse arguments and configs
+    parser = argparse.ArgumentParser(description='Select records from MARC 21 dump and extract them to csv.')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue interrupted run from its last checkpoint')
+    parser.add_argument('--build-index', action='store_true',
+                        help='build index of record IDs (009, 001) -> position in dump')
+    parser.add_argument('--mms-ids', metavar='FILE',
+                        help='extract only records with IDs from file (one per line), using index')
+    parser.add_argument('--sample', type=int, metavar='N',
+                        help='estimate selection rates from N randomly sampled records, using index')
+    parser.add_argument('--seed', type=int, help='seed of random sample')
+    args = parser.parse_args()
+
     db_config_parsed = load_config('source_db.yaml')
 
     # run
-    main(db_config_parsed)
+    main(db_config_parsed, args.resume, args.build_index, args.mms_ids, args.sample, args.seed)
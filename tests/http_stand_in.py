@@ -0,0 +1,98 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class ServedFile(object):
+    """
+    File served by DumpServer: content, its ETag and number of bytes after which the next
+    responses drop the connection (drop_after, one response per item of drops).
+    """
+
+    def __init__(self, content: bytes, etag: str, drops: Optional[List[int]] = None):
+        self.content = content
+        self.etag = etag
+        self.drops = list(drops or [])
+
+
+class DumpServer(object):
+    """
+    Local HTTP stand-in of the dump server on an ephemeral port: ETag / If-None-Match (304),
+    Range with If-Range (206, or the whole file with 200, if the ETag changed) and dropped connections.
+    Every request is recorded as (path, status).
+    """
+
+    def __init__(self, files: Dict[str, ServedFile]):
+        self.files = files
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+
+    def __enter__(self) -> 'DumpServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def record(self, path: str, status: int) -> None:
+        with self.lock:
+            self.requests.append((path, status))
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        path = handler.path.lstrip('/')
+        served = self.files.get(path)
+        if served is None:
+            self.record(path, 404)
+            handler.send_response(404)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        if handler.headers.get('If-None-Match') == served.etag:
+            self.record(path, 304)
+            handler.send_response(304)
+            handler.send_header('ETag', served.etag)
+            handler.end_headers()
+            return
+
+        start = 0
+        range_header = handler.headers.get('Range')
+        if range_header and handler.headers.get('If-Range') == served.etag:
+            start = int(range_header.split('=')[1].rstrip('-'))
+        status = 206 if start else 200
+        body = served.content[start:]
+
+        self.record(path, status)
+        handler.send_response(status)
+        handler.send_header('ETag', served.etag)
+        handler.send_header('Content-Length', str(len(body)))
+        if start:
+            handler.send_header('Content-Range', f'bytes {start}-{len(served.content) - 1}/{len(served.content)}')
+        handler.end_headers()
+
+        drop_after = served.drops.pop(0) if served.drops else None
+        if drop_after is not None:
+            # the client gets less than Content-Length and the connection is closed
+            handler.wfile.write(body[:drop_after])
+            handler.wfile.flush()
+            handler.close_connection = True
+            return
+        handler.wfile.write(body)
@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pymarc import Field, Record, Subfield
+
+
+def make_raw_record(mms_id: str, title: str, extent: Optional[str] = None, extra_fields: Optional[List[Field]] = None,
+                    control_008: Optional[str] = None) -> bytes:
+    """
+    ISO 2709 (UTF-8) record with 009 (MMS ID), 245 $a and optionally 008, 300 $a and other fields.
+    """
+
+    record = Record(force_utf8=True)
+    record.add_field(Field(tag='009', data=mms_id))
+    if control_008 is not None:
+        record.add_field(Field(tag='008', data=control_008))
+    record.add_field(Field(tag='245', indicators=['1', '0'], subfields=[Subfield('a', title)]))
+    if extent is not None:
+        record.add_field(Field(tag='300', indicators=[' ', ' '], subfields=[Subfield('a', extent)]))
+    for field in extra_fields or []:
+        record.add_field(field)
+    return record.as_marc()
@@ -0,0 +1,47 @@
+import unittest
+
+from pymarc import Field, Subfield
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.diagnostics.diagnostics import start_diagnostics, MISSING_008
+from commons.marc_handling.lazy_record import LazyRecord
+from commons.marc_handling.record_view import RecordView
+from tests.marc_records import make_raw_record
+
+# extractors of the default field mapping and of selection rules
+EXTRACTORS = [attr_extr.get_publication_dates, attr_extr.get_country_of_publication, attr_extr.get_language_of_original,
+              attr_extr.get_language_of_publication, attr_extr.is_translation, attr_extr.get_creator,
+              attr_extr.get_title_of_original, attr_extr.get_audience_characteristics, attr_extr.get_cocreator,
+              attr_extr.get_publisher_uniform_name]
+
+
+class MissingControlFieldTest(unittest.TestCase):
+
+    def setUp(self):
+        self.diagnostics = start_diagnostics({'path': None})
+
+    def test_language_of_original_without_008_from_041_h(self):
+        field_041 = Field(tag='041', indicators=['1', ' '], subfields=[Subfield('a', 'pol'), Subfield('h', 'eng')])
+        rcd = RecordView(LazyRecord(make_raw_record('991', 'Title', extra_fields=[field_041])))
+        self.assertEqual(attr_extr.get_language_of_original(rcd), ['eng'])
+
+    def test_language_of_original_without_008_and_041_is_empty(self):
+        rcd = RecordView(LazyRecord(make_raw_record('991', 'Title')))
+        self.assertEqual(attr_extr.get_language_of_original(rcd), [])
+
+    def test_missing_008_is_reported_once_per_record(self):
+        rcd = RecordView(LazyRecord(make_raw_record('991', 'Title')))
+        for extractor in EXTRACTORS:
+            extractor(rcd)
+        self.assertEqual(self.diagnostics.counts[MISSING_008], 1)
+
+    def test_language_of_original_from_041_h(self):
+        field_041 = Field(tag='041', indicators=['1', ' '], subfields=[Subfield('a', 'pol'), Subfield('h', 'eng')])
+        rcd = RecordView(LazyRecord(make_raw_record('991', 'Title', extra_fields=[field_041],
+                                                    control_008=f'{" " * 35}pol  ')))
+        self.assertEqual(attr_extr.get_language_of_original(rcd), ['eng'])
+        self.assertEqual(self.diagnostics.counts[MISSING_008], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import sqlite3
+import unittest
+from unittest import mock
+
+import get_csv_from_marc_db_dump
+from commons.output.sinks import create_sink, DEFAULT_SQLITE_TABLE, OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL, \
+    OUTPUT_FORMAT_SQLITE
+from get_csv_from_marc_db_dump import run
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase
+
+RECORDS_NUMBER = 40
+WRITTEN_BEFORE_INTERRUPTION = 17
+
+
+class Interrupted(Exception):
+    pass
+
+
+def create_interrupted_sink(output_config, column_types=None):
+    # sink of the run interrupted after some records were written (and maybe flushed after the last checkpoint)
+    sink = create_sink(output_config, column_types)
+    write = sink.write
+    written = []
+
+    def write_until_interrupted(record):
+        if len(written) == WRITTEN_BEFORE_INTERRUPTION:
+            raise Interrupted()
+        written.append(record)
+        write(record)
+
+    sink.write = write_until_interrupted
+    return sink
+
+
+class ResumeTest(WorkspaceTestCase):
+
+    # records without extent aren't selected, so checkpoints aren't at every written record
+    selection_rules = {'checks': {'has_extent': {'type': 'has_values', 'tag': '300'}},
+                       'outcomes': [{'value': 1, 'checks': ['has_extent']}]}
+
+    def setUp(self):
+        super().setUp()
+        self.write_dump('bibs.marc', b''.join(make_raw_record(f'99{number}', f'Title {number}',
+                                                              extent='100 s.' if number % 3 else None)
+                                              for number in range(RECORDS_NUMBER)))
+
+    def run_interrupted_and_resumed(self, output_format: str, path: str) -> None:
+        db_config = {'source_db_name': 'bibs.marc', 'skip_download': True, 'checkpoint': {'every_records': 5},
+                     'output': {'format': output_format, 'path': path, 'batch_size': 3}}
+        with mock.patch.object(get_csv_from_marc_db_dump, 'create_sink', create_interrupted_sink):
+            with self.assertRaises(Interrupted):
+                run(db_config)
+        run(db_config, resume=True)
+
+    def run_uninterrupted(self, output_format: str, path: str) -> None:
+        run({'source_db_name': 'bibs.marc', 'skip_download': True, 'checkpoint': {'every_records': 5},
+             'output': {'format': output_format, 'path': path, 'batch_size': 3}})
+
+    def test_resumed_csv_is_the_same_as_uninterrupted(self):
+        self.run_interrupted_and_resumed(OUTPUT_FORMAT_CSV, 'resumed.csv')
+        self.run_uninterrupted(OUTPUT_FORMAT_CSV, 'uninterrupted.csv')
+        self.assertEqual(self.read_text('resumed.csv'), self.read_text('uninterrupted.csv'))
+        self.assertEqual(self.read_text('resumed.csv').count('\n'), 1 + RECORDS_NUMBER - (RECORDS_NUMBER + 2) // 3)
+
+    def test_resumed_jsonl_is_the_same_as_uninterrupted(self):
+        self.run_interrupted_and_resumed(OUTPUT_FORMAT_JSONL, 'resumed.jsonl')
+        self.run_uninterrupted(OUTPUT_FORMAT_JSONL, 'uninterrupted.jsonl')
+        self.assertEqual(self.read_text('resumed.jsonl'), self.read_text('uninterrupted.jsonl'))
+
+    def test_resumed_sqlite_is_the_same_as_uninterrupted(self):
+        self.run_interrupted_and_resumed(OUTPUT_FORMAT_SQLITE, 'resumed.sqlite')
+        self.run_uninterrupted(OUTPUT_FORMAT_SQLITE, 'uninterrupted.sqlite')
+        self.assertEqual(self.read_table('resumed.sqlite'), self.read_table('uninterrupted.sqlite'))
+
+    @staticmethod
+    def read_table(path: str) -> list:
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute(f'SELECT * FROM "{DEFAULT_SQLITE_TABLE}" ORDER BY rowid').fetchall()
+        finally:
+            connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
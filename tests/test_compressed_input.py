@@ -0,0 +1,116 @@
+import bz2
+import gzip
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+import commons.marc_handling.compressed_input as compressed_input
+from commons.marc_handling.compressed_input import open_dump, open_dump_stream, detect_file_compression, \
+    COMPRESSION_GZIP, COMPRESSION_BZ2, COMPRESSION_ZSTD, ZSTD_MAGIC
+from commons.marc_handling.iso2709 import iter_raw_records
+from exceptions.custom_exceptions import MissingOptionalDependency
+from tests.marc_records import make_raw_record
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# small blocks, so there are more of them than decompressed by one task
+BGZF_BLOCK_DATA_SIZE = 200
+
+
+def make_bgzf_block(data: bytes) -> bytes:
+    # gzip member with BC extra subfield holding size of the whole block - 1, as written by bgzip
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    block_size = 18 + len(deflated) + 8
+    header = b'\x1f\x8b\x08\x04' + b'\x00' * 4 + b'\x00\xff' + struct.pack('<H', 6) + b'BC' \
+        + struct.pack('<HH', 2, block_size - 1)
+    return header + deflated + struct.pack('<II', zlib.crc32(data), len(data))
+
+
+def make_bgzf(data: bytes) -> bytes:
+    blocks = [make_bgzf_block(data[start:start + BGZF_BLOCK_DATA_SIZE])
+              for start in range(0, len(data), BGZF_BLOCK_DATA_SIZE)]
+    # empty block marks the end of file
+    return b''.join(blocks) + make_bgzf_block(b'')
+
+
+class CompressedInputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dump = b''.join(make_raw_record(f'99{number}', f'Title {number}', extent=f'{number} s.')
+                             for number in range(300))
+        with open(self.write_file('bibs.marc', self.dump), 'rb') as fp:
+            self.expected_records = list(iter_raw_records(fp))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as fp:
+            fp.write(content)
+        return path
+
+    def assert_read_as_uncompressed(self, path: str, decompression_workers: int = 1) -> None:
+        with open_dump(path, decompression_workers) as fp:
+            self.assertEqual(list(iter_raw_records(fp)), self.expected_records)
+        with open(path, 'rb') as raw_fp:
+            self.assertEqual(list(iter_raw_records(open_dump_stream(raw_fp))), self.expected_records)
+
+    def test_uncompressed(self):
+        self.assertEqual(len(self.expected_records), 300)
+        self.assert_read_as_uncompressed(os.path.join(self.temp_dir.name, 'bibs.marc'))
+
+    def test_gzip(self):
+        path = self.write_file('bibs.marc.gz', gzip.compress(self.dump))
+        self.assertEqual(detect_file_compression(path), COMPRESSION_GZIP)
+        self.assert_read_as_uncompressed(path)
+        # not BGZF, read by one thread
+        self.assert_read_as_uncompressed(path, decompression_workers=3)
+
+    def test_bz2(self):
+        path = self.write_file('bibs.marc.bz2', bz2.compress(self.dump))
+        self.assertEqual(detect_file_compression(path), COMPRESSION_BZ2)
+        self.assert_read_as_uncompressed(path)
+
+    def test_bgzf_is_decompressed_in_parallel(self):
+        bgzf = make_bgzf(self.dump)
+        self.assertGreater(bgzf.count(b'BC\x02\x00'), compressed_input.BGZF_BLOCKS_PER_TASK)
+        self.assertEqual(gzip.decompress(bgzf), self.dump)
+        path = self.write_file('bibs.marc.gz', bgzf)
+
+        with self.assertLogs('compressed_input', level='INFO'):
+            self.assert_read_as_uncompressed(path, decompression_workers=3)
+        self.assert_read_as_uncompressed(path)
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        single_frame = self.write_file('bibs.marc.zst', zstandard.ZstdCompressor().compress(self.dump))
+        middle = len(self.dump) // 2
+        multi_frame = self.write_file('bibs.marc.2.zst', zstandard.ZstdCompressor().compress(self.dump[:middle])
+                                      + zstandard.ZstdCompressor().compress(self.dump[middle:]))
+
+        self.assertEqual(detect_file_compression(single_frame), COMPRESSION_ZSTD)
+        self.assert_read_as_uncompressed(single_frame)
+        self.assert_read_as_uncompressed(multi_frame)
+        self.assert_read_as_uncompressed(multi_frame, decompression_workers=3)
+
+    def test_zstd_without_zstandard_is_reported(self):
+        path = self.write_file('bibs.marc.zst', ZSTD_MAGIC + b'\x00' * 20)
+
+        with mock.patch.object(compressed_input, 'zstandard', None):
+            with self.assertRaises(MissingOptionalDependency):
+                open_dump(path)
+            with open(path, 'rb') as fp, self.assertRaises(MissingOptionalDependency):
+                open_dump_stream(fp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from commons.downloaders.db_dump_downloader import download_db, PART_SUFFIX
+from exceptions.custom_exceptions import DownloadFailed
+from tests.http_stand_in import DumpServer, ServedFile
+
+DUMP = bytes(range(256)) * 64
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'bibs.marc')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_downloaded(self) -> bytes:
+        with open(self.path, 'rb') as fp:
+            return fp.read()
+
+    def test_not_modified_dump_is_not_downloaded_again(self):
+        with DumpServer({'bibs.marc': ServedFile(DUMP, '"v1"')}) as server:
+            self.assertTrue(download_db(f'{server.base_url}bibs.marc', self.path))
+            self.assertFalse(download_db(f'{server.base_url}bibs.marc', self.path))
+
+        self.assertEqual(server.requests, [('bibs.marc', 200), ('bibs.marc', 304)])
+        self.assertEqual(self.read_downloaded(), DUMP)
+
+    def test_download_is_resumed_after_dropped_connection(self):
+        with DumpServer({'bibs.marc': ServedFile(DUMP, '"v1"', drops=[5000, 3000])}) as server:
+            self.assertTrue(download_db(f'{server.base_url}bibs.marc', self.path, max_retries=2))
+
+        self.assertEqual(server.requests, [('bibs.marc', 200), ('bibs.marc', 206), ('bibs.marc', 206)])
+        self.assertEqual(self.read_downloaded(), DUMP)
+        self.assertFalse(os.path.exists(f'{self.path}{PART_SUFFIX}'))
+
+    def test_changed_etag_forces_full_download(self):
+        served = ServedFile(DUMP, '"v1"')
+        with DumpServer({'bibs.marc': served}) as server:
+            self.assertTrue(download_db(f'{server.base_url}bibs.marc', self.path))
+
+            # the dump changes on the server, while its new version is being downloaded
+            served.content, served.etag, served.drops = DUMP[::-1], '"v2"', [5000]
+            with self.assertRaises(DownloadFailed):
+                download_db(f'{server.base_url}bibs.marc', self.path, max_retries=0)
+            self.assertEqual(self.read_downloaded(), DUMP)
+
+            # and changes again, so the partial download can't be resumed
+            served.content, served.etag = DUMP * 2, '"v3"'
+            self.assertTrue(download_db(f'{server.base_url}bibs.marc', self.path))
+
+        self.assertEqual(server.requests, [('bibs.marc', 200), ('bibs.marc', 200), ('bibs.marc', 200)])
+        self.assertEqual(self.read_downloaded(), DUMP * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import io
+import os
+import tempfile
+import unittest
+
+from commons.delta.delta_index import DeltaIndex, CHANGE_ADDED, CHANGE_DELETED
+from commons.marc_handling.field_mapping import FieldMapping, get_field_mapping, set_field_mapping
+from commons.marc_handling.input_formats import iter_input_records
+from commons.marc_handling.iso2709 import iter_mmapped_records
+from commons.marc_handling.selection_rules import SelectionRules, get_selection_rules, set_selection_rules
+from commons.statistics.streaming_statistics import start_statistics
+from get_csv_from_marc_db_dump import select_and_extract_records_delta, run
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase
+
+RECORDS_NUMBER = 10
+
+
+class IncompleteDumpDeltaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = get_field_mapping(), get_selection_rules()
+        set_field_mapping(FieldMapping([{'name': 'mms_id', 'tag': '009', 'first': True, 'required': True}]))
+        set_selection_rules(SelectionRules({'has_title': {'type': 'has_values', 'tag': '245'}},
+                                           [{'value': 1, 'checks': ['has_title']}]))
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.temp_dir.name, 'delta.sqlite')
+        self.dump = b''.join(make_raw_record(f'99{number}', f'Title {number}') for number in range(RECORDS_NUMBER))
+        # the dump cut in the middle of its fourth record
+        self.damaged_dump = self.dump[:self.dump.index(b'Title 3')]
+
+    def tearDown(self):
+        set_field_mapping(self.previous[0])
+        set_selection_rules(self.previous[1])
+        self.temp_dir.cleanup()
+
+    def run_delta(self, raw_records):
+        delta_index = DeltaIndex(self.index_path, 'fingerprint')
+        try:
+            return [(change_type, mms_id) for change_type, mms_id, _
+                    in select_and_extract_records_delta(raw_records, delta_index)]
+        finally:
+            delta_index.close()
+
+    def assert_damaged_dump_deletes_nothing(self, damaged_records):
+        changes = self.run_delta(iter_input_records(io.BytesIO(self.dump), strict=True))
+        self.assertEqual([change_type for change_type, _ in changes], [CHANGE_ADDED] * RECORDS_NUMBER)
+
+        changes = self.run_delta(damaged_records)
+        self.assertEqual(len(changes), 3)
+        self.assertNotIn(CHANGE_DELETED, [change_type for change_type, _ in changes])
+
+        # records not read stayed in the index, so they are neither added nor deleted by the next complete run
+        changes = self.run_delta(iter_input_records(io.BytesIO(self.dump), strict=True))
+        self.assertEqual(len(changes), RECORDS_NUMBER)
+        self.assertEqual({change_type for change_type, _ in changes}, {'unchanged'})
+
+    def test_early_stop_of_stream_keeps_records_not_read(self):
+        self.assert_damaged_dump_deletes_nothing(iter_input_records(io.BytesIO(self.damaged_dump), strict=True))
+
+    def test_early_stop_of_mmapped_dump_keeps_records_not_read(self):
+        dump_path = os.path.join(self.temp_dir.name, 'damaged.marc')
+        with open(dump_path, 'wb') as fp:
+            fp.write(self.damaged_dump)
+        self.assert_damaged_dump_deletes_nothing(iter_mmapped_records(dump_path, strict=True))
+
+    def test_records_missing_in_complete_dump_are_deleted(self):
+        self.run_delta(iter_input_records(io.BytesIO(self.dump), strict=True))
+        first_record = make_raw_record('990', 'Title 0')
+        changes = self.run_delta(iter_input_records(io.BytesIO(first_record), strict=True))
+        self.assertEqual([mms_id for change_type, mms_id in changes if change_type == CHANGE_DELETED],
+                         [f'99{number}' for number in range(1, RECORDS_NUMBER)])
+
+
+class DeltaStatisticsTest(WorkspaceTestCase):
+
+    def tearDown(self):
+        start_statistics(None)
+        super().tearDown()
+
+    def run_delta_with_statistics(self, titles):
+        self.write_dump('bibs.marc', b''.join(make_raw_record(f'99{number}', title)
+                                              for number, title in enumerate(titles)))
+
+        statistics = start_statistics({'path': None, 'exact': ['title']})
+        run({'source_db_name': 'bibs.marc', 'skip_download': True, 'delta_index': 'db/bibs.delta.sqlite',
+             'output': {'format': 'csv', 'path': 'extracted.csv'}})
+        return statistics.as_dict()
+
+    def test_statistics_of_delta_export_describe_full_output(self):
+        report = self.run_delta_with_statistics(['A', 'B', 'B'])
+        self.assertEqual(report['records'], 3)
+        self.assertEqual(report['exact']['title'], {'B': 2, 'A': 1})
+
+        # unchanged, changed and deleted records
+        report = self.run_delta_with_statistics(['A', 'C'])
+        self.assertEqual(report['records'], 2)
+        self.assertEqual(report['exact']['title'], {'A': 1, 'C': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
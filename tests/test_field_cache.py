@@ -0,0 +1,107 @@
+import inspect
+import os
+import unittest
+from unittest import mock
+
+import yaml
+from pymarc import Field, Subfield
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.configuration_loader import CONFIG_PATH
+from commons.diagnostics.diagnostics import start_diagnostics
+from commons.marc_handling.lazy_record import LazyRecord
+from commons.marc_handling.record_view import RecordView
+from get_csv_from_marc_db_dump import run
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase
+
+REPOSITORY_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), CONFIG_PATH)
+# extractors take the record as the only argument
+EXTRACTORS = [function for name, function in vars(attr_extr).items()
+              if inspect.isfunction(function) and function.__module__ == attr_extr.__name__
+              and list(inspect.signature(function).parameters) == ['pymarc_rcd']]
+
+
+def load_repository_config(file: str) -> dict:
+    with open(os.path.join(REPOSITORY_CONFIG_PATH, file), 'rt', encoding='utf-8') as fp:
+        return yaml.safe_load(fp)
+
+
+def make_field(tag: str, *subfields: str) -> Field:
+    return Field(tag=tag, indicators=['1', ' '],
+                 subfields=[Subfield(subfield[0], subfield[1:]) for subfield in subfields])
+
+
+def make_translation(number: int) -> bytes:
+    # record with fields read by every extractor (and by selection rules), and fields nobody reads
+    return make_raw_record(f'99{number}', f'Tytuł {number}', extent=f'{100 + number} s.',
+                           control_008=f'000101s{1990 + number}    pl            000 1 pol d', extra_fields=[
+                               make_field('020', f'a97883{number:07d}'),
+                               make_field('041', 'apol', f'h{"eng" if number % 2 else "gerfre"}'),
+                               make_field('044', 'apl'),
+                               make_field('100', f'aAutor {number},', 'd1950-', 'eaut.'),
+                               make_field('246', 'iTyt. oryg.:', f'aOriginal title {number} 1989'),
+                               make_field('260', 'aWarszawa :', f'bWydawnictwo {number % 3},', 'c2001.'),
+                               make_field('385', 'mGrupa wiekowa', 'aDorośli'),
+                               make_field('380', 'aKsiążki'),
+                               make_field('650', 'aPowieść angielska'),
+                               make_field('700', f'aTłumacz {number}', 'etł.'),
+                               make_field('710', f'aWydawnictwo {number % 3}', '4pbl'),
+                               make_field('856', f'uhttp://example.org/{number}')])
+
+
+class ExtractorsTagsTest(unittest.TestCase):
+
+    def setUp(self):
+        start_diagnostics({'path': None})
+
+    def test_extractors_read_only_extractors_tags(self):
+        read_tags = []
+        get_fields, contains = RecordView.get_fields, RecordView.__contains__
+
+        def recording_get_fields(view, *tags):
+            read_tags.extend(tags or ['all fields'])
+            return get_fields(view, *tags)
+
+        def recording_contains(view, tag):
+            read_tags.append(tag)
+            return contains(view, tag)
+
+        with mock.patch.object(RecordView, 'get_fields', recording_get_fields), \
+                mock.patch.object(RecordView, '__contains__', recording_contains):
+            for number in range(2):
+                rcd = RecordView(LazyRecord(make_translation(number)))
+                for extractor in EXTRACTORS:
+                    extractor(rcd)
+
+        self.assertGreaterEqual(len(EXTRACTORS), 10)
+        self.assertTrue(read_tags)
+        self.assertEqual(sorted(set(read_tags) - set(attr_extr.EXTRACTORS_TAGS)), [])
+
+
+class FieldCacheTest(WorkspaceTestCase):
+
+    columns_specs = load_repository_config('field_mapping.yaml')['columns']
+    selection_rules = load_repository_config('selection_rules.yaml')
+
+    def test_output_from_field_cache_is_the_same_as_from_dump(self):
+        dump_path = self.write_dump('bibs.marc', b''.join(make_translation(number) for number in range(20)))
+        db_config = {'source_db_name': 'bibs.marc', 'skip_download': True}
+
+        run({**db_config, 'output': {'format': 'csv', 'path': 'from_dump.csv'}})
+        with self.assertLogs('field_cache', level='INFO') as logs:
+            run({**db_config, 'field_cache': {'path': 'db/bibs.fields'},
+                 'output': {'format': 'csv', 'path': 'from_built_cache.csv'}})
+            run({**db_config, 'field_cache': {'path': 'db/bibs.fields'},
+                 'output': {'format': 'csv', 'path': 'from_cache.csv'}})
+
+        self.assertTrue(any('Reading records from field cache' in message for message in logs.output))
+        self.assertLess(os.path.getsize('db/bibs.fields'), os.path.getsize(dump_path))
+        from_dump = self.read_text('from_dump.csv')
+        self.assertEqual(from_dump.count('\n'), 21)
+        self.assertEqual(self.read_text('from_built_cache.csv'), from_dump)
+        self.assertEqual(self.read_text('from_cache.csv'), from_dump)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+from io import BytesIO
+
+from commons.diagnostics.diagnostics import start_diagnostics, get_diagnostics, DECODING_FAILED
+from commons.marc_handling.input_formats import iter_marc_json_records
+from commons.marc_handling.iso2709 import encode_record, MAX_FIELD_LENGTH
+from commons.marc_handling.lazy_record import LazyRecord
+from get_csv_from_marc_db_dump import decode_record
+
+
+def make_json_line(mms_id: str, title: str) -> bytes:
+    record = {'leader': '00000nam a2200000 i 4500',
+              'fields': [{'009': mms_id}, {'245': {'ind1': '1', 'ind2': '0', 'subfields': [{'a': title}]}}]}
+    return json.dumps(record).encode('utf-8') + b'\n'
+
+
+class FieldLengthTest(unittest.TestCase):
+
+    def test_field_longer_than_directory_allows_is_rejected(self):
+        with self.assertRaises(ValueError):
+            encode_record([('009', '991'), ('500', '  ', [('a', 'x' * MAX_FIELD_LENGTH)])])
+
+    def test_longest_field_is_encoded(self):
+        # indicators, subfield delimiter and code, and field terminator
+        value = 'x' * (MAX_FIELD_LENGTH - 5)
+        record = LazyRecord(encode_record([('009', '991'), ('500', '  ', [('a', value)])]))
+
+        self.assertEqual(record.get_fields('500')[0].get_subfields('a'), [value])
+
+    def test_marc_json_record_with_too_long_field_is_logged_and_skipped(self):
+        lines = make_json_line('991', 'Title 1') + make_json_line('992', 'x' * MAX_FIELD_LENGTH) \
+            + make_json_line('993', 'Title 3')
+
+        with self.assertLogs('input_formats', level='ERROR') as logs:
+            records = [LazyRecord(raw_record) for raw_record in iter_marc_json_records(BytesIO(lines))]
+
+        self.assertEqual([record.get_fields('009')[0].value() for record in records], ['991', '993'])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('MARC-JSON line 2 skipped', logs.output[0])
+
+
+class DecodingFailedTest(unittest.TestCase):
+
+    def setUp(self):
+        start_diagnostics({'path': None})
+
+    def tearDown(self):
+        start_diagnostics({'path': None})
+
+    def test_undecodable_record_is_counted(self):
+        self.assertIsNone(decode_record(b'00026nam a2200025 i 4500\x1d'))
+        self.assertEqual(get_diagnostics().counts[DECODING_FAILED], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+from pymarc import Field, Record, Subfield
+
+from commons.marc_handling.lazy_record import LazyRecord
+from tests.marc_records import make_raw_record
+
+REJECTED = 'rejected'
+
+
+def make_record_with_fields() -> bytes:
+    return make_raw_record('991', 'Zażółć gęślą jaźń', extent='123 s.', control_008=f'{" " * 35}pol  ', extra_fields=[
+        Field(tag='041', indicators=['1', ' '], subfields=[Subfield('a', 'pol'), Subfield('h', 'eng')]),
+        Field(tag='700', indicators=['1', ' '], subfields=[Subfield('a', 'Kowalski, Jan'), Subfield('e', 'tł.')]),
+        Field(tag='700', indicators=['1', ' '], subfields=[Subfield('a', 'Nowak, Anna'), Subfield('e', '')]),
+        Field(tag='650', indicators=[' ', '4'], subfields=[Subfield('a', 'Powieść')])])
+
+
+def as_comparable(fields) -> list:
+    return [(field.tag, field.data) if field.is_control_field()
+            else (field.tag, tuple(field.indicators), [tuple(subfield) for subfield in field.subfields])
+            for field in fields]
+
+
+def decode_with_pymarc(raw_record: bytes):
+    # as by permissive MARCReader, which rejected the same records
+    try:
+        return as_comparable(Record(data=raw_record, to_unicode=True, force_utf8=True, utf8_handling='ignore').fields)
+    except Exception:
+        return REJECTED
+
+
+def decode_lazily(raw_record: bytes):
+    try:
+        return as_comparable(LazyRecord(raw_record).fields)
+    except Exception:
+        return REJECTED
+
+
+def replace_once(raw_record: bytes, old: bytes, new: bytes) -> bytes:
+    assert raw_record.count(old) == 1
+    return raw_record.replace(old, new)
+
+
+class LazyRecordTest(unittest.TestCase):
+
+    def assert_decoded_as_by_pymarc(self, raw_record: bytes, rejected: bool) -> None:
+        decoded = decode_with_pymarc(raw_record)
+        self.assertEqual(decoded == REJECTED, rejected)
+        self.assertEqual(decode_lazily(raw_record), decoded)
+
+    def test_fields_and_subfields_are_the_same(self):
+        raw_record = make_record_with_fields()
+        self.assert_decoded_as_by_pymarc(raw_record, rejected=False)
+
+        lazy_record, pymarc_record = LazyRecord(raw_record), Record(data=raw_record, force_utf8=True)
+        for tag in ('001', '008', '009', '041', '245', '300', '650', '700', '999'):
+            self.assertEqual(as_comparable(lazy_record.get_fields(tag)), as_comparable(pymarc_record.get_fields(tag)))
+        self.assertEqual(as_comparable(lazy_record.get_fields('700', '041')),
+                         as_comparable(pymarc_record.get_fields('700', '041')))
+        self.assertEqual([field.value() for field in lazy_record.get_fields('700')],
+                         [field.value() for field in pymarc_record.get_fields('700')])
+        self.assertEqual(lazy_record.get_fields('041')[0].get_subfields('a', 'h'),
+                         pymarc_record.get_fields('041')[0].get_subfields('a', 'h'))
+
+    def test_invalid_directory_is_rejected(self):
+        raw_record = make_record_with_fields()
+        base_address = int(raw_record[12:17])
+        # directory one byte shorter than its entries
+        invalid = raw_record[:12] + b'%05d' % (base_address - 1) + raw_record[17:base_address - 2] \
+            + raw_record[base_address - 1:]
+        self.assert_decoded_as_by_pymarc(invalid, rejected=True)
+
+    def test_invalid_base_address_is_rejected(self):
+        raw_record = make_record_with_fields()
+        self.assert_decoded_as_by_pymarc(raw_record[:12] + b'00000' + raw_record[17:], rejected=True)
+        self.assert_decoded_as_by_pymarc(raw_record[:12] + b'99999' + raw_record[17:], rejected=True)
+
+    def test_bad_utf8_in_subfield_is_dropped(self):
+        # of the same length, so the directory is still valid
+        raw_record = replace_once(make_record_with_fields(), 'Powieść'.encode('utf-8'), b'Powie\xc5\xff\xff\xff')
+        self.assert_decoded_as_by_pymarc(raw_record, rejected=False)
+        self.assertEqual(LazyRecord(raw_record).get_fields('650')[0].get_subfields('a'), ['Powie'])
+
+    def test_bad_utf8_in_control_field_is_rejected(self):
+        raw_record = replace_once(make_record_with_fields(), b'991', b'9\xff1')
+        self.assert_decoded_as_by_pymarc(raw_record, rejected=True)
+
+    def test_missing_field_terminator(self):
+        # the last byte of every field is dropped as its terminator, whatever it is
+        raw_record = make_record_with_fields()
+        raw_record = replace_once(raw_record, b'123 s.\x1e', b'123 s.x')
+        self.assert_decoded_as_by_pymarc(raw_record, rejected=False)
+
+    def test_missing_end_of_record_is_rejected(self):
+        self.assert_decoded_as_by_pymarc(make_record_with_fields()[:-1], rejected=True)
+
+    def test_truncated_record_is_rejected(self):
+        self.assert_decoded_as_by_pymarc(make_record_with_fields()[:-20], rejected=True)
+
+    def test_missing_indicators_are_blank(self):
+        raw_record = replace_once(make_record_with_fields(), b'\x1e 4\x1fa', b'\x1e\x1fx\x1fa')
+        self.assert_decoded_as_by_pymarc(raw_record, rejected=False)
+        self.assertEqual(LazyRecord(raw_record).get_fields('650')[0].indicators, (' ', ' '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import csv
+import unittest
+
+from commons.marc_handling.field_mapping import FieldMapping, set_field_mapping
+from commons.marc_handling.selection_rules import SelectionRules, set_selection_rules
+from get_csv_from_marc_db_dump import run
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase
+
+RECORDS_NUMBER = 25
+EXTENT_COLUMNS_SPECS = [{'name': 'mms_id', 'tag': '009', 'first': True},
+                        {'name': 'extent', 'tag': '300', 'subfields': ['a'], 'first': True}]
+HAS_EXTENT_CHECKS = {'has_extent': {'type': 'has_values', 'tag': '300'}}
+HAS_EXTENT_OUTCOMES = [{'value': 2, 'checks': ['has_extent']}]
+
+
+def read_csv(path: str) -> list:
+    with open(path, 'rt', newline='', encoding='utf-8') as fp:
+        return list(csv.reader(fp))
+
+
+class ParallelExtractionTest(WorkspaceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # set in main process only, different from configuration files, which workers must not load again
+        set_field_mapping(FieldMapping(EXTENT_COLUMNS_SPECS))
+        set_selection_rules(SelectionRules(HAS_EXTENT_CHECKS, HAS_EXTENT_OUTCOMES))
+
+    def test_workers_extract_with_field_mapping_and_rules_of_main_process(self):
+        self.write_dump('bibs.marc', b''.join(make_raw_record(f'99{number}', f'Title {number}',
+                                                              extent=f'{number} p.' if number % 5 else None)
+                                              for number in range(RECORDS_NUMBER)))
+        db_config = {'source_db_name': 'bibs.marc', 'skip_download': True, 'records_per_shard': 4}
+
+        run({**db_config, 'output': {'format': 'csv', 'path': 'sequential.csv'}})
+        run({**db_config, 'extraction_workers': 3, 'output': {'format': 'csv', 'path': 'parallel.csv'}})
+
+        expected = [['mms_id', 'extent', 'is_selected_value']] + \
+            [[f'99{number}', f'{number} p.', '2'] for number in range(RECORDS_NUMBER) if number % 5]
+        self.assertEqual(read_csv('sequential.csv'), expected)
+        self.assertEqual(read_csv('parallel.csv'), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
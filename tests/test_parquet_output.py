@@ -0,0 +1,54 @@
+import unittest
+
+from commons.marc_handling.field_mapping import FieldMapping
+from commons.output.sinks import create_sink
+from exceptions.custom_exceptions import InvalidFieldMapping, InvalidOutputConfiguration
+from get_csv_from_marc_db_dump import run
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase, TITLE_COLUMNS_SPECS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CONTROL_008_2001 = '000101s2001    pl            000 0 pol d'
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class ParquetSchemaTest(WorkspaceTestCase):
+
+    columns_specs = [*TITLE_COLUMNS_SPECS,
+                     {'name': 'isbn', 'tag': '020', 'subfields': ['a']},
+                     {'name': 'publication_date', 'extractor': 'get_publication_dates', 'type': 'int32'}]
+
+    def test_schema_has_columns_of_field_mapping(self):
+        self.write_dump('bibs.marc', make_raw_record('991', 'Title 1', control_008=CONTROL_008_2001)
+                        + make_raw_record('992', 'Title 2'))
+
+        run({'source_db_name': 'bibs.marc', 'skip_download': True,
+             'output': {'format': 'parquet', 'path': 'extracted.parquet'}})
+
+        table = pq.read_table('extracted.parquet')
+        self.assertEqual(table.column_names, ['mms_id', 'title', 'isbn', 'publication_date', 'is_selected_value'])
+        self.assertEqual([table.schema.field(name).type for name in ('mms_id', 'title', 'publication_date')],
+                         [pa.string(), pa.string(), pa.int32()])
+        self.assertTrue(pa.types.is_list(table.schema.field('isbn').type))
+        self.assertEqual(table.column('mms_id').to_pylist(), ['991', '992'])
+        self.assertEqual(table.column('publication_date').to_pylist(), [2001, None])
+
+    def test_extractor_column_without_type_is_rejected(self):
+        field_mapping = FieldMapping([*TITLE_COLUMNS_SPECS, {'name': 'creator', 'extractor': 'get_creator'}])
+
+        with self.assertRaises(InvalidOutputConfiguration):
+            create_sink({'format': 'parquet', 'path': 'extracted.parquet'}, field_mapping.column_types)
+
+    def test_unknown_type_is_rejected(self):
+        with self.assertRaises(InvalidFieldMapping):
+            FieldMapping([*TITLE_COLUMNS_SPECS, {'name': 'isbn', 'tag': '020', 'type': 'list'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
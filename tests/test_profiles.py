@@ -0,0 +1,42 @@
+import unittest
+from collections import defaultdict
+
+from commons.marc_handling.field_mapping import FieldMapping
+from commons.marc_handling.profiles import Profile
+from commons.marc_handling.selection_rules import SelectionRules
+from commons.normalization.columnar import set_normalization
+from get_csv_from_marc_db_dump import select_and_extract_records_for_profiles
+from tests.marc_records import make_raw_record
+
+COLUMNS_SPECS = [{'name': 'mms_id', 'tag': '009', 'first': True, 'required': True},
+                 {'name': 'title', 'tag': '245', 'subfields': ['a'], 'first': True, 'steps': [{'strip': None}]},
+                 {'name': 'extent', 'tag': '300', 'subfields': ['a'], 'first': True}]
+
+
+class SharedFieldMappingTest(unittest.TestCase):
+
+    def tearDown(self):
+        set_normalization(None)
+
+    def test_rows_of_profiles_with_shared_field_mapping_are_normalized_once(self):
+        # batch smaller than number of selected records, so batches fill up while profiles share collected rows
+        set_normalization({'batch_size': 2, 'engine': 'python', 'cache_size': 0})
+        field_mapping = FieldMapping(COLUMNS_SPECS)
+        selection_rules = SelectionRules({'has_title': {'type': 'has_values', 'tag': '245'}},
+                                         [{'value': 1, 'checks': ['has_title']}])
+        profiles = [Profile('a', selection_rules, field_mapping), Profile('b', selection_rules, field_mapping),
+                    Profile('c', selection_rules, field_mapping)]
+        raw_records = [make_raw_record(f'99{number}', f' Title {number} ', f'{number} p.') for number in range(7)]
+
+        rows_by_profile = defaultdict(list)
+        for name, record in select_and_extract_records_for_profiles(raw_records, profiles, log_progress=False):
+            rows_by_profile[name].append(record.data)
+
+        expected = [{'mms_id': f'99{number}', 'title': f'Title {number}', 'extent': f'{number} p.',
+                     'is_selected_value': 1} for number in range(7)]
+        for name in ('a', 'b', 'c'):
+            self.assertEqual(rows_by_profile[name], expected, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from commons.marc_handling.lazy_record import LazyRecord
+from commons.marc_handling.raw_prefilter import may_be_selected
+from commons.marc_handling.record_view import RecordView
+from commons.marc_handling.selection_rules import SelectionRules
+from tests.marc_records import make_raw_record
+
+# 008 with publication date 1995 (07-10) and language pol (35-37)
+CONTROL_008 = '950101s1995    pl a          000 1 pol c'
+
+
+class PrefilterLanguageTest(unittest.TestCase):
+
+    def assert_not_stricter_than_rules(self, language):
+        selection_rules = SelectionRules({'publication_date': {'type': 'min_publication_date', 'value': 1918},
+                                          'language': {'type': 'language_of_publication_contains',
+                                                       'value': language}},
+                                         [{'value': 1, 'checks': ['publication_date', 'language']}])
+        raw_record = make_raw_record('991', 'Title', control_008=CONTROL_008)
+        selected = selection_rules.evaluate(RecordView(LazyRecord(raw_record)))
+        self.assertEqual(selected, 1, language)
+        self.assertTrue(may_be_selected(raw_record, *selection_rules.prefilter_parameters), language)
+
+    def test_language_is_contained_in_008_like_in_selection_rules(self):
+        for language in ('pol', 'po', 'ol', 'p'):
+            self.assert_not_stricter_than_rules(language)
+
+    def test_other_language_without_041_is_rejected(self):
+        raw_record = make_raw_record('991', 'Title', control_008=CONTROL_008)
+        self.assertFalse(may_be_selected(raw_record, 1918, 'eng'))
+        self.assertFalse(may_be_selected(raw_record, 1918, 'pl'))
+
+
+if __name__ == '__main__':
+    unittest.main()
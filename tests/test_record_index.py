@@ -0,0 +1,93 @@
+import os
+import random
+import tempfile
+import unittest
+
+from pymarc import Field
+
+from commons.marc_handling.record_index import build_record_index, open_record_index, fetch_records, \
+    get_record_ids, RecordIndex, MAX_INDEX_MERGE_FAN_IN
+from exceptions.custom_exceptions import InvalidRecordIndex
+from tests.marc_records import make_raw_record
+
+# more records than merge fan-in, so index built with small runs is merged in several passes
+RECORDS_NUMBER = MAX_INDEX_MERGE_FAN_IN + 11
+
+
+def make_dump(records_number: int) -> bytes:
+    # 009 are MMS IDs (numeric keys), 001 aren't numeric (hashed keys)
+    return b''.join(make_raw_record(f'99{number}', f'Title {number}',
+                                    extra_fields=[Field(tag='001', data=f'b{number}')])
+                    for number in range(records_number))
+
+
+class RecordIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dump_path = os.path.join(self.temp_dir.name, 'bibs.marc')
+        self.index_path = f'{self.dump_path}.idx'
+        with open(self.dump_path, 'wb') as fp:
+            fp.write(make_dump(RECORDS_NUMBER))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_index(self) -> bytes:
+        with open(self.index_path, 'rb') as fp:
+            return fp.read()
+
+    def test_records_are_found_by_009_and_001(self):
+        record_index = open_record_index(self.dump_path, self.index_path)
+        try:
+            raw_records, missing_ids = fetch_records(self.dump_path, record_index, ['9942', 'b7', 'b42', '99999', 'x1'])
+        finally:
+            record_index.close()
+
+        # records in order of dump, every record once
+        self.assertEqual([get_record_ids(raw_record) for raw_record in raw_records], [['997', 'b7'], ['9942', 'b42']])
+        self.assertEqual(missing_ids, ['99999', 'x1'])
+
+    def test_index_sorted_in_runs_is_the_same_as_sorted_in_memory(self):
+        self.assertEqual(build_record_index(self.dump_path, self.index_path), RECORDS_NUMBER)
+        sorted_in_memory = self.read_index()
+
+        for run_size in (1, 7):
+            self.assertEqual(build_record_index(self.dump_path, self.index_path, run_size=run_size), RECORDS_NUMBER)
+            self.assertEqual(self.read_index(), sorted_in_memory)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['bibs.marc', 'bibs.marc.idx'])
+
+    def test_stale_index_is_rebuilt(self):
+        build_record_index(self.dump_path, self.index_path)
+        with open(self.dump_path, 'ab') as fp:
+            fp.write(make_raw_record('99100', 'Title 100'))
+
+        with self.assertRaises(InvalidRecordIndex):
+            RecordIndex(self.index_path, self.dump_path)
+
+        record_index = open_record_index(self.dump_path, self.index_path)
+        try:
+            self.assertEqual(len(record_index.lookup('99100')), 1)
+        finally:
+            record_index.close()
+
+    def test_sample_has_distinct_records(self):
+        record_index = open_record_index(self.dump_path, self.index_path)
+        try:
+            # small sample (random entries) and large one (from all primary entries)
+            for sample_size in (5, RECORDS_NUMBER - 1):
+                locations = record_index.sample(sample_size, random.Random(7))
+                self.assertEqual(len(set(locations)), sample_size)
+                self.assertEqual(locations, sorted(locations))
+                with open(self.dump_path, 'rb') as fp:
+                    for offset, length in locations:
+                        fp.seek(offset)
+                        self.assertEqual(len(get_record_ids(fp.read(length))), 2)
+
+            self.assertEqual(record_index.sample(5, random.Random(7)), record_index.sample(5, random.Random(7)))
+        finally:
+            record_index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import commons.marc_handling.attributes_extractors as attr_extr
+from commons.instrumentation.run_metrics import start_run_metrics, get_run_metrics, get_profiling_window
+from commons.marc_handling.lazy_record import LazyRecord
+from commons.marc_handling.record_view import RecordView
+from tests.marc_records import make_raw_record
+
+
+class RunMetricsLifecycleTest(unittest.TestCase):
+
+    def tearDown(self):
+        start_run_metrics(None)
+
+    def count_language_calls(self) -> int:
+        metrics = start_run_metrics({'interval': 3600})
+        metrics.instrument_extractors(attr_extr)
+        attr_extr.get_language_of_publication(RecordView(LazyRecord(make_raw_record('991', 'Title'))))
+        metrics.close()
+        return metrics.extractor_calls['get_language_of_publication']
+
+    def test_extractors_are_restored_on_close(self):
+        original = attr_extr.get_language_of_publication
+        # every run counts one call, wrappers of previous run are not wrapped again
+        self.assertEqual([self.count_language_calls() for _ in range(3)], [1, 1, 1])
+        self.assertIs(attr_extr.get_language_of_publication, original)
+
+    def test_disabled_metrics_reset_previous_run(self):
+        start_run_metrics({'interval': 3600, 'profile': {'start': 0, 'records': 10, 'path': 'unused.pstats'}})
+        self.assertIsNotNone(get_run_metrics())
+        self.assertIsNotNone(get_profiling_window())
+
+        self.assertIsNone(start_run_metrics(None))
+        self.assertIsNone(get_run_metrics())
+        self.assertIsNone(get_profiling_window())
+
+
+if __name__ == '__main__':
+    unittest.main()
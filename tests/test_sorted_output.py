@@ -0,0 +1,80 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from commons.output.sinks import OUTPUT_FORMAT_CSV, OUTPUT_FORMAT_JSONL
+from commons.output.sorted_output import sort_output, MAX_MERGE_FAN_IN
+
+HEADER = ['mms_id', 'title']
+
+
+class SortOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.temp_dir.name, 'extracted.csv')
+        self.jsonl_path = os.path.join(self.temp_dir.name, 'extracted.jsonl')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_csv(self, rows: list) -> None:
+        with open(self.csv_path, 'wt', newline='', encoding='utf-8') as fp:
+            csv.writer(fp).writerows([HEADER, *rows])
+
+    def read_csv(self) -> list:
+        with open(self.csv_path, 'rt', newline='', encoding='utf-8') as fp:
+            return list(csv.reader(fp))
+
+    def sort_csv(self, rows: list, sort_config: dict) -> list:
+        self.write_csv(rows)
+        sort_output(self.csv_path, OUTPUT_FORMAT_CSV, sort_config)
+        return self.read_csv()
+
+    def assert_no_temporary_files(self):
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['extracted.csv'])
+
+    def test_keys_are_compared_as_text(self):
+        rows = [['9', 'nine'], ['10', 'ten'], ['1', 'one']]
+        self.assertEqual(self.sort_csv(rows, {'dedupe': False}), [HEADER, ['1', 'one'], ['10', 'ten'], ['9', 'nine']])
+
+    def test_dedupe_keeps_the_last_row_in_output_order(self):
+        rows = [['2', 'first 2'], ['1', 'first 1'], ['', 'no key'], ['2', 'last 2'], ['', 'no key either']]
+        self.assertEqual(self.sort_csv(rows, {}),
+                         [HEADER, ['', 'no key'], ['', 'no key either'], ['1', 'first 1'], ['2', 'last 2']])
+
+    def test_ties_are_kept_in_output_order_without_dedupe(self):
+        rows = [['2', 'a'], ['1', 'b'], ['2', 'c'], ['2', 'd']]
+        self.assertEqual(self.sort_csv(rows, {'dedupe': False}),
+                         [HEADER, ['1', 'b'], ['2', 'a'], ['2', 'c'], ['2', 'd']])
+
+    def test_spilled_runs_are_merged_like_sorted_in_memory(self):
+        rows = [[str(number * 7919 % 50), f'row {number}'] for number in range(50)] * 2
+        in_memory = self.sort_csv(rows, {'dedupe': False})
+
+        self.assertEqual(self.sort_csv(rows, {'dedupe': False, 'run_size': 7}), in_memory)
+        self.assertEqual(self.sort_csv(rows, {'run_size': 7}), [HEADER, *sorted(rows[50:])])
+        self.assert_no_temporary_files()
+
+    def test_more_runs_than_merge_fan_in_are_merged_in_passes(self):
+        rows_number = MAX_MERGE_FAN_IN * 3 + 1
+        rows = [[f'{number * 31 % rows_number:04d}', f'row {number}'] for number in range(rows_number)]
+
+        self.assertEqual(self.sort_csv(rows, {'run_size': 1}), [HEADER, *sorted(rows)])
+        self.assert_no_temporary_files()
+
+    def test_jsonl_is_sorted_and_deduplicated(self):
+        lines = [{'mms_id': '3', 'n': 1}, {'mms_id': '1', 'n': 2}, {'mms_id': '3', 'n': 3}, {'mms_id': '2', 'n': 4}]
+        with open(self.jsonl_path, 'wt', encoding='utf-8') as fp:
+            fp.writelines(f'{json.dumps(line)}\n' for line in lines)
+
+        sort_output(self.jsonl_path, OUTPUT_FORMAT_JSONL, {'run_size': 2})
+
+        with open(self.jsonl_path, 'rt', encoding='utf-8') as fp:
+            self.assertEqual([json.loads(line)['n'] for line in fp], [2, 4, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
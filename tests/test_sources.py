@@ -0,0 +1,84 @@
+import csv
+import os
+import re
+import threading
+import unittest
+from unittest import mock
+
+import get_csv_from_marc_db_dump
+from get_csv_from_marc_db_dump import run, create_workers_executor
+from tests.http_stand_in import DumpServer, ServedFile
+from tests.marc_records import make_raw_record
+from tests.workspace import WorkspaceTestCase
+
+SOURCES = {'books': 3, 'articles': 2, 'maps': 4}
+
+
+def make_dump(name: str, records_number: int) -> bytes:
+    return b''.join(make_raw_record(f'99{name}{number}', f'{name} {number}') for number in range(records_number))
+
+
+def read_csv(path: str) -> list:
+    with open(path, 'rt', newline='', encoding='utf-8') as fp:
+        return list(csv.reader(fp))
+
+
+class SourcesTest(WorkspaceTestCase):
+
+    def test_sources_are_downloaded_and_extracted_to_own_and_combined_output(self):
+        files = {f'{name}.marc': ServedFile(make_dump(name, records_number), f'"{name}"')
+                 for name, records_number in SOURCES.items()}
+        db_config = {'sources': [f'{name}.marc' for name in SOURCES], 'download_workers': 3,
+                     'output': {'format': 'csv', 'path': 'extracted.csv'}}
+
+        with DumpServer(files) as server, self.assertLogs('marc_reader', level='INFO') as logs:
+            run({**db_config, 'base_url': server.base_url})
+
+        self.assertEqual(sorted(server.requests), sorted((path, 200) for path in files))
+        for name in SOURCES:
+            with open(os.path.join('db', f'{name}.marc'), 'rb') as fp:
+                self.assertEqual(fp.read(), files[f'{name}.marc'].content)
+
+        rows_by_source = {}
+        for name, records_number in SOURCES.items():
+            rows = read_csv(f'extracted_{name}.csv')
+            self.assertEqual(rows[0], ['mms_id', 'title', 'is_selected_value'])
+            self.assertEqual(rows[1:], [[f'99{name}{number}', f'{name} {number}', '1']
+                                        for number in range(records_number)])
+            rows_by_source[name] = rows[1:]
+
+        # combined output has rows of every source in order the sources were extracted
+        extraction_order = [match.group(1) for match in
+                            (re.search(r'Extracting source (\w+) from', message) for message in logs.output) if match]
+        self.assertEqual(sorted(extraction_order), sorted(SOURCES))
+        combined = read_csv('extracted.csv')
+        self.assertEqual(combined[0], ['mms_id', 'title', 'is_selected_value'])
+        self.assertEqual(combined[1:], [row for name in extraction_order for row in rows_by_source[name]])
+
+    def test_worker_processes_are_forked_after_downloads_finished(self):
+        files = {f'{name}.marc': ServedFile(make_dump(name, records_number), f'"{name}"')
+                 for name, records_number in SOURCES.items()}
+        db_config = {'sources': [f'{name}.marc' for name in SOURCES], 'download_workers': 3,
+                     'extraction_workers': 2, 'records_per_shard': 1,
+                     'output': {'format': 'csv', 'path': 'extracted.csv'}}
+        download_threads_at_fork = []
+
+        def create_recording_executor(workers):
+            download_threads_at_fork.append([thread.name for thread in threading.enumerate()
+                                             if thread.name.startswith('download')])
+            return create_workers_executor(workers)
+
+        with DumpServer(files) as server, \
+                mock.patch.object(get_csv_from_marc_db_dump, 'create_workers_executor', create_recording_executor):
+            run({**db_config, 'base_url': server.base_url})
+
+        # workers of every source are forked without any download thread running
+        self.assertEqual(download_threads_at_fork, [[]] * len(SOURCES))
+        combined = read_csv('extracted.csv')
+        self.assertEqual(sorted(combined[1:]), sorted([f'99{name}{number}', f'{name} {number}', '1']
+                                                      for name, records_number in SOURCES.items()
+                                                      for number in range(records_number)))
+
+
+if __name__ == '__main__':
+    unittest.main()
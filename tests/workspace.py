@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from typing import List
+
+import yaml
+
+from commons.configuration_loader import CONFIG_PATH
+from commons.marc_handling.field_mapping import get_field_mapping, set_field_mapping, load_field_mapping, \
+    DEFAULT_FIELD_MAPPING_FILE
+from commons.marc_handling.selection_rules import get_selection_rules, set_selection_rules, load_selection_rules, \
+    DEFAULT_SELECTION_RULES_FILE
+
+TITLE_COLUMNS_SPECS = [{'name': 'mms_id', 'tag': '009', 'first': True, 'required': True},
+                       {'name': 'title', 'tag': '245', 'subfields': ['a'], 'first': True}]
+HAS_TITLE_SELECTION_RULES = {'checks': {'has_title': {'type': 'has_values', 'tag': '245'}},
+                             'outcomes': [{'value': 1, 'checks': ['has_title']}]}
+
+
+class WorkspaceTestCase(unittest.TestCase):
+    """
+    Test run in temporary working directory (dumps in db/, configuration in configuration/, outputs),
+    with field mapping and selection rules written to configuration and loaded as the current ones.
+    """
+
+    columns_specs: List[dict] = TITLE_COLUMNS_SPECS
+    selection_rules: dict = HAS_TITLE_SELECTION_RULES
+
+    def setUp(self):
+        self.previous = get_field_mapping(), get_selection_rules(), os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.makedirs('db')
+        os.makedirs(CONFIG_PATH)
+
+        self.write_config(DEFAULT_FIELD_MAPPING_FILE, {'columns': self.columns_specs})
+        self.write_config(DEFAULT_SELECTION_RULES_FILE, self.selection_rules)
+        set_field_mapping(load_field_mapping())
+        set_selection_rules(load_selection_rules())
+
+    def tearDown(self):
+        os.chdir(self.previous[2])
+        set_field_mapping(self.previous[0])
+        set_selection_rules(self.previous[1])
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def write_config(file: str, config: dict) -> None:
+        with open(os.path.join(CONFIG_PATH, file), 'wt', encoding='utf-8') as fp:
+            yaml.safe_dump(config, fp, allow_unicode=True)
+
+    @staticmethod
+    def write_dump(name: str, content: bytes) -> str:
+        path = os.path.join('db', name)
+        with open(path, 'wb') as fp:
+            fp.write(content)
+        return path
+
+    @staticmethod
+    def read_text(path: str) -> str:
+        with open(path, 'rt', encoding='utf-8') as fp:
+            return fp.read()